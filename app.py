@@ -1,17 +1,62 @@
 from typing import List, Dict 
-import redis
-import uuid
-from fastapi import FastAPI, Response, Request 
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import logging
+import time
+from fastapi import FastAPI, HTTPException, Response, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from tools.scenario import create_scenario
-from tools.conversational_child import get_child_response
-from tools.classifiers.classifier import get_question_type, get_stage
-from tools.classifiers.LLM_classifier import LLM_get_question_type, LLM_get_stage
-from tools.generate_questions import LLM_generate_question, get_question_category
-from tools.feedback import calculate_score
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.routing import Match
+from tools.conversational_child import get_child_response_async, stream_child_response
+from tools.llm_client import LLMError, LLMUnavailable, llm_client
+from tools.classifiers.knn import KNN_INDEX_ENABLED, knn_index, question_type, question_stage, question_type_and_stage, confirm_stage
+from tools.classifiers.cascade import StageCascade, stage_index
+from tools.classifiers.LLM_classifier import LLM_get_question_type_async, LLM_get_stage_async
+from tools.classifiers.LLM_classifier import question_type_cache, stage_cache
+from tools.generate_questions import get_question_category
+from tools.feedback import calculate_score, embedding_cache, InvalidQAQError, CONTEXT_SWITCH_THRESHOLD
+from tools.feedback_jobs import FeedbackJobs
+from tools.redis_connection import get_async_redis
+from tools.session_store import create_session_store
+from tools.prompt_builder import prompt_builder
+from tools.single_flight import single_flight
+from tools.warm_pool import WarmPool
+from tools.model_registry import registry, MODEL_LOADING
+from tools.logging_config import configure_logging
+from tools import metrics
 from pydantic import BaseModel 
 
-app = FastAPI()
+configure_logging()
+logger = logging.getLogger(__name__)
+
+warm_pool = WarmPool(get_async_redis())
+feedback_jobs = FeedbackJobs(get_async_redis())
+# longest a client can wait for a job result in one poll
+FEEDBACK_JOB_MAX_WAIT = 30
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Loads or starts warming up the models, depending on MODEL_LOADING, and starts the background
+    refill of the scenario/question warm pool while the server runs.
+    """
+    if MODEL_LOADING == "eager":
+        await asyncio.to_thread(registry.load_all)
+    elif MODEL_LOADING == "background":
+        # loads in a thread, so the server binds its port and serves requests in the meantime
+        registry.warm_up()
+    if KNN_INDEX_ENABLED:
+        # an unusable index is logged and switched off here, and the classifiers answer instead
+        await asyncio.to_thread(knn_index.validate)
+    if warm_pool.enabled:
+        warm_pool.start()
+    yield
+    await warm_pool.stop()
+    await asyncio.to_thread(knn_index.flush)
+    await llm_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ["*"]
 
@@ -23,10 +68,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-REDIS_HOST = "localhost"
-REDIS_PORT = 6379
 
-redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+def endpoint_label(request: Request) -> str:
+    """
+    Route path the request matches (e.g. "/chat"), so metrics have one series per endpoint rather
+    than one per URL.
+    """
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+@app.exception_handler(LLMUnavailable)
+async def llm_unavailable(request: Request, e: LLMUnavailable) -> JSONResponse:
+    """
+    Answers requests whose Mistral call was shed with a 503, so clients can tell an overloaded or
+    unhealthy Mistral from a failed request and retry later.
+    """
+    logger.warning("Mistral call shed", extra={"endpoint": endpoint_label(request), "reason": e.reason})
+    return JSONResponse(status_code=503, content={"detail": str(e), "reason": e.reason},
+                        headers={"Retry-After": str(max(1, round(e.retry_after)))})
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Times every request into `sierra_request_seconds` and counts it in `sierra_requests_in_flight`.
+    """
+    endpoint = endpoint_label(request)
+    status = 500
+    with metrics.Timer(metrics.REQUEST_SECONDS, endpoint=endpoint, method=request.method) as timer, \
+            metrics.REQUESTS_IN_FLIGHT.labels(endpoint=endpoint).track_inprogress():
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            timer.labels["status"] = str(status)
+
+session_store = create_session_store()
+
+stage_cascade = StageCascade()
 
 class ChatRequest(BaseModel):
     """
@@ -53,7 +137,7 @@ class QuestionResponse(BaseModel):
 @app.get("/start-session", tags=["Start Session"])
 async def start_session(response: Response) -> Dict[str, str]:
     """
-    Starts a new user session and stores it in Redis.
+    Starts a new user session in the session store (Redis, or in memory with SESSION_BACKEND=memory).
 
     Args:
         response (Response): The response object to set the session cookie.
@@ -61,8 +145,7 @@ async def start_session(response: Response) -> Dict[str, str]:
     Returns:
         dict: A message indicating access granted along with the session ID.
     """
-    session_id = str(uuid.uuid4())
-    redis_client.set(session_id, "active", ex=3600)
+    session_id = await session_store.create()
     response.set_cookie(key="session_id", value=session_id)
     return {"message": "access granted", "session_id": session_id}
 
@@ -77,6 +160,131 @@ async def read_root() -> Dict[str, str]:
     return {"message": "THIS IS THE SIERRA PROJECT SERVER"}
 
 
+@app.get("/ready", tags=["Root"])
+async def ready(response: Response):
+    """
+    Readiness check: whether every model the endpoints use is loaded. Responds with 503 until they are.
+
+    Returns:
+        dict: Whether the worker is ready, and the load state and time of each model.
+    """
+    is_ready = registry.ready()
+    if not is_ready:
+        response.status_code = 503
+    return {"ready": is_ready, "models": registry.status()}
+
+
+@app.get("/metrics", tags=["Stats"])
+async def prometheus_metrics() -> Response:
+    """
+    Prometheus metrics: request latency by endpoint, tokenization, classifier forward pass, sentence
+    encoding, Mistral call and Redis latency histograms, and batching queue depth and in-flight gauges.
+
+    Returns:
+        Response: the metrics in the Prometheus text format.
+    """
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/embedding-cache/stats", tags=["Stats"])
+async def embedding_cache_stats() -> Dict[str, int]:
+    """
+    Hit/miss counters of the sentence embedding cache.
+
+    Returns:
+        dict: local and Redis hits, misses, Redis errors and the in-process cache size.
+    """
+    return embedding_cache.stats()
+
+
+@app.get("/llm-cache/stats", tags=["Stats"])
+async def llm_cache_stats():
+    """
+    Hit/miss counters of the cache in front of the LLM classifiers.
+
+    Returns:
+        dict: Exact and near-duplicate hits, misses and hit rate for the question type and stage caches.
+    """
+    return {"question_type": question_type_cache.stats() if question_type_cache else None,
+            "stage": stage_cache.stats() if stage_cache else None}
+
+
+@app.get("/warm-pool/stats", tags=["Stats"])
+async def warm_pool_stats():
+    """
+    Depth, hit rate and refill rate of the scenario/question warm pool.
+
+    Returns:
+        dict: Pool depths, hits, misses, hit rate, refill counters and this worker's refills in the last minute.
+    """
+    return await warm_pool.stats()
+
+
+@app.get("/live-feedback/stats", tags=["Stats"])
+async def live_feedback_stats():
+    """
+    How often `/live-feedback` needed the LLM to decide the stage, and the latency of each tier.
+
+    Returns:
+        dict: Questions answered by the local model and by the LLM, the LLM rate and per-tier latency percentiles.
+    """
+    return stage_cascade.stats()
+
+
+@app.get("/single-flight/stats", tags=["Stats"])
+async def single_flight_stats():
+    """
+    How many classification requests were served by an identical request already in flight.
+
+    Returns:
+        dict: Per operation, the requests that did the work, those that shared its result, the
+        coalesced rate and the requests in flight.
+    """
+    return single_flight.stats()
+
+
+@app.get("/feedback-jobs/stats", tags=["Stats"])
+async def feedback_job_stats():
+    """
+    Returns:
+        dict: The number of end-stage feedback jobs waiting for a worker.
+    """
+    return {"queued": await feedback_jobs.queue_length()}
+
+
+@app.get("/knn-index/stats", tags=["Stats"])
+async def knn_index_stats():
+    """
+    How often the nearest-neighbour index answered question classification instead of BERT.
+
+    Returns:
+        dict: Questions in the index, lookups, hits, hit rate and questions appended by this worker.
+    """
+    return await asyncio.to_thread(knn_index.stats)
+
+
+@app.get("/llm/stats", tags=["Stats"])
+async def llm_stats():
+    """
+    Admission control of the Mistral calls made by this worker.
+
+    Returns:
+        dict: Circuit breaker state (closed, open or half_open), calls waiting for a slot and calls
+        shed by reason.
+    """
+    return llm_client.stats()
+
+
+def qaq_list(responses: Dict[str, List[QuestionResponse]]) -> List[str]:
+    # have QAQAQAQA 
+    QAQList = []
+    for pair in responses["responses"]:
+        QAQList.append(pair.question)
+        QAQList.append(pair.response)
+    return QAQList
+
+
 @app.post("/end-stage-feedback", tags=["Give End-Stage Feedback"])
 async def give_feedback(responses: Dict[str, List[QuestionResponse]]) -> Dict[str, int]:
     """
@@ -88,27 +296,63 @@ async def give_feedback(responses: Dict[str, List[QuestionResponse]]) -> Dict[st
     Returns:
         dict: A score indicating the quality of the responses. 
     """
-    # have QAQAQAQA 
-    QAQList = []
-    print(responses["responses"])
-    for i, pair in enumerate(responses["responses"]):
-            QAQList.append(pair.question)
-            QAQList.append(pair.response)
-    print(QAQList)
-    score = float(calculate_score(QAQList))
+    QAQList = qaq_list(responses)
+    logger.debug("End-stage feedback", extra={"qaq": QAQList})
+    try:
+        score = float(calculate_score(QAQList))
+    except InvalidQAQError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     score = min(10, int(10 * score))
     return {"score": score}
+
+
+@app.post("/end-stage-feedback/jobs", status_code=202, tags=["Give End-Stage Feedback"])
+async def submit_feedback_job(responses: Dict[str, List[QuestionResponse]]) -> Dict[str, str]:
+    """
+    Queues the scoring of a transcript for the feedback workers (`python -m tools.feedback_jobs`)
+    and returns at once. Submitting the same transcript again returns the same job.
+
+    Args:
+        responses (dict): A dictionary containing a list of question-response pairs.
+
+    Returns:
+        dict: The job ID to poll and the job status.
+    """
+    QAQList = qaq_list(responses)
+    if len(QAQList) < 2:
+        raise HTTPException(status_code=422, detail="a transcript needs at least one question and response")
+    return await feedback_jobs.submit(QAQList)
+
+
+@app.get("/end-stage-feedback/jobs/{job_id}", tags=["Give End-Stage Feedback"])
+async def get_feedback_job(job_id: str, wait: float = 0) -> Dict:
+    """
+    Status of a feedback job, with the score once it is done.
+
+    Args:
+        job_id (str): The ID returned when the job was submitted.
+        wait (float): Seconds to wait for the job to finish before answering, at most 30.
+
+    Returns:
+        dict: The job ID and status (queued, running, done or error), plus the score, raw score
+        and per-question windows when done, or the error.
+    """
+    job = await feedback_jobs.wait(job_id, min(max(wait, 0.0), FEEDBACK_JOB_MAX_WAIT))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
     
 
 @app.get("/generate-scenario", tags=["Generate Scenario"])
 async def generate_scenario() -> Dict[str, str]:
     """
-    Generates a scenario using the `create_scenario` function.
+    Serves a pre-generated scenario from the warm pool, falling back to the `create_scenario` function
+    when the pool is empty.
     
     Returns:
         dict: The generated scenario.
     """
-    return create_scenario()
+    return await warm_pool.get_scenario()
 
 @app.get("/generate-question", tags=["Generate Question"])
 async def generate_question() -> Dict[str, str]:
@@ -120,7 +364,7 @@ async def generate_question() -> Dict[str, str]:
     """
     
     category = get_question_category()
-    question = LLM_generate_question(category)
+    question = await warm_pool.get_question(category)
     category = category.split(" ", 1)[0]
 
     return {"question": question, "category": category}
@@ -150,21 +394,76 @@ async def chat(request: Request, message: ChatRequest) -> Dict[str, str]:
         if not session_id:
             raise NoSession 
 
-        scenario = message.scenario
-        history = redis_client.get(session_id)
-        response = get_child_response(scenario, history, message.message)
+        prompt = await prompt_builder.for_session(session_store, session_id, message.scenario, message.message)
+        response = await get_child_response_async(prompt.scenario, prompt.history, prompt.prompt_content)
 
-        updated_history = f"{history}\n Interviewer: {message.message}\n You: {response}"
-        redis_client.set(session_id, updated_history, ex=3600)
+        await session_store.append_turn(session_id, message.message, response)
+        prompt_builder.schedule_fold(session_store, session_id)
 
         return {"message": response}
+    except LLMUnavailable:
+        raise
     except Exception as e:
         return {"message": f"Error: {e.__str__()}"}
 
+def server_sent_event(data: Dict[str, str], event: str = None) -> str:
+    """
+    Formats a payload as a single Server-Sent Event.
+    """
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream", tags=["Chat"])
+async def chat_stream(request: Request, message: ChatRequest) -> StreamingResponse:
+    """
+    Streaming version of `/chat`. The chatbot response is sent as Server-Sent Events while it is generated:
+    one `{"token": ...}` event per piece of text, then a `done` event with the full message. Errors are sent
+    as an `error` event. The turn is added to the session history only once the whole response has been
+    streamed, so a client that disconnects part way through leaves the history unchanged.
+
+    Args:
+        request (Request): The HTTP request object to extract cookies.
+        message (ChatRequest): The chat request containing a scenario and user message.
+
+    Returns:
+        StreamingResponse: A text/event-stream of the chatbot response.
+    """
+    session_id = request.cookies.get("session_id")
+    # a call that would be shed gets its 503 before the event stream starts
+    llm_client.check_admission("child")
+
+    async def events():
+        if not session_id:
+            yield server_sent_event({"message": f"Error: {NoSession()}"}, event="error")
+            return
+
+        prompt = await prompt_builder.for_session(session_store, session_id, message.scenario, message.message)
+        tokens = stream_child_response(prompt.scenario, prompt.history, prompt.prompt_content)
+        chunks = []
+        try:
+            async for token in tokens:
+                chunks.append(token)
+                yield server_sent_event({"token": token})
+        except LLMError as e:
+            yield server_sent_event({"message": f"Error: {e}"}, event="error")
+            return
+        finally:
+            # closes the upstream Mistral stream if the client went away mid-response
+            await tokens.aclose()
+
+        response = "".join(chunks)
+        await session_store.append_turn(session_id, message.message, response)
+        prompt_builder.schedule_fold(session_store, session_id)
+        yield server_sent_event({"message": response}, event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/llm-categorize-question")
 async def llm_categorize_question(question: Question) -> Dict[str, str]:
     """
-    Used as a backup to our finetuned classifier for when it is unsure.
+    Used as a backup to our finetuned classifier for when it is unsure. While Mistral is failing or
+    overloaded, the finetuned classifier's answer is returned instead.
 
     Args:
         question: Question to be classified
@@ -173,50 +472,164 @@ async def llm_categorize_question(question: Question) -> Dict[str, str]:
         dict: category that question has been determined as
     """
 
-    q_type = LLM_get_question_type(question.question)
+    try:
+        q_type = await single_flight.do("llm_question_type", question.question,
+                                        lambda: LLM_get_question_type_async(question.question))
+    except LLMError:
+        # Mistral is failing or overloaded, the local classifier answers instead
+        q_type, _ = await single_flight.do("q_type", question.question, lambda: question_type(question.question))
     return {"question_type": q_type}
 
 
+async def live_feedback(Q1: str, A1: str, Q2: str) -> Dict[str, tuple[str, float] | bool | float | str]:
+    """
+    Question type, stage and context switch of the question Q2, asked after the question Q1 and the
+    response A1. The type and stage come from the nearest labelled question when the KNN index has a
+    near-copy of Q2, else from the local classifiers. The stage only comes from the LLM when its
+    confidence is below `STAGE_CONFIDENCE_THRESHOLD`. The three are worked out concurrently.
+    """
+    started = time.perf_counter()
+
+    async def type_and_stage():
+        q_type, stage = await question_type_and_stage(Q2)
+        stage = await stage_cascade.resolve(Q2, stage, started)
+        confirm_stage(Q2, stage)
+        return q_type, stage
+
+    async def context_switch_score():
+        if len(Q1) > 0 and len(A1) > 0 and len(Q2) > 0:
+            return await asyncio.to_thread(calculate_score, [Q1, A1, Q2])
+        return 1.0
+
+    (q_type, stage), score = await asyncio.gather(type_and_stage(), context_switch_score())
+    context_switch = bool(score < CONTEXT_SWITCH_THRESHOLD)
+    logger.debug("Live feedback", extra={"question": Q2, "q_type": q_type, "stage": stage["stage"],
+                                         "stage_confidence": stage["confidence"], "stage_tier": stage["tier"],
+                                         "context_switch": context_switch})
+
+    # made the request return a number to match frontend API
+    return {"q_type": q_type, "q_stage" : stage["stage"], "context_switch": context_switch,
+             "stage_confidence": stage["confidence"], "stage_tier": stage["tier"]}
+
+
 @app.post("/live-feedback", tags=["Live Feedback"])
-async def generate_test_feedback(messages: Dict[str, str]) -> Dict[str, tuple[str, float] | bool | int | float]: 
+async def generate_test_feedback(messages: Dict[str, str]) -> Dict[str, tuple[str, float] | bool | int | float | str]: 
     """
     Generates feedback on questions asked by the user in the testing section. Includes whether
     the question is the correct type, the correct stage, and that there has been no context jump.
+    The stage comes from the local classifier, and only from the LLM when the classifier's confidence
+    is below `STAGE_CONFIDENCE_THRESHOLD`. The type, stage and context switch are worked out concurrently.
 
     Args:
         messages: a triple containing question, response, question
 
     Returns:
-        dict: Question type, stage and whether a switch in context has been detected.
+        dict: Question type, stage, whether a switch in context has been detected and which
+        tier ("local" or "llm") decided the stage.
     """
     
     Q1, A1, Q2 = messages["question_1"], messages["response"], messages["question_2"] 
-    q_type = get_question_type(Q2) 
-    
-    # using LLM classifier as backup
-    using_LLM_classifier = True
-    if using_LLM_classifier:
-        q_stage, q_stage_confidence = LLM_get_stage(Q2), 0.99
-    else:
-        q_stage, q_stage_confidence = get_stage(Q2)["stage"], get_stage(Q2)["confidence"]
-    print(Q2 + " is " + q_stage + " with confidence " + str(q_stage_confidence))
-    # made the request return a number to match frontend API
-    if using_LLM_classifier:
-        stage_indicies = {"Introduction" : 1, "Investigative": 2, "Closing": 3}
-    else:
-        stage_indicies = {"Introduction" : 1, "Investigation stage": 2, "Closing phase": 3}
-    
-    if len(Q1) > 0 and len(A1) > 0 and len(Q2) > 0:
-        context_switch_score = calculate_score([Q1, A1, Q2]) 
+    return await live_feedback(Q1, A1, Q2)
 
-        print("we actually got here: " + str([Q1, A1, Q2]))
-    else:
-        context_switch_score = 1.0
-    context_switch = context_switch_score < 0.3
-    print("context switch " + str(context_switch))
 
-    return {"q_type": q_type, "q_stage" : stage_indicies[q_stage], "context_switch": context_switch,
-             "stage_confidence": q_stage_confidence}
+@app.websocket("/ws/interview")
+async def interview_socket(websocket: WebSocket):
+    """
+    One connection for a whole interview session, identified by the session_id cookie (or a
+    `session_id` query parameter). The client sends each interviewer message as
+    `{"message": ..., "scenario": ...}`, the scenario only needed with the first message. For every
+    message the server starts the child's reply and the live feedback at the same time, taking the
+    previous question and response from the session, and pushes each as soon as it is ready:
+
+        {"type": "token", "turn": 1, "token": ...}      pieces of the child's reply as it is generated
+        {"type": "reply", "turn": 1, "message": ...}    the whole reply, once it is in the session
+        {"type": "feedback", "turn": 1, ...}            the `/live-feedback` fields for the message
+        {"type": "error", "turn": 1, "message": ...}    the reply or the feedback failed
+
+    A message that isn't a JSON object with a non-empty `message` string gets an error without a
+    `turn` and the connection stays open. Messages are handled one at a time, in order, so each reply
+    sees the turns before it.
+    """
+    session_id = websocket.cookies.get("session_id") or websocket.query_params.get("session_id")
+    if not session_id or not await session_store.exists(session_id):
+        await websocket.close(code=1008, reason=str(NoSession()))
+        return
+    await websocket.accept()
+
+    send_lock = asyncio.Lock()
+    scenario = ""
+
+    async def send(data: Dict):
+        async with send_lock:
+            await websocket.send_json(data)
+
+    async def reply(turn: int, message: str):
+        try:
+            prompt = await prompt_builder.for_session(session_store, session_id, scenario, message)
+            tokens = stream_child_response(prompt.scenario, prompt.history, prompt.prompt_content)
+            chunks = []
+            try:
+                async for token in tokens:
+                    chunks.append(token)
+                    await send({"type": "token", "turn": turn, "token": token})
+            finally:
+                await tokens.aclose()
+
+            response = "".join(chunks)
+            await session_store.append_turn(session_id, message, response)
+            prompt_builder.schedule_fold(session_store, session_id)
+        except Exception as e:
+            # Mistral or the session store failed, the client hears about it and can send the next message
+            await send({"type": "error", "turn": turn, "message": f"Error: {e}"})
+            return
+        await send({"type": "reply", "turn": turn, "message": response})
+
+    async def feedback(turn: int, message: str, previous: List[Dict[str, str]]):
+        try:
+            Q1, A1 = (previous[0]["interviewer"], previous[0]["child"]) if previous else ("", "")
+            await send({"type": "feedback", "turn": turn, **await live_feedback(Q1, A1, message)})
+        except Exception as e:
+            await send({"type": "error", "turn": turn, "message": f"Error: {e}"})
+
+    incoming: asyncio.Queue = asyncio.Queue()
+
+    async def receive():
+        # reads messages as they come, so a disconnect is noticed while a message is being handled
+        try:
+            while True:
+                await incoming.put(await websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            await incoming.put(None)
+
+    receiver = asyncio.create_task(receive())
+    turn = 0
+    try:
+        while (text := await incoming.get()) is not None and not receiver.done():
+            try:
+                data = json.loads(text)
+            except ValueError:
+                data = None
+            if not isinstance(data, dict) or not isinstance(data.get("message"), str) or not data["message"] \
+                    or not isinstance(data.get("scenario") or "", str):
+                # a malformed message is refused, the session carries on with the next one
+                await send({"type": "error", "message": 'Error: expected {"message": ..., "scenario": ...}'})
+                continue
+            scenario = data.get("scenario") or scenario
+            message = data["message"]
+            turn += 1
+            previous = await session_store.recent_turns(session_id, 1)
+            handling = asyncio.gather(reply(turn, message), feedback(turn, message, previous))
+            await asyncio.wait([handling, receiver], return_when=asyncio.FIRST_COMPLETED)
+            if not handling.done():
+                # the client went away, stop the Mistral stream and the feedback
+                handling.cancel()
+                await asyncio.gather(handling, return_exceptions=True)
+                break
+            handling.result()
+    finally:
+        receiver.cancel()
 
 
 @app.post("/categorize-question", tags=["Get Question Type"])
@@ -224,6 +637,7 @@ async def q_type_categorize(question: Question):
     """ 
     Categorises a question into one of the 4 categories:
         Open-Ended, Directive, Option-Posing, Suggestive
+    Near-copies of questions in the KNN index get the indexed label, with the similarity as confidence.
 
     Args: 
         question: Question to be classified.
@@ -231,14 +645,18 @@ async def q_type_categorize(question: Question):
     Returns:
         dict: Question type and the confidence level of the classifier.
     """
-    q_type, confidence = get_question_type(question.question)
+    q_type, confidence = await single_flight.do("q_type", question.question,
+                                                lambda: question_type(question.question))
     return {"question_type": q_type, "confidence": confidence}
 
+LLM_STAGE_NAMES = {1: "Introduction", 2: "Investigative", 3: "Closing"}
+
 @app.post("/categorise-stage", tags=["Get Question Stage"])
-def categorise_stage(question: Question) -> Dict[str, str]:
+async def categorise_stage(question: Question) -> Dict[str, str]:
     """
     Categorises a question into one of the stages using an LLM (backup for trained classifier):
         Introduction, Investigative, Closing
+    While Mistral is failing or overloaded, the trained classifier's stage is returned instead.
 
     Args:
         question: Question to be classifed into a stage.
@@ -246,7 +664,13 @@ def categorise_stage(question: Question) -> Dict[str, str]:
     Returns:
         dict: Stage
     """
-    return {"stage": LLM_get_stage(question.question)}
+    try:
+        stage = await single_flight.do("llm_stage", question.question, lambda: LLM_get_stage_async(question.question))
+    except LLMError:
+        # Mistral is failing or overloaded, the local classifier answers instead, with the LLM's stage names
+        local = await single_flight.do("stage", question.question, lambda: question_stage(question.question))
+        stage = LLM_STAGE_NAMES[stage_index(local["stage"])]
+    return {"stage": stage}
 
 
 
@@ -255,6 +679,7 @@ async def q_stage_categorize(question: Question):
     """ 
     Categorises a question into one of the 3 stage categories:
         Introduction, Investigation stage, Closing stage
+    Near-copies of questions in the KNN index get the indexed label, with the similarity as confidence.
 
     Args: 
         question: Question to be classified.
@@ -262,5 +687,6 @@ async def q_stage_categorize(question: Question):
     Returns:
         dict: Question stage and the confidence level of the classifier.
     """
-    q_stage, confidence = get_stage(question.question)
+    stage = await single_flight.do("stage", question.question, lambda: question_stage(question.question))
+    q_stage, confidence = stage["stage"], stage["confidence"]
     return {"question_type": q_stage, "confidence": confidence}
@@ -0,0 +1,73 @@
+"""
+Accuracy comparison between the two-model setup and the combined shared-encoder classifier.
+
+Both setups classify a labelled CSV (`question`, `q_type`, `stage` columns, label names as in
+`labels_qtype` / `labels_stage`). The report shows per-task accuracy, how often the two setups
+agree, the time per question for type + stage, and the parameter memory of each setup.
+
+Run from the repository root after building the combined model:
+    python -m benchmarks.combined_accuracy [--data benchmarks/fixtures/labelled_questions.csv]
+"""
+import argparse
+import csv
+import os
+import time
+
+# load the two separate models; the combined one is loaded explicitly below
+os.environ["CLASSIFIER_MODE"] = "separate"
+os.environ["CLASSIFIER_BACKEND"] = "torch"
+
+from tools.classifiers import classifier
+from tools.classifiers.combined import BertMultiHeadClassifier
+
+FIXTURES = "benchmarks/fixtures/labelled_questions.csv"
+
+
+def parameter_mb(*models) -> float:
+    return sum(p.numel() * p.element_size() for model in models for p in model.parameters()) / 2 ** 20
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=FIXTURES)
+    parser.add_argument("--combined", default=classifier.combined_path)
+    args = parser.parse_args()
+
+    with open(args.data, newline="") as f:
+        rows = list(csv.DictReader(f))
+    questions = [row["question"] for row in rows]
+
+    start = time.perf_counter()
+    separate = classifier.classify(questions)
+    separate_time = time.perf_counter() - start
+
+    model_combined = BertMultiHeadClassifier.from_pretrained(args.combined)
+    start = time.perf_counter()
+    # (question type, stage) labels, the report doesn't use the confidences
+    combined = [(classifier.labels_qtype[qtype], classifier.labels_stage[stage])
+                for (qtype, _qtype_confidence), (stage, _stage_confidence)
+                in classifier._classify_heads(model_combined, questions)]
+    combined_time = time.perf_counter() - start
+
+    n = len(rows)
+    report = [
+        ("q_type accuracy",
+         sum(s[0][0] == row["q_type"] for s, row in zip(separate, rows)) / n,
+         sum(c[0] == row["q_type"] for c, row in zip(combined, rows)) / n),
+        ("stage accuracy",
+         sum(s[1]["stage"] == row["stage"] for s, row in zip(separate, rows)) / n,
+         sum(c[1] == row["stage"] for c, row in zip(combined, rows)) / n),
+        ("ms/question", separate_time * 1000 / n, combined_time * 1000 / n),
+        ("parameter MB", parameter_mb(classifier.model_qtype, classifier.model_stage), parameter_mb(model_combined)),
+    ]
+    print(f"{'':<18}{'two models':>12}{'combined':>12}")
+    for name, two_models, shared in report:
+        print(f"{name:<18}{two_models:>12.3f}{shared:>12.3f}")
+
+    qtype_agreement = sum(s[0][0] == c[0] for s, c in zip(separate, combined)) / n
+    stage_agreement = sum(s[1]["stage"] == c[1] for s, c in zip(separate, combined)) / n
+    print(f"agreement: q_type {qtype_agreement:.3f}, stage {stage_agreement:.3f} ({n} questions)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Hit rate, accuracy and latency of the nearest-neighbour tier against the BERT classifiers.
+
+Half of a labelled CSV (`question`, `q_type`, `stage` columns) goes into a throwaway index. The
+traffic is every question of the CSV rewritten the way questions recur in interviews (case,
+punctuation, a filler word in front), so the indexed half is near-copies and the other half is new.
+For each threshold the report shows the share of traffic answered by the index, the accuracy of
+those answers against the gold labels, and how often a new question was wrongly matched. Latency
+is per question, one at a time as the endpoints see them: a KNN lookup (MiniLM encode + search)
+against BERT type + stage.
+
+Run from the repository root:
+    python -m benchmarks.knn_index [--data benchmarks/fixtures/labelled_questions.csv] [--thresholds 0.85 0.9 0.95]
+"""
+import argparse
+import csv
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from tools.classifiers import classifier
+from tools.classifiers.knn import KnnIndex
+from tools.model_registry import registry
+
+FIXTURES = "benchmarks/fixtures/labelled_questions.csv"
+FILLERS = ["", "Okay, ", "So ", "And ", "Right, "]
+
+
+def variant(question: str, rng: random.Random) -> str:
+    """
+    The question as it might be asked again: different case, punctuation or filler word.
+    """
+    text = rng.choice(FILLERS) + question[0].lower() + question[1:] if rng.random() < 0.5 else question
+    if rng.random() < 0.5:
+        text = text.rstrip("?.!")
+    return text.lower() if rng.random() < 0.3 else text
+
+
+def milliseconds(fn, items) -> np.ndarray:
+    times = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        times.append((time.perf_counter() - start) * 1000)
+    return np.array(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=FIXTURES)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.85, 0.9, 0.92, 0.95])
+    parser.add_argument("--variants", type=int, default=3, help="rewrites of each question in the traffic")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with open(args.data, newline="") as f:
+        rows = list(csv.DictReader(f))
+    rng.shuffle(rows)
+    indexed, new = rows[:len(rows) // 2], rows[len(rows) // 2:]
+    traffic = [(variant(row["question"], rng), row, row in indexed) for row in rows for _ in range(args.variants)]
+
+    qtype_ids = {label: index for index, label in classifier.labels_qtype.items()}
+    stage_ids = {label: index for index, label in classifier.labels_stage.items()}
+    model = registry.get("sentence_model")
+    # the raw model rather than the embedding cache, so repeated questions don't flatter the latency
+    encode = lambda texts: model.encode(texts, convert_to_numpy=True)
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = KnnIndex(directory, encode_fn=encode, refresh_interval=0)
+        index.add([row["question"] for row in indexed], [qtype_ids.get(row["q_type"]) for row in indexed],
+                   [stage_ids.get(row["stage"]) for row in indexed])
+
+        print(f"{len(indexed)} indexed questions, {len(traffic)} queries "
+              f"({sum(seen for _, _, seen in traffic)} near-copies of indexed ones)")
+        print(f"{'threshold':>10}{'hit rate':>10}{'q_type acc':>12}{'stage acc':>11}{'false hits':>12}")
+        for threshold in args.thresholds:
+            index.threshold = threshold
+            results = index.search([text for text, _, _ in traffic])
+            hits = [(result, row) for result, (_, row, _) in zip(results, traffic) if result is not None]
+            false_hits = sum(result is not None and not seen for result, (_, _, seen) in zip(results, traffic))
+            qtype_accuracy = np.mean([classifier.labels_qtype.get(r.q_type) == row["q_type"] for r, row in hits]) if hits else 0
+            stage_accuracy = np.mean([classifier.labels_stage.get(r.stage) == row["stage"] for r, row in hits]) if hits else 0
+            print(f"{threshold:>10.2f}{len(hits) / len(traffic):>10.3f}{qtype_accuracy:>12.3f}{stage_accuracy:>11.3f}"
+                  f"{false_hits:>12}")
+
+        bert = classifier.classify([text for text, _, _ in traffic])
+        print(f"BERT on the same traffic: q_type acc {np.mean([b[0][0] == row['q_type'] for b, (_, row, _) in zip(bert, traffic)]):.3f}, "
+              f"stage acc {np.mean([b[1]['stage'] == row['stage'] for b, (_, row, _) in zip(bert, traffic)]):.3f}")
+
+        queries = [text for text, _, _ in traffic]
+        # one pass of each first, so neither side pays for loading or warming up
+        index.search(queries[:2])
+        classifier.classify(queries[:2])
+        knn_ms = milliseconds(lambda text: index.search([text]), queries)
+        bert_ms = milliseconds(lambda text: classifier.classify([text]), queries)
+    for name, times in (("knn lookup", knn_ms), ("bert type+stage", bert_ms)):
+        p50, p95, p99 = np.percentile(times, [50, 95, 99])
+        print(f"{name:<16} p50 {p50:6.2f} ms  p95 {p95:6.2f} ms  p99 {p99:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Accuracy, latency and memory of the lite classifier (heads on MiniLM embeddings) against the two
+BERT models, and the combined model when it has been built.
+
+Every setup classifies a labelled CSV (`question`, `q_type`, `stage` columns, label names as in
+`labels_qtype` / `labels_stage`). The report shows per-task accuracy, the latency of type + stage
+for single questions (p50/p95) and the parameter memory of the classifiers, alone and with the
+MiniLM model the server loads for feedback anyway. The lite row is timed with a fresh MiniLM encode;
+`lite (cached)` is the same heads on an embedding already computed for feedback scoring, which is
+what a question costs once it has been encoded.
+
+Train the lite heads first, on other questions than the ones benchmarked, then run from the
+repository root:
+    python -m tools.classifiers.build_lite --data questions.csv
+    python -m benchmarks.lite_profile [--data benchmarks/fixtures/labelled_questions.csv]
+"""
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+
+# the two separate models are the reference, the others are loaded explicitly below
+os.environ["CLASSIFIER_MODE"] = "separate"
+os.environ["CLASSIFIER_BACKEND"] = "torch"
+
+from tools.classifiers import classifier
+from tools.classifiers.combined import BertMultiHeadClassifier
+from tools.classifiers.lite import EmbeddingHeads
+from tools.model_registry import registry
+
+FIXTURES = "benchmarks/fixtures/labelled_questions.csv"
+
+
+def parameter_mb(*models) -> float:
+    return sum(p.numel() * p.element_size() for model in models for p in model.parameters()) / 2 ** 20
+
+
+def milliseconds(fn, items) -> np.ndarray:
+    times = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        times.append((time.perf_counter() - start) * 1000)
+    return np.array(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=FIXTURES)
+    parser.add_argument("--lite", default=classifier.lite_path)
+    parser.add_argument("--combined", default=classifier.combined_path)
+    args = parser.parse_args()
+
+    with open(args.data, newline="") as f:
+        rows = list(csv.DictReader(f))
+    questions = [row["question"] for row in rows]
+
+    sentence_model = registry.get("sentence_model")
+    lite = EmbeddingHeads.from_pretrained(args.lite)
+    # the raw model rather than the embedding cache, so repeated questions don't flatter the latency
+    encode = lambda texts: sentence_model.encode(texts, convert_to_numpy=True)
+    embeddings = encode(questions)
+    cached = {question: embedding for question, embedding in zip(questions, embeddings)}
+
+    def as_labels(heads):
+        return [(classifier.labels_qtype[qtype], classifier.labels_stage[stage]) for (qtype, _), (stage, _) in heads]
+
+    setups = {
+        "two BERT models": (lambda batch: [(qtype, stage["stage"]) for (qtype, _), stage in classifier.classify(batch)],
+                            parameter_mb(classifier.model_qtype, classifier.model_stage)),
+        "lite": (lambda batch: as_labels(lite.predict(encode(batch))), parameter_mb(lite)),
+        "lite (cached)": (lambda batch: as_labels(lite.predict(np.stack([cached[q] for q in batch]))), parameter_mb(lite)),
+    }
+    if os.path.isdir(args.combined):
+        combined = BertMultiHeadClassifier.from_pretrained(args.combined)
+        setups["combined BERT"] = (lambda batch: as_labels(classifier._classify_heads(combined, batch)),
+                                   parameter_mb(combined))
+
+    sentence_mb = parameter_mb(sentence_model)
+    n = len(rows)
+    print(f"{n} questions, MiniLM {sentence_mb:.1f} MB")
+    print(f"{'':<18}{'q_type acc':>11}{'stage acc':>11}{'p50 ms':>9}{'p95 ms':>9}{'model MB':>10}{'+ MiniLM':>10}")
+    for name, (run, mb) in setups.items():
+        predictions = run(questions)
+        qtype_accuracy = sum(qtype == row["q_type"] for (qtype, _), row in zip(predictions, rows)) / n
+        stage_accuracy = sum(stage == row["stage"] for (_, stage), row in zip(predictions, rows)) / n
+        # one pass first, so no setup pays for warming up
+        run(questions[:2])
+        p50, p95 = np.percentile(milliseconds(lambda question: run([question]), questions), [50, 95])
+        print(f"{name:<18}{qtype_accuracy:>11.3f}{stage_accuracy:>11.3f}{p50:>9.2f}{p95:>9.2f}{mb:>10.1f}"
+              f"{mb + sentence_mb:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Load test of the whole server against a local Mistral stand-in.
+
+Starts the app under uvicorn with MISTRAL_SERVER_URL pointing at `tests.fake_mistral.FakeMistral`
+(configurable latency and jitter) and a Redis of its own, then runs virtual users at each
+concurrency level for a fixed duration. Each user repeatedly plays a whole session:
+
+    /start-session, /generate-scenario, then per turn /chat and /live-feedback, then /end-stage-feedback
+
+Redis is, in order of preference: the server given with --redis-url, a throwaway `redis-server`
+if one is on the PATH, or an in-memory stand-in (`fakeredis`, `pip install fakeredis`).
+
+The result is written as JSON with, per concurrency level and endpoint, the request count, errors,
+requests per second and p50/p95/p99 latency in milliseconds, along with the run's settings so
+runs can be compared.
+
+Run from the repository root:
+    python -m benchmarks.load_test [--concurrency 1 8 32] [--duration 30] [--latency 0.5 --jitter 0.5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from tests.fake_mistral import FakeMistral
+
+QUESTIONS = "benchmarks/fixtures/interview_questions.txt"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def fake_reply(messages: List[Dict[str, str]]) -> str:
+    """
+    Plausible reply for each of the server's prompts, so responses parse like real ones.
+    """
+    prompt = messages[-1]["content"]
+    if "generate scenarios" in prompt:
+        return "Scenario: A child's teacher reported bruises on her arm.\nName: Amy\nAge: 7"
+    if "classify them into one of the following stages" in prompt:
+        return random.choice(["Introduction", "Investigative", "Closing"])
+    if "Categorise the question" in prompt:
+        return random.choice(["Open-ended", "Directive", "Option-Posing", "Suggestive"])
+    if "Give only questions" in prompt:
+        return "Can you tell me more about what happened?"
+    return "I was at home with my mum and then I went to the park."
+
+
+class LocalRedis:
+    """
+    Redis for the run: an existing server, a throwaway redis-server process or an in-memory stand-in.
+    """
+
+    def __init__(self, url: Optional[str]):
+        self.process = None
+        self.fake = None
+        if url:
+            self.kind = "external"
+            self.host, self.port = httpx.URL(url).host, httpx.URL(url).port or 6379
+        elif shutil.which("redis-server"):
+            self.kind = "redis-server"
+            self.host, self.port = "127.0.0.1", free_port()
+            self.process = subprocess.Popen(["redis-server", "--port", str(self.port), "--save", "",
+                                             "--appendonly", "no"], stdout=subprocess.DEVNULL)
+        else:
+            try:
+                from fakeredis import TcpFakeServer
+            except ImportError:
+                sys.exit("No Redis available: pass --redis-url, install redis-server, or pip install fakeredis")
+            self.kind = "fakeredis"
+            self.fake = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+            threading.Thread(target=self.fake.serve_forever, daemon=True).start()
+            self.host, self.port = self.fake.server_address[:2]
+
+    def stop(self) -> None:
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+        if self.fake is not None:
+            self.fake.shutdown()
+
+
+class Recorder:
+    """
+    Latency and status of every request, grouped by endpoint.
+    """
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, method: str, path: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.errors[path] += 1
+            return None
+        self.latencies[path].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[path] += 1
+        return response
+
+    def report(self, duration: float) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for path in sorted(set(self.latencies) | set(self.errors)):
+            latencies = np.array(self.latencies[path]) * 1000
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (None, None, None)
+            report[path] = {"requests": len(latencies), "errors": self.errors[path],
+                            "rps": len(latencies) / duration, "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+        return report
+
+
+async def session(client: httpx.AsyncClient, recorder: Recorder, questions: List[str], turns: int) -> None:
+    """
+    One interview: start a session, get a scenario, chat with live feedback, then get the final score.
+    """
+    await recorder.request(client, "GET", "/start-session")
+    response = await recorder.request(client, "GET", "/generate-scenario")
+    scenario = response.json().get("Scenario", "") if response is not None and response.status_code == 200 else ""
+
+    pairs: List[Tuple[str, str]] = []
+    for question in random.sample(questions, turns):
+        response = await recorder.request(client, "POST", "/chat", json={"scenario": scenario, "message": question})
+        answer = response.json().get("message", "") if response is not None and response.status_code == 200 else ""
+        previous_question, previous_answer = pairs[-1] if pairs else ("", "")
+        await recorder.request(client, "POST", "/live-feedback", json={
+            "question_1": previous_question, "response": previous_answer, "question_2": question})
+        pairs.append((question, answer))
+
+    await recorder.request(client, "POST", "/end-stage-feedback", json={
+        "responses": [{"question": question, "response": answer} for question, answer in pairs]})
+
+
+async def run_level(url: str, concurrency: int, duration: float, questions: List[str],
+                    turns: int) -> Dict[str, Dict[str, float]]:
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+
+    async def user():
+        # each user has its own client, so its own session cookie
+        async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+            while time.perf_counter() < deadline:
+                await session(client, recorder, questions, turns)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[user() for _ in range(concurrency)])
+    return recorder.report(time.perf_counter() - started)
+
+
+def wait_until_ready(url: str, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(f"{url}/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"server not ready within {timeout}s")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=30, help="seconds per concurrency level")
+    parser.add_argument("--turns", type=int, default=4, help="chat turns per session")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake Mistral latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="extra random fake Mistral latency, up to this")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--redis-url", default=None, help="e.g. redis://localhost:6379, instead of a local one")
+    parser.add_argument("--output", default=None, help="JSON result file, default benchmarks/results/load_test-<time>.json")
+    args = parser.parse_args()
+
+    with open(QUESTIONS) as f:
+        questions = [line.strip() for line in f if line.strip()]
+
+    fake = FakeMistral(latency=args.latency, jitter=args.jitter, reply=fake_reply).start()
+    redis_server = LocalRedis(args.redis_url)
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "MISTRAL_SERVER_URL": fake.url, "MISTRAL_API_KEY": "load-test",
+           "REDIS_HOST": str(redis_server.host), "REDIS_PORT": str(redis_server.port)}
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port),
+                               "--workers", str(args.workers), "--log-level", "warning"], env=env,
+                              stdout=subprocess.DEVNULL)
+    try:
+        wait_until_ready(url, timeout=600)
+        levels = {}
+        for concurrency in args.concurrency:
+            levels[str(concurrency)] = asyncio.run(run_level(url, concurrency, args.duration, questions, args.turns))
+            print(f"concurrency {concurrency}")
+            for path, stats in levels[str(concurrency)].items():
+                p50, p99 = stats["p50_ms"] or 0, stats["p99_ms"] or 0
+                print(f"  {path:<22}{stats['rps']:>8.1f} req/s  p50 {p50:>8.1f} ms  p99 {p99:>8.1f} ms"
+                      f"  errors {stats['errors']}")
+    finally:
+        server.terminate()
+        server.wait()
+        redis_server.stop()
+        fake.stop()
+
+    result = {
+        "revision": git_revision(),
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {"duration": args.duration, "turns": args.turns, "latency": args.latency,
+                     "jitter": args.jitter, "workers": args.workers, "redis": redis_server.kind},
+        "mistral_requests": len(fake.requests),
+        "levels": levels,
+    }
+    output = args.output or f"benchmarks/results/load_test-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Parity check and benchmark of the classifier backends: eager PyTorch fp32, ONNX fp32 and ONNX int8.
+
+Every backend runs the same tokenization and length-bucketed path from `tools.classifiers.classifier`
+on the labelled fixture set. The report shows, per model and backend, the accuracy against the gold
+labels, the agreement with eager PyTorch and the largest confidence drift from it, then the latency of
+single questions (p50/p95) and the throughput of batches. Exits with a non-zero status if ONNX fp32
+disagrees with PyTorch or drifts past the tolerance, or if int8 agrees on fewer questions than
+`--min-int8-agreement`.
+
+Export the models first, then run from the repository root:
+    python -m tools.classifiers.export_onnx --quantize
+    python -m benchmarks.onnx_backend [--batch-size 16] [--repeats 5] [--tolerance 1e-4]
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+# the eager models are the reference, the ONNX ones are loaded explicitly below
+os.environ["CLASSIFIER_MODE"] = "separate"
+os.environ["CLASSIFIER_BACKEND"] = "torch"
+
+from tools.classifiers import classifier
+from tools.classifiers.onnx_backend import OnnxClassifier, onnx_path
+
+FIXTURES = "benchmarks/fixtures/labelled_questions.csv"
+
+
+def load_models() -> Dict[str, Dict[str, object]]:
+    """
+    Returns:
+        dict: for "q_type" and "stage", the model of each backend whose files exist.
+    """
+    models = {}
+    for name, checkpoint, model in [("q_type", classifier.qtype_path, classifier.model_qtype),
+                                    ("stage", classifier.stage_path, classifier.model_stage)]:
+        models[name] = {"torch": model}
+        for backend, quantized in [("onnx", False), ("onnx-int8", True)]:
+            if os.path.exists(onnx_path(checkpoint, quantized)):
+                models[name][backend] = OnnxClassifier.from_checkpoint(checkpoint, quantized)
+            else:
+                print(f"{name}: no {onnx_path(checkpoint, quantized)}, skipping {backend}")
+    return models
+
+
+def check_parity(models: Dict[str, Dict[str, object]], rows: List[Dict[str, str]], tolerance: float,
+                 min_int8_agreement: float) -> bool:
+    questions = [row["question"] for row in rows]
+    ok = True
+    print(f"{'':<20}{'accuracy':>10}{'agreement':>11}{'max drift':>11}")
+    for name, backends in models.items():
+        labels = classifier.labels_qtype if name == "q_type" else classifier.labels_stage
+        gold = [row[name] for row in rows]
+        reference = classifier._classify(backends["torch"], questions)
+        for backend, model in backends.items():
+            predictions = reference if backend == "torch" else classifier._classify(model, questions)
+            accuracy = np.mean([labels[label] == expected for (label, _), expected in zip(predictions, gold)])
+            agreement = np.mean([label == expected for (label, _), (expected, _) in zip(predictions, reference)])
+            drift = max(abs(confidence - expected) for (_, confidence), (_, expected) in zip(predictions, reference))
+            print(f"{name + ' ' + backend:<20}{accuracy:>10.3f}{agreement:>11.3f}{drift:>11.2e}")
+            if backend == "onnx":
+                ok = ok and agreement == 1.0 and drift <= tolerance
+            elif backend == "onnx-int8":
+                ok = ok and agreement >= min_int8_agreement
+    return ok
+
+
+def benchmark(models: Dict[str, Dict[str, object]], questions: List[str], batch_size: int, repeats: int) -> None:
+    batches = [questions[i:i + batch_size] for i in range(0, len(questions), batch_size)]
+    print(f"\n{'':<20}{'p50 ms':>10}{'p95 ms':>10}{'questions/s':>13}")
+    for name, backends in models.items():
+        for backend, model in backends.items():
+            # one untimed pass so lazy initialisation isn't counted
+            classifier._classify(model, batches[0])
+
+            latencies = []
+            for _ in range(repeats):
+                for question in questions:
+                    start = time.perf_counter()
+                    classifier._classify(model, [question])
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for _ in range(repeats):
+                for batch in batches:
+                    classifier._classify(model, batch)
+            throughput = repeats * len(questions) / (time.perf_counter() - start)
+
+            p50, p95 = np.percentile(np.array(latencies) * 1000, [50, 95])
+            print(f"{name + ' ' + backend:<20}{p50:>10.2f}{p95:>10.2f}{throughput:>13.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=FIXTURES)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    parser.add_argument("--min-int8-agreement", type=float, default=0.95)
+    args = parser.parse_args()
+
+    with open(args.data, newline="") as f:
+        rows = list(csv.DictReader(f))
+    models = load_models()
+    ok = check_parity(models, rows, args.tolerance, args.min_int8_agreement)
+    benchmark(models, [row["question"] for row in rows], args.batch_size, args.repeats)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Startup time of the server, to catch changes that make workers slow to boot again.
+
+Measures, each in a fresh interpreter:
+  import    time to `import app`, which should not load any model
+  serve     time from launching uvicorn until `/` answers
+  ready     time from launching uvicorn until `/ready` reports every model loaded
+
+Run from the repository root:
+    python -m benchmarks.startup_time [--repeats 3] [--loading background] [--max-import-seconds 5]
+
+Exits with a non-zero status if the median import time is over `--max-import-seconds`.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_time(env) -> float:
+    code = "import time; start = time.perf_counter(); import app; print(time.perf_counter() - start)"
+    output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def wait_for(url: str, started: float, timeout: float, status: int = 200) -> float:
+    while time.perf_counter() - started < timeout:
+        try:
+            if httpx.get(url, timeout=1).status_code == status:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} did not respond with {status} within {timeout}s")
+
+
+def server_times(env, timeout: float) -> tuple[float, float]:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port)], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        serve = wait_for(f"http://127.0.0.1:{port}/", started, timeout)
+        ready = wait_for(f"http://127.0.0.1:{port}/ready", started, timeout)
+        return serve, ready
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--loading", choices=["lazy", "background", "eager"], default="background",
+                        help="MODEL_LOADING of the measured server")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--max-import-seconds", type=float, default=None)
+    args = parser.parse_args()
+
+    # lazy loading never reports ready on its own, so the server is measured with warm-up
+    env = {**os.environ, "MODEL_LOADING": args.loading if args.loading != "lazy" else "background",
+           "WARM_POOL_ENABLED": "false"}
+    imports = [import_time({**env, "MODEL_LOADING": args.loading}) for _ in range(args.repeats)]
+    servers = [server_times(env, args.timeout) for _ in range(args.repeats)]
+
+    report = [("import", imports), ("serve", [serve for serve, _ in servers]), ("ready", [ready for _, ready in servers])]
+    print(f"{'':<8}{'median s':>10}{'max s':>10}")
+    for name, times in report:
+        print(f"{name:<8}{statistics.median(times):>10.2f}{max(times):>10.2f}")
+
+    if args.max_import_seconds is not None and statistics.median(imports) > args.max_import_seconds:
+        print(f"import takes longer than {args.max_import_seconds}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Parity check and benchmark for the variable-length classifier path.
+
+Compares the bucketed, pad-to-longest inference in `tools.classifiers.classifier` against the
+original path that padded every question to 512 tokens, on the fixture set of interview questions.
+Exits with a non-zero status if any label differs or a confidence drifts past the tolerance.
+
+Run from the repository root:
+    python -m benchmarks.variable_length [--batch-size 16] [--repeats 5] [--tolerance 1e-4]
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List, Tuple
+
+import torch
+
+# compares two PyTorch inference paths, whichever backend the server is configured with
+os.environ["CLASSIFIER_BACKEND"] = "torch"
+
+from tools.classifiers import classifier
+
+FIXTURES = "benchmarks/fixtures/interview_questions.txt"
+
+
+def load_questions(path: str = FIXTURES) -> List[str]:
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def classify_max_length(model, questions: List[str]) -> List[Tuple[int, float]]:
+    """
+    The original inference path: every question is padded to the model maximum of 512 tokens.
+    """
+    encoding = classifier.tokenizer(questions, return_tensors="pt", truncation=True, padding='max_length')
+    with torch.no_grad():
+        output = model(**encoding)
+    probabilities = torch.nn.functional.softmax(output.logits, dim=-1)
+    confidences, predictions = torch.max(probabilities, dim=-1)
+    return list(zip(predictions.tolist(), confidences.tolist()))
+
+
+def check_parity(questions: List[str], tolerance: float) -> bool:
+    ok = True
+    for name, model in [("q_type", classifier.model_qtype), ("stage", classifier.model_stage)]:
+        expected = [classify_max_length(model, [question])[0] for question in questions]
+        actual = classifier._classify(model, questions)
+        mismatches = 0
+        max_drift = 0.0
+        for question, (label, confidence), (new_label, new_confidence) in zip(questions, expected, actual):
+            drift = abs(confidence - new_confidence)
+            max_drift = max(max_drift, drift)
+            if label != new_label or drift > tolerance:
+                mismatches += 1
+                print(f"  [{name}] mismatch: {question!r}: {label} ({confidence:.6f}) -> {new_label} ({new_confidence:.6f})")
+        print(f"{name}: {len(questions) - mismatches}/{len(questions)} match, max confidence drift {max_drift:.2e}")
+        ok = ok and mismatches == 0
+    return ok
+
+
+def benchmark(questions: List[str], batch_size: int, repeats: int) -> None:
+    batches = [questions[i:i + batch_size] for i in range(0, len(questions), batch_size)]
+    model = classifier.model_qtype
+
+    def run(classify) -> float:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for batch in batches:
+                classify(model, batch)
+        return (time.perf_counter() - start) / (repeats * len(questions))
+
+    # one untimed pass each so lazy initialisation doesn't count against either path
+    classify_max_length(model, batches[0])
+    classifier._classify(model, batches[0])
+
+    padded = run(classify_max_length)
+    bucketed = run(classifier._classify)
+    print(f"max_length padding: {padded * 1000:.2f} ms/question")
+    print(f"bucketed (max {classifier.MAX_SEQ_LEN} tokens): {bucketed * 1000:.2f} ms/question")
+    print(f"speedup: {padded / bucketed:.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default=FIXTURES)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    questions = load_questions(args.fixtures)
+    ok = check_parity(questions, args.tolerance)
+    benchmark(questions, args.batch_size, args.repeats)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Per-worker memory of the multi-worker deployment, with and without models shared across the fork.
+
+Starts gunicorn (gunicorn.conf.py) twice with the same number of workers:
+  naive     GUNICORN_PRELOAD=false, every worker loads its own models
+  preload   the models are loaded once in the master and shared copy-on-write
+In each setup it waits until every worker has loaded its models, sends some classification and
+feedback requests so the measurement includes real inference, then reads /proc/<pid>/smaps_rollup
+of every worker. The report shows the mean RSS and unique set size (USS, memory only that worker
+holds) per worker, and the proportional set size (PSS) summed over the master and workers.
+
+Linux only. Run from the repository root:
+    python -m benchmarks.worker_memory [--workers 4] [--requests 50]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def memory_mb(pid: int) -> Dict[str, float]:
+    """
+    Returns:
+        dict: RSS, PSS and USS of the process in MiB.
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"],
+            "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def children(pid: int) -> List[int]:
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def wait_until_loaded(master: int, workers: int, url: str, timeout: float) -> List[int]:
+    """
+    Waits for `workers` worker processes, for `/ready`, and then for the workers' memory to stop
+    growing, since a worker that is still loading its models doesn't answer requests.
+    """
+    started = time.perf_counter()
+    previous, stable = None, 0
+    while time.perf_counter() - started < timeout:
+        pids = children(master)
+        try:
+            ready = httpx.get(f"{url}/ready", timeout=2).status_code == 200
+        except httpx.HTTPError:
+            ready = False
+        if ready and len(pids) == workers:
+            usage = [memory_mb(pid)["rss"] for pid in pids]
+            if previous is not None and len(previous) == len(usage) \
+                    and all(abs(a - b) < 1 for a, b in zip(previous, usage)):
+                stable += 1
+                if stable >= 4:
+                    return pids
+            else:
+                stable = 0
+            previous = usage
+        time.sleep(0.5)
+    raise TimeoutError(f"workers did not finish loading within {timeout}s")
+
+
+def send_traffic(url: str, requests: int) -> None:
+    questions = ["Can you tell me what happened?", "Was the man wearing a red coat?", "Who was there with you?"]
+    with httpx.Client(timeout=30) as client:
+        for i in range(requests):
+            question = questions[i % len(questions)]
+            client.post(f"{url}/categorize-question", json={"question": question})
+            client.post(f"{url}/categorize-question-stage", json={"question": question})
+            client.post(f"{url}/end-stage-feedback", json={"responses": [
+                {"question": "What happened?", "response": "I went to the park"},
+                {"question": question, "response": "I don't remember"}]})
+
+
+def measure(preload: bool, workers: int, requests: int, timeout: float) -> Dict[str, float]:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "GUNICORN_PRELOAD": str(preload).lower(), "WEB_CONCURRENCY": str(workers),
+           "BIND": f"127.0.0.1:{port}", "MODEL_LOADING": "background", "WARM_POOL_ENABLED": "false"}
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "app:app"], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        pids = wait_until_loaded(server.pid, workers, url, timeout)
+        send_traffic(url, requests)
+        usage = [memory_mb(pid) for pid in pids]
+        return {
+            "rss": sum(u["rss"] for u in usage) / len(usage),
+            "uss": sum(u["uss"] for u in usage) / len(usage),
+            "total_pss": sum(u["pss"] for u in usage) + memory_mb(server.pid)["pss"],
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    naive = measure(False, args.workers, args.requests, args.timeout)
+    preload = measure(True, args.workers, args.requests, args.timeout)
+
+    print(f"{args.workers} workers{'':<12}{'naive':>10}{'preload':>10}")
+    for name, label in [("rss", "RSS / worker MiB"), ("uss", "USS / worker MiB"), ("total_pss", "total PSS MiB")]:
+        print(f"{label:<22}{naive[name]:>10.1f}{preload[name]:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
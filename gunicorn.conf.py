@@ -0,0 +1,56 @@
+"""
+Gunicorn configuration for running the server with several worker processes:
+
+    gunicorn app:app            # picks up this file from the working directory
+
+The app and its models are loaded once in the master process, before the workers are forked. Every
+worker then shares the same model weights copy-on-write instead of loading its own copy. Each worker
+gets its own share of the CPU cores for PyTorch, so the workers don't oversubscribe them.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+# loading the models can take longer than gunicorn's default 30s on a cold start
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+# GUNICORN_PRELOAD=false gives the naive setup, where every worker loads its own models
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+# PyTorch threads per worker, so that all the workers together use each core once
+TORCH_THREADS_PER_WORKER = int(os.getenv("TORCH_THREADS_PER_WORKER", str(max(1, multiprocessing.cpu_count() // workers))))
+
+
+def on_starting(server):
+    if not preload_app:
+        return
+    import torch
+    from tools.model_registry import registry
+
+    # a single thread in the master keeps PyTorch from starting a thread pool that the forked
+    # workers would inherit in a broken state
+    torch.set_num_threads(1)
+    loaded = registry.preload_for_fork()
+    server.log.info("Loaded %s before forking workers", ", ".join(loaded))
+
+    # everything allocated so far is never freed, so keep the garbage collector from writing to
+    # those objects (and un-sharing their pages) in every worker
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import torch
+
+    torch.set_num_threads(TORCH_THREADS_PER_WORKER)
+    server.log.info("Worker %s uses %s PyTorch threads", worker.pid, TORCH_THREADS_PER_WORKER)
+
+
+def child_exit(server, worker):
+    # drops the exited worker's live gauges from /metrics when the workers share a metrics directory
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,13 @@
+pkill gunicorn
+
+# Fresh directory where the workers share their Prometheus metrics
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/sierra-metrics}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Run Gunicorn in the background with nohup, settings are in gunicorn.conf.py
+nohup gunicorn app:app > gunicorn.log 2>&1 &
+
+# Check that the Gunicorn master started
+if pgrep gunicorn > /dev/null; then
+    echo "Gunicorn started successfully! Check logs using: tail -f gunicorn.log"
+fi
@@ -0,0 +1,153 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+
+def default_reply(messages: List[Dict[str, str]]) -> str:
+    return "I don't remember."
+
+
+class FakeMistral:
+    """
+    Local stand-in for the Mistral chat completions API, for tests and benchmarks.
+
+    Serves `POST /v1/chat/completions` (plain and streamed) on a background thread. Latency,
+    jitter, injected failures and the reply text are configurable, and every request body is
+    recorded along with the highest number of requests that were in flight at once.
+
+    Usage:
+        with FakeMistral(latency=0.05) as fake:
+            client = LLMClient(api_key="test", server_url=fake.url)
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, fail_first: int = 0, fail_status: int = 503,
+                 reply: Callable[[List[Dict[str, str]]], str] = default_reply, token_delay: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0):
+        """
+        Args:
+            latency: seconds each request takes before replying.
+            jitter: up to this many extra seconds added at random to each request.
+            fail_first: number of requests answered with `fail_status` before the server behaves.
+            fail_status: HTTP status used for injected failures.
+            reply: function from the request messages to the reply text.
+            token_delay: seconds between streamed words.
+            host: interface to bind.
+            port: port to bind, 0 picks a free one.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.reply = reply
+        self.token_delay = token_delay
+        self.streams_completed = 0
+        self.streams_aborted = 0
+        self.requests: List[Dict] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeMistral":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeMistral":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: Dict) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client gave up on the request, e.g. the server under test was stopped
+                    self.close_connection = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with fake._lock:
+                    fake.requests.append(body)
+                    failing = len(fake.requests) <= fake.fail_first
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                try:
+                    time.sleep(fake.latency + random.uniform(0, fake.jitter))
+                    if self.path != "/v1/chat/completions":
+                        self._send_json(404, {"message": "not found"})
+                    elif failing:
+                        self._send_json(fake.fail_status, {"message": "injected failure"})
+                    elif body.get("stream"):
+                        self._stream(body)
+                    else:
+                        self._complete(body)
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+            def _complete(self, body: Dict) -> None:
+                text = fake.reply(body["messages"])
+                self._send_json(200, {
+                    "id": uuid.uuid4().hex,
+                    "object": "chat.completion",
+                    "model": body["model"],
+                    "created": int(time.time()),
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                                 "finish_reason": "stop"}],
+                })
+
+            def _stream(self, body: Dict) -> None:
+                # one server-sent event per word, paced by the token delay
+                text = fake.reply(body["messages"])
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                chunk_id = uuid.uuid4().hex
+                try:
+                    for i, word in enumerate(text.split(" ")):
+                        chunk = {"id": chunk_id, "model": body["model"], "choices": [
+                            {"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}]}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                        self.wfile.flush()
+                        time.sleep(fake.token_delay)
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                    fake.streams_completed += 1
+                except (BrokenPipeError, ConnectionResetError):
+                    fake.streams_aborted += 1
+                self.close_connection = True
+
+        return Handler
@@ -0,0 +1,76 @@
+import unittest
+from tools.admission import CircuitBreaker, TokenBucket
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        clock = Clock()
+        bucket = TokenBucket(rate=2, burst=3, clock=clock)
+
+        assert [bucket.reserve(0) for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert bucket.reserve(0.1) is None
+        assert bucket.reserve(1) == 0.5
+        assert bucket.reserve(1) == 1.0
+        clock.now = 10
+        assert bucket.reserve(0) == 0.0
+
+    def test_no_limit(self):
+        bucket = TokenBucket(rate=0, burst=1)
+
+        assert all(bucket.reserve(0) == 0.0 for _ in range(100))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=self.clock)
+
+    def fail(self, times):
+        for _ in range(times):
+            assert self.breaker.allow()
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.fail(2)
+        self.breaker.record_success()
+        self.fail(2)
+        assert self.breaker.state == "closed"
+        self.fail(1)
+
+        assert self.breaker.state == "open" and not self.breaker.allow()
+
+    def test_single_probe_closes_or_reopens(self):
+        self.fail(3)
+        self.clock.now = 10
+
+        assert self.breaker.allow() and not self.breaker.allow()
+        self.breaker.record_failure()
+        assert self.breaker.state == "open"
+
+        self.clock.now = 20
+        assert self.breaker.allow()
+        self.breaker.record_success()
+        assert self.breaker.state == "closed" and self.breaker.allow()
+
+    def test_released_probe_lets_another_through(self):
+        self.fail(3)
+        self.clock.now = 10
+        assert self.breaker.allow()
+        self.breaker.release()
+
+        assert self.breaker.allow()
+
+
+if __name__ == "__main__":
+    unittest.main()
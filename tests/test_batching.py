@@ -0,0 +1,67 @@
+import asyncio
+import threading
+import unittest
+from tools.classifiers.batching import BatchInferenceEngine
+
+
+class TestBatchInferenceEngine(unittest.IsolatedAsyncioTestCase):
+
+    async def test_results_match_inputs(self):
+        engine = BatchInferenceEngine(lambda items: [item * 2 for item in items], max_batch_size=4, max_wait_ms=5)
+        results = await asyncio.gather(*[engine.submit(i) for i in range(10)])
+
+        assert results == [i * 2 for i in range(10)]
+
+    async def test_concurrent_requests_are_batched(self):
+        batch_sizes = []
+
+        def batch_fn(items):
+            batch_sizes.append(len(items))
+            return items
+
+        engine = BatchInferenceEngine(batch_fn, max_batch_size=8, max_wait_ms=50)
+        await asyncio.gather(*[engine.submit(i) for i in range(20)])
+
+        assert batch_sizes == [8, 8, 4]
+
+    async def test_flushes_after_max_wait(self):
+        engine = BatchInferenceEngine(lambda items: items, max_batch_size=64, max_wait_ms=10)
+        result = await asyncio.wait_for(engine.submit("question"), timeout=1)
+
+        assert result == "question"
+
+    async def test_runs_off_event_loop(self):
+        threads = []
+
+        def batch_fn(items):
+            threads.append(threading.current_thread())
+            return items
+
+        engine = BatchInferenceEngine(batch_fn)
+        await engine.submit("question")
+
+        assert threads[0] is not threading.main_thread()
+
+    async def test_error_propagates_to_whole_batch(self):
+        def batch_fn(items):
+            raise ValueError("forward pass failed")
+
+        engine = BatchInferenceEngine(batch_fn, max_batch_size=4, max_wait_ms=20)
+        results = await asyncio.gather(*[engine.submit(i) for i in range(3)], return_exceptions=True)
+
+        assert all(isinstance(result, ValueError) for result in results)
+        # the engine keeps serving after a failed batch
+        engine.batch_fn = lambda items: items
+        assert await engine.submit(1) == 1
+
+
+    async def test_missing_results_fail_the_batch(self):
+        engine = BatchInferenceEngine(lambda items: items[:-1], max_batch_size=4, max_wait_ms=20)
+        results = await asyncio.wait_for(
+            asyncio.gather(*[engine.submit(i) for i in range(3)], return_exceptions=True), timeout=1)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+
+if __name__ == "__main__":
+    unittest.main()
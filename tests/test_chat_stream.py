@@ -0,0 +1,115 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+from fastapi.testclient import TestClient
+import app
+from tests.fake_mistral import FakeMistral
+from tools import conversational_child
+from tools.llm_client import LLMClient
+from tools.session_store import MemorySessionStore
+
+
+def parse_events(text):
+    """
+    (event, data) of each Server-Sent Event, the event None when it has no name.
+    """
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields.get("event"), json.loads(fields["data"])))
+    return events
+
+
+class TestChatStream(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.fake = FakeMistral(reply=lambda messages: "I was at the park").start()
+        self.store = MemorySessionStore()
+        llm = LLMClient(api_key="test", server_url=self.fake.url, timeout=2, max_retries=0, rate_limit=0)
+        mock.patch.object(conversational_child, "llm_client", llm).start()
+        mock.patch.object(app, "session_store", self.store).start()
+        self.addCleanup(mock.patch.stopall)
+        self.addCleanup(self.fake.stop)
+
+    async def post(self, body, session_id, disconnect_after=None):
+        """
+        Posts to /chat/stream on the ASGI app directly, so the events are read as they are sent. The
+        client goes away once it has `disconnect_after` events. Returns the body sent until then.
+        """
+        request = {"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+                 "scheme": "http", "path": "/chat/stream", "raw_path": b"/chat/stream", "query_string": b"",
+                 "root_path": "", "client": ("127.0.0.1", 5000), "server": ("testserver", 80),
+                 "headers": [(b"content-type", b"application/json"), (b"cookie", f"session_id={session_id}".encode())]}
+        received = []
+        disconnected = asyncio.Event()
+
+        async def receive():
+            nonlocal request
+            if request is not None:
+                message, request = request, None
+                return message
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body":
+                received.append(message["body"].decode())
+                if disconnect_after is not None and "".join(received).count("data: ") >= disconnect_after:
+                    disconnected.set()
+
+        await asyncio.wait_for(app.app(scope, receive, send), 5)
+        return "".join(received)
+
+    async def test_tokens_then_done(self):
+        session_id = await self.store.create()
+        events = parse_events(await self.post({"scenario": "A day out.", "message": "Where were you?"}, session_id))
+
+        assert [event for event, _ in events] == [None] * 5 + ["done"]
+        assert "".join(data["token"] for _, data in events[:-1]) == "I was at the park"
+        assert events[-1][1] == {"message": "I was at the park"}
+        assert await self.store.recent_turns(session_id) == [{"interviewer": "Where were you?", "child": "I was at the park"}]
+
+    async def test_history_is_appended_once_the_stream_finishes(self):
+        session_id = await self.store.create()
+        history = []
+
+        def reply(messages):
+            # called on the fake server's thread
+            history.append(asyncio.run(self.store.recent_turns(session_id)))
+            return "I was at the park"
+
+        self.fake.reply = reply
+        await self.post({"scenario": "A day out.", "message": "Where were you?"}, session_id)
+        await self.post({"scenario": "A day out.", "message": "Who was with you?"}, session_id)
+
+        # nothing is stored while the first reply is generated, and the second sees the first turn
+        assert history == [[], [{"interviewer": "Where were you?", "child": "I was at the park"}]]
+        assert "Where were you?" in self.fake.requests[1]["messages"][0]["content"]
+        assert len(await self.store.recent_turns(session_id)) == 2
+
+    async def test_disconnect_mid_stream_leaves_history_unchanged(self):
+        self.fake.reply = lambda messages: " ".join(["word"] * 50)
+        self.fake.token_delay = 0.02
+        session_id = await self.store.create()
+        events = parse_events(await self.post({"scenario": "A day out.", "message": "Where were you?"}, session_id,
+                                              disconnect_after=1))
+
+        for _ in range(100):
+            if self.fake.streams_aborted:
+                break
+            await asyncio.sleep(0.01)
+        assert "done" not in [event for event, _ in events]
+        assert self.fake.streams_aborted == 1
+        assert await self.store.recent_turns(session_id) == []
+
+    def test_missing_session_is_an_error_event(self):
+        response = TestClient(app.app).post("/chat/stream", json={"scenario": "A day out.", "message": "Hi"})
+
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert parse_events(response.text) == [("error", {"message": "Error: No session_id found"})]
+
+
+if __name__ == "__main__":
+    unittest.main()
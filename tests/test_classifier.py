@@ -0,0 +1,113 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+import torch
+from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+from tools.classifiers import classifier
+from tools.classifiers.combined import BertMultiHeadClassifier
+from tools.model_registry import ModelRegistry
+
+WORDS = ["what", "happened", "at", "the", "park", "who", "was", "there", "did", "he", "say", "anything", "else"]
+
+
+def tiny_classifier(id2label, seed):
+    """
+    Randomly initialised single-task BERT classifier, small enough to build in a test.
+    """
+    torch.manual_seed(seed)
+    # large initial weights, so different questions get clearly different confidences
+    config = BertConfig(vocab_size=100, hidden_size=16, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=32, max_position_embeddings=128, initializer_range=0.5,
+                        num_labels=len(id2label), id2label=id2label,
+                        label2id={label: index for index, label in id2label.items()})
+    return BertForSequenceClassification(config).eval()
+
+
+class TestCombinedClassifier(unittest.TestCase):
+
+    def setUp(self):
+        self.model_qtype = tiny_classifier({0: "Neither", 1: "Open-ended", 2: "Directive", 3: "Option Posing",
+                                            4: "Suggestive"}, seed=0)
+        self.model_stage = tiny_classifier({0: "None", 1: "Introduction", 2: "Investigation stage",
+                                            3: "Closing phase"}, seed=1)
+        self.inputs = {"input_ids": torch.randint(1, 100, (3, 10), generator=torch.Generator().manual_seed(2)),
+                       "attention_mask": torch.ones(3, 10, dtype=torch.long)}
+
+    def test_heads_reproduce_separate_logits(self):
+        # a stage model fine-tuned on the same encoder, as build_combined trains it
+        self.model_stage.bert.load_state_dict(self.model_qtype.bert.state_dict())
+        combined = BertMultiHeadClassifier.from_separate(self.model_qtype, self.model_stage).eval()
+
+        with torch.no_grad():
+            qtype_logits, stage_logits = combined(**self.inputs)
+            torch.testing.assert_close(qtype_logits, self.model_qtype(**self.inputs).logits)
+            torch.testing.assert_close(stage_logits, self.model_stage(**self.inputs).logits)
+
+    def test_stage_head_runs_on_the_question_type_encoder(self):
+        combined = BertMultiHeadClassifier.from_separate(self.model_qtype, self.model_stage).eval()
+
+        with torch.no_grad():
+            _, stage_logits = combined(**self.inputs)
+            pooled = self.model_qtype.bert(**self.inputs).pooler_output
+            torch.testing.assert_close(stage_logits, self.model_stage.classifier(pooled))
+
+    def test_each_head_keeps_its_label_map(self):
+        combined = BertMultiHeadClassifier.from_separate(self.model_qtype, self.model_stage)
+        with tempfile.TemporaryDirectory() as directory:
+            combined.save_pretrained(directory)
+            loaded = BertMultiHeadClassifier.from_pretrained(directory)
+
+        for model in (combined, loaded):
+            assert (model.config.num_qtype_labels, model.config.num_stage_labels) == (5, 4)
+            assert model.config.qtype_id2label == self.model_qtype.config.id2label
+            assert model.config.stage_id2label == self.model_stage.config.id2label
+
+
+class TestLengthBuckets(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        vocab = os.path.join(directory.name, "vocab.txt")
+        with open(vocab, "w") as f:
+            f.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "?"] + WORDS))
+        self.tokenizer = mock.Mock(wraps=BertTokenizerFast(vocab_file=vocab))
+        registry = ModelRegistry()
+        registry.register("bert_tokenizer", lambda: self.tokenizer)
+        mock.patch.object(classifier, "registry", registry).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_buckets_cover_every_index_once(self):
+        rng = random.Random(0)
+        lengths = [rng.randint(1, classifier.MAX_SEQ_LEN) for _ in range(500)]
+        buckets = classifier._length_buckets(lengths)
+
+        assert sorted(i for bucket in buckets for i in bucket) == list(range(len(lengths)))
+        # each bucket holds a range of lengths, shortest bucket first
+        for shorter, longer in zip(buckets, buckets[1:]):
+            assert max(lengths[i] for i in shorter) < min(lengths[i] for i in longer)
+        assert classifier._length_buckets([]) == []
+
+    def test_mixed_lengths_come_back_in_input_order(self):
+        model = BertMultiHeadClassifier.from_separate(
+            tiny_classifier({i: str(i) for i in range(5)}, seed=0), tiny_classifier({i: str(i) for i in range(4)}, seed=1)
+        ).eval()
+        rng = random.Random(0)
+        questions = [" ".join(rng.choice(WORDS) for _ in range(rng.choice([2, 5, 20, 40, 90, 200]))) + "?"
+                     for _ in range(30)]
+        results = classifier._classify_heads(model, questions)
+
+        # the tokenizer runs once for the whole batch, however many buckets there are
+        assert self.tokenizer.call_count == 1
+        assert len(results) == len(questions)
+        for question, heads in zip(questions, results):
+            alone = classifier._classify_heads(model, [question])[0]
+            for (label, confidence), (alone_label, alone_confidence) in zip(heads, alone):
+                assert label == alone_label
+                self.assertAlmostEqual(confidence, alone_confidence, places=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
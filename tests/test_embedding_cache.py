@@ -0,0 +1,73 @@
+import unittest
+import numpy as np
+from tools.embedding_cache import EmbeddingCache
+
+
+class FakeRedis:
+    """
+    Just enough of a binary redis client for the shared tier.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def execute(self):
+        pass
+
+
+class CountingEncoder:
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[len(text), text.count(" ")] for text in texts], dtype=np.float32)
+
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def test_repeated_text_skips_model(self):
+        cache = EmbeddingCache("test-model")
+        encoder = CountingEncoder()
+        first = cache.encode(["What happened?", "We went out.", "What happened?"], encoder)
+        second = cache.encode(["What happened?", "Who was there?"], encoder)
+
+        assert encoder.calls == [["What happened?", "We went out."], ["Who was there?"]]
+        np.testing.assert_array_equal(first[0], second[0])
+        assert cache.stats()["local_hits"] == 1
+        assert cache.stats()["misses"] == 3
+
+    def test_local_tier_is_bounded(self):
+        cache = EmbeddingCache("test-model", max_size=2)
+        encoder = CountingEncoder()
+        cache.encode(["a", "b", "c"], encoder)
+
+        assert cache.stats()["local_size"] == 2
+        cache.encode(["a"], encoder)
+        assert encoder.calls[-1] == ["a"]
+
+    def test_redis_tier_is_shared(self):
+        redis_client = FakeRedis()
+        encoder = CountingEncoder()
+        EmbeddingCache("test-model", redis_client=redis_client).encode(["Tell me more."], encoder)
+
+        other_worker = EmbeddingCache("test-model", redis_client=redis_client)
+        embedding = other_worker.encode(["Tell me more."], encoder)
+
+        assert len(encoder.calls) == 1
+        assert embedding.dtype == np.float32
+        assert other_worker.stats()["redis_hits"] == 1
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import numpy as np
+import redis
+import redis.asyncio
+from tools.feedback_jobs import QUEUE_KEY, FeedbackJobs, FeedbackWorker, transcript_hash
+from tools.redis_connection import REDIS_DB, REDIS_HOST, REDIS_PORT
+from tools.score_transcripts import score_transcript
+
+TRANSCRIPT = ["Tell me what happened.", "We went to the park.", "Who was at the park?", "Mum and Sam."]
+
+
+class Encoder:
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(texts)
+        return np.stack([np.random.default_rng(abs(hash(text)) % 2 ** 32).normal(size=8) for text in texts])
+
+
+class TestFeedbackJobs(unittest.IsolatedAsyncioTestCase):
+    """
+    Runs against the Redis instance from REDIS_HOST/REDIS_PORT, skipped when there isn't one.
+    """
+
+    async def asyncSetUp(self):
+        # clients of their own, since the shared ones are bound to the first test's event loop
+        self.redis_client = redis.asyncio.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+        try:
+            await self.redis_client.ping()
+        except redis.ConnectionError:
+            self.skipTest("no Redis instance available")
+        self.sync_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+        self.jobs = FeedbackJobs(self.redis_client, ttl=60)
+        self.encoder = Encoder()
+        self.worker = FeedbackWorker(self.sync_client, self.encoder, batch_size=4, ttl=60)
+
+    async def asyncTearDown(self):
+        keys = [key async for key in self.redis_client.scan_iter("feedback_jobs:*")]
+        if keys:
+            await self.redis_client.delete(*keys)
+        await self.redis_client.aclose()
+        self.sync_client.close()
+
+    async def test_duplicates_share_one_job(self):
+        first = await self.jobs.submit(TRANSCRIPT)
+        second = await self.jobs.submit(list(TRANSCRIPT))
+
+        assert first == second == {"job_id": transcript_hash(TRANSCRIPT), "status": "queued"}
+        assert await self.jobs.queue_length() == 1
+        assert await self.redis_client.lrange(QUEUE_KEY, 0, -1) == [first["job_id"]]
+
+    async def test_batch_is_encoded_once_and_scored(self):
+        other = TRANSCRIPT[:2] + ["Where did you go next?", "Home."]
+        job_ids = [(await self.jobs.submit(transcript))["job_id"] for transcript in (TRANSCRIPT, other)]
+
+        assert self.worker.process(self.worker.take(timeout=1)) == 2
+        assert len(self.encoder.calls) == 1 and len(self.encoder.calls[0]) == 6
+        job = await self.jobs.get(job_ids[0])
+        expected = score_transcript(job_ids[0], self.encoder(TRANSCRIPT))
+        assert job["status"] == "done" and job["score"] == expected["score"] and job["windows"] == expected["windows"]
+        assert await self.jobs.submit(TRANSCRIPT) == job
+        assert await self.jobs.queue_length() == 0
+
+    async def test_failed_job_is_queued_again(self):
+        def fail(texts):
+            raise RuntimeError("out of memory")
+
+        job_id = (await self.jobs.submit(TRANSCRIPT))["job_id"]
+        FeedbackWorker(self.sync_client, fail).process(self.worker.take(timeout=1))
+
+        assert (await self.jobs.wait(job_id, timeout=1))["status"] == "error"
+        assert (await self.jobs.submit(TRANSCRIPT))["status"] == "queued"
+        self.worker.process(self.worker.take(timeout=1))
+        assert "error" not in await self.jobs.get(job_id)
+
+    async def test_unknown_job(self):
+        assert await self.jobs.get("nope") is None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+import app
+from tests.fake_mistral import FakeMistral
+from tools import conversational_child
+from tools.llm_client import LLMClient
+from tools.session_store import MemorySessionStore
+
+
+async def feedback(Q1, A1, Q2):
+    return {"q_type": "Open-Ended", "q_stage": "Investigative", "context_switch": False,
+            "stage_confidence": 0.95, "stage_tier": "local", "previous": Q1}
+
+
+class TestInterviewSocket(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeMistral(reply=lambda messages: "I was at the park").start()
+        self.store = MemorySessionStore()
+        llm = LLMClient(api_key="test", server_url=self.fake.url, timeout=2, max_retries=0, rate_limit=0)
+        mock.patch.object(conversational_child, "llm_client", llm).start()
+        mock.patch.multiple(app, session_store=self.store, live_feedback=feedback).start()
+        self.addCleanup(mock.patch.stopall)
+        self.addCleanup(self.fake.stop)
+        # no lifespan, so the models are never loaded
+        self.client = TestClient(app.app)
+        self.session_id = asyncio.run(self.store.create())
+
+    def connect(self):
+        return self.client.websocket_connect(f"/ws/interview?session_id={self.session_id}")
+
+    def turn_frames(self, websocket):
+        """
+        Frames of one message, up to and including both its reply (or error) and its feedback.
+        """
+        frames = []
+        while sum(frame["type"] in ("reply", "feedback", "error") for frame in frames) < 2:
+            frames.append(websocket.receive_json())
+        return frames
+
+    def test_tokens_then_reply_and_feedback(self):
+        with self.connect() as websocket:
+            websocket.send_json({"message": "Where were you?", "scenario": "A day out."})
+            frames = self.turn_frames(websocket)
+
+        types = [frame["type"] for frame in frames if frame["type"] != "feedback"]
+        assert types == ["token"] * 5 + ["reply"]
+        assert "".join(frame["token"] for frame in frames if frame["type"] == "token") == "I was at the park"
+        assert [frame["message"] for frame in frames if frame["type"] == "reply"] == ["I was at the park"]
+        assert [frame["q_type"] for frame in frames if frame["type"] == "feedback"] == ["Open-Ended"]
+        assert all(frame["turn"] == 1 for frame in frames)
+
+    def test_second_turn_sees_the_first(self):
+        with self.connect() as websocket:
+            websocket.send_json({"message": "Where were you?", "scenario": "A day out."})
+            self.turn_frames(websocket)
+            websocket.send_json({"message": "Who was with you?"})
+            frames = self.turn_frames(websocket)
+
+        assert all(frame["turn"] == 2 for frame in frames)
+        assert [frame["previous"] for frame in frames if frame["type"] == "feedback"] == ["Where were you?"]
+        prompt = self.fake.requests[1]["messages"][0]["content"]
+        assert "Where were you?" in prompt and "A day out." in prompt
+        assert asyncio.run(self.store.recent_turns(self.session_id)) == [
+            {"interviewer": "Where were you?", "child": "I was at the park"},
+            {"interviewer": "Who was with you?", "child": "I was at the park"},
+        ]
+
+    def test_disconnect_mid_stream_leaves_history_unchanged(self):
+        self.fake.reply = lambda messages: " ".join(["word"] * 50)
+        self.fake.token_delay = 0.02
+        with self.connect() as websocket:
+            websocket.send_json({"message": "Where were you?", "scenario": "A day out."})
+            while websocket.receive_json()["type"] != "token":
+                pass
+            websocket.close()
+            # the server notices while the reply is still streaming and gives up on it
+            for _ in range(100):
+                if self.fake.streams_aborted:
+                    break
+                time.sleep(0.01)
+
+        assert self.fake.streams_aborted == 1
+        assert asyncio.run(self.store.recent_turns(self.session_id)) == []
+
+    def test_malformed_messages_get_errors(self):
+        with self.connect() as websocket:
+            for text in ("not json", '["x"]', '"hi"', '{"message": ""}', '{"message": 3}', '{"scenario": "A day out."}'):
+                websocket.send_text(text)
+                frame = websocket.receive_json()
+                assert frame["type"] == "error" and "turn" not in frame
+            # the connection is still usable and the refused messages didn't count as turns
+            websocket.send_json({"message": "Where were you?", "scenario": "A day out."})
+            frames = self.turn_frames(websocket)
+
+        assert [frame["message"] for frame in frames if frame["type"] == "reply"] == ["I was at the park"]
+        assert all(frame["turn"] == 1 for frame in frames)
+
+    def test_session_store_failure_is_reported(self):
+        with mock.patch.object(self.store, "append_turn", side_effect=ConnectionError("Redis down")):
+            with self.connect() as websocket:
+                websocket.send_json({"message": "Where were you?", "scenario": "A day out."})
+                frames = self.turn_frames(websocket)
+                websocket.send_json({"message": "Who was with you?"})
+                next_frames = self.turn_frames(websocket)
+
+        assert [frame["message"] for frame in frames if frame["type"] == "error"] == ["Error: Redis down"]
+        assert not any(frame["type"] == "reply" for frame in frames)
+        assert all(frame["turn"] == 2 for frame in next_frames)
+
+    def test_unknown_session_is_refused(self):
+        with self.assertRaises(WebSocketDisconnect) as refused:
+            with self.client.websocket_connect("/ws/interview?session_id=missing") as websocket:
+                websocket.receive_json()
+
+        assert refused.exception.code == 1008
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import tempfile
+import unittest
+import numpy as np
+from unittest import mock
+from tools.classifiers import knn
+from tools.classifiers.knn import KnnIndex
+
+
+def bag_of_words(texts):
+    vocabulary = ["what", "happened", "did", "he", "hit", "you", "bye", "then", "park", "who", "was", "there"]
+    words = [[word.strip("?,.!").lower() for word in text.split()] for text in texts]
+    return np.array([[w.count(term) for term in vocabulary] + [1e-3] for w in words], dtype=np.float32)
+
+
+class TestKnnIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.index = KnnIndex(self.directory.name, threshold=0.9, encode_fn=bag_of_words, refresh_interval=0)
+
+    def test_empty_index_misses(self):
+        assert self.index.search(["What happened?"]) == [None]
+        assert len(self.index) == 0
+
+    def test_near_copy_hits_and_others_fall_through(self):
+        self.index.add(["What happened?", "Did he hit you?"], [1, 3], [2, None])
+        hit, partial, miss = self.index.search(["what happened ?", "Did he hit you?", "Bye then"])
+
+        assert (hit.q_type, hit.stage) == (1, 2) and hit.similarity > 0.99
+        assert (partial.q_type, partial.stage) == (3, None)
+        assert miss is None
+        assert self.index.stats()["hit_rate"] == 2 / 3
+
+    def test_duplicates_are_skipped(self):
+        assert self.index.add(["What happened?", "what  happened?"], [1, 1], [2, 2]) == 1
+        assert self.index.add(["What happened?", "Who was there?"], [1, 2], [2, 2]) == 1
+        assert len(self.index) == 2
+
+    def test_other_processes_see_appends(self):
+        reader = KnnIndex(self.directory.name, threshold=0.9, encode_fn=bag_of_words, refresh_interval=0)
+        assert reader.search(["Who was there?"]) == [None]
+        self.index.add(["Who was there?"], [2], [2])
+
+        assert reader.search(["Who was there?"])[0].q_type == 2
+
+    def test_confirmed_predictions_are_written_on_next_search(self):
+        self.index.confirm("Who was there?", q_type=2)
+        self.index.confirm("Bye then")
+
+        assert self.index.search(["Who was there?"])[0].q_type == 2
+        assert len(self.index) == 1
+
+    def test_interrupted_append_is_cut_back(self):
+        self.index.add(["What happened?"], [1], [2])
+        # an append that stopped after writing its question and labels, but not its embedding
+        with open(f"{self.directory.name}/questions.jsonl", "a") as f:
+            f.write('"Bye then"\n')
+        with open(f"{self.directory.name}/labels.i8", "ab") as f:
+            f.write(np.array([[4, 3]], dtype=np.int8).tobytes())
+        self.index.add(["Who was there?"], [2], [1])
+
+        assert len(self.index) == 2
+        who = self.index.search(["Who was there?"])[0]
+        assert (who.q_type, who.stage) == (2, 1)
+        with open(f"{self.directory.name}/questions.jsonl") as f:
+            assert f.read().splitlines() == ['"What happened?"', '"Who was there?"']
+
+    def test_index_of_another_model_is_switched_off(self):
+        self.index.add(["What happened?"], [1], [2])
+        other = KnnIndex(self.directory.name, encode_fn=bag_of_words, model_name="other-model")
+
+        assert not other.validate()
+        assert other.search(["What happened?"]) == [None]
+        assert "other-model" in other.stats()["error"]
+        with self.assertRaises(ValueError):
+            other.add(["Who was there?"], [2], [2])
+
+
+    def test_only_llm_answers_are_confirmed(self):
+        mock.patch.multiple(knn, KNN_INDEX_ENABLED=True, KNN_APPEND=True, knn_index=self.index).start()
+        self.addCleanup(mock.patch.stopall)
+        knn.confirm_stage("What happened?", {"stage": 1, "confidence": 0.95, "tier": "local"})
+        knn.confirm_stage("Did he hit you?", {"stage": 7, "confidence": 0.99, "tier": "llm"})
+        knn.confirm_stage("Who was there?", {"stage": 2, "confidence": 0.99, "tier": "llm"})
+
+        assert self.index.flush() == 1
+        assert self.index.search(["Who was there?"])[0].stage == 2
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import tempfile
+import unittest
+import numpy as np
+from tools.classifiers.lite import EmbeddingHeads, train_heads
+
+
+def clustered_embeddings(n, seed=0):
+    """
+    Embeddings in four clusters: the q_type label is the cluster, the stage 1 + cluster // 2.
+    """
+    rng = np.random.default_rng(seed)
+    centres = np.eye(4, 8, dtype=np.float32) * 3
+    clusters = rng.integers(0, 4, n)
+    embeddings = centres[clusters] + rng.normal(0, 0.3, (n, 8)).astype(np.float32)
+    return embeddings, [int(c) for c in clusters], [1 + int(c) // 2 for c in clusters]
+
+
+class TestEmbeddingHeads(unittest.TestCase):
+
+    def test_predictions_use_label_ids(self):
+        model = EmbeddingHeads(8, [0, 1, 2, 3, 4], [1, 2, 3])
+        predictions = model.predict(np.zeros((2, 8), dtype=np.float32))
+
+        assert len(predictions) == 2
+        for (qtype, qtype_confidence), (stage, stage_confidence) in predictions:
+            assert qtype in range(5) and stage in (1, 2, 3)
+            assert 0 < qtype_confidence <= 1 and 0 < stage_confidence <= 1
+
+    def test_linear_and_mlp_heads_learn(self):
+        embeddings, q_types, stages = clustered_embeddings(200)
+        test_embeddings, test_q_types, test_stages = clustered_embeddings(50, seed=1)
+        for hidden_size in (0, 16):
+            model = EmbeddingHeads(8, [0, 1, 2, 3, 4], [1, 2, 3], hidden_size=hidden_size)
+            losses = train_heads(model, embeddings, q_types, stages, epochs=30, lr=1e-2)
+            predictions = model.predict(test_embeddings)
+
+            assert losses[-1] < losses[0]
+            assert [qtype for (qtype, _), _ in predictions] == test_q_types
+            assert [stage for _, (stage, _) in predictions] == test_stages
+
+    def test_missing_labels_only_train_the_other_head(self):
+        embeddings, q_types, stages = clustered_embeddings(200)
+        model = EmbeddingHeads(8, [0, 1, 2, 3, 4], [1, 2, 3])
+        train_heads(model, embeddings, q_types, [None] * len(stages), epochs=30, lr=1e-2)
+
+        assert [qtype for (qtype, _), _ in model.predict(embeddings)] == q_types
+
+    def test_save_and_load(self):
+        embeddings, q_types, stages = clustered_embeddings(50)
+        model = EmbeddingHeads(8, [0, 1, 2, 3, 4], [1, 2, 3], hidden_size=16, embedding_model="all-MiniLM-L6-v2")
+        train_heads(model, embeddings, q_types, stages, epochs=5)
+
+        with tempfile.TemporaryDirectory() as directory:
+            model.save_pretrained(directory)
+            loaded = EmbeddingHeads.from_pretrained(directory)
+
+        assert loaded.embedding_model == "all-MiniLM-L6-v2"
+        assert loaded.predict(embeddings) == model.predict(embeddings)
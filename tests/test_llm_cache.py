@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+import redis
+from tools.llm_cache import SemanticCache, normalize
+from tools.redis_connection import get_redis
+
+
+def bag_of_words(texts):
+    """
+    Stand-in for the sentence model: questions sharing most of their words get similar embeddings.
+    """
+    vocabulary = ["tell", "me", "everything", "that", "happened", "what", "else", "all", "where", "were", "you"]
+    return np.array([[text.count(word) for word in vocabulary] for text in texts], dtype=np.float32)
+
+
+class TestNormalize(unittest.TestCase):
+
+    def test_normalize(self):
+        assert normalize('  "Tell me   everything  that happened."\n') == "tell me everything that happened."
+        assert normalize("You were scared?") != normalize("You were scared.")
+
+
+class TestSemanticCache(unittest.TestCase):
+    """
+    Runs against the Redis instance from REDIS_HOST/REDIS_PORT, skipped when there isn't one.
+    """
+
+    def setUp(self):
+        self.redis_client = get_redis()
+        try:
+            self.redis_client.ping()
+        except redis.ConnectionError:
+            self.skipTest("no Redis instance available")
+        self.cache = SemanticCache("test", self.redis_client, bag_of_words, threshold=0.9, ttl=60,
+                                   max_entries=3, index_refresh=0)
+
+    def tearDown(self):
+        keys = list(self.redis_client.scan_iter("llmcache:test:*"))
+        if keys:
+            self.redis_client.delete(*keys)
+
+    def test_exact_hit(self):
+        self.cache.put("Tell me everything that happened.", "Open-ended")
+
+        assert self.cache.get("  tell me everything that HAPPENED.") == "Open-ended"
+        assert self.cache.stats()["exact_hits"] == 1
+
+    def test_near_duplicate_hit(self):
+        self.cache.put("Tell me everything that happened", "Open-ended")
+
+        assert self.cache.get("Tell me everything that happened then") == "Open-ended"
+        assert self.cache.get("Where were you?") is None
+        assert (self.cache.stats()["semantic_hits"], self.cache.stats()["misses"]) == (1, 1)
+
+    def test_least_recently_used_is_evicted(self):
+        for question in ["what", "where were you", "tell me", "all"]:
+            self.cache.put(question, question.upper())
+
+        assert self.cache.get("what") is None
+        assert self.cache.get("all") == "ALL"
+        assert self.redis_client.zcard("llmcache:test:lru") == 3
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,198 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+from tests.fake_mistral import FakeMistral
+from tools.llm_client import LLMClient, LLMError, LLMUnavailable
+from tools.classifiers import LLM_classifier
+from tools import conversational_child, generate_questions, scenario
+
+
+class TestLLMClient(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.fake = FakeMistral(latency=0.05, reply=lambda messages: "Investigative").start()
+        self.client = LLMClient(api_key="test", server_url=self.fake.url, max_concurrency=2,
+                                timeout=2, max_retries=2, retry_base_delay=0.01)
+
+    def tearDown(self):
+        self.fake.stop()
+
+    async def test_complete(self):
+        text = await self.client.complete([{"role": "user", "content": "Classify this"}], "mistral-large-latest")
+
+        assert text == "Investigative"
+        assert self.fake.requests[0]["messages"][0]["content"] == "Classify this"
+
+    async def test_concurrency_is_limited(self):
+        messages = [{"role": "user", "content": "Classify this"}]
+        await asyncio.gather(*[self.client.complete(messages, "mistral-large-latest") for _ in range(6)])
+
+        assert self.fake.max_in_flight == 2
+
+    async def test_does_not_block_event_loop(self):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        task = asyncio.create_task(ticker())
+        await self.client.complete([{"role": "user", "content": "Classify this"}], "mistral-large-latest")
+        task.cancel()
+
+        assert ticks > 3
+
+    async def test_retries_transient_failures(self):
+        self.fake.fail_first = 2
+        text = await self.client.complete([{"role": "user", "content": "Classify this"}], "mistral-large-latest")
+
+        assert text == "Investigative"
+        assert len(self.fake.requests) == 3
+
+    async def test_gives_up_after_max_retries(self):
+        self.fake.fail_first = 10
+        with self.assertRaises(LLMError):
+            await self.client.complete([{"role": "user", "content": "Classify this"}], "mistral-large-latest")
+
+        assert len(self.fake.requests) == 3
+
+    async def test_does_not_retry_bad_requests(self):
+        self.fake.fail_first, self.fake.fail_status = 10, 400
+        with self.assertRaises(LLMError):
+            await self.client.complete([{"role": "user", "content": "Classify this"}], "mistral-large-latest")
+
+        assert len(self.fake.requests) == 1
+
+    async def test_timeout(self):
+        self.fake.latency = 1
+        client = LLMClient(api_key="test", server_url=self.fake.url, timeout=0.1, max_retries=0)
+        start = time.perf_counter()
+        with self.assertRaises(LLMError):
+            await client.complete([{"role": "user", "content": "Classify this"}], "mistral-large-latest")
+
+        assert time.perf_counter() - start < 0.9
+
+    async def test_stream(self):
+        self.fake.reply = lambda messages: "I was at my nan's house"
+        tokens = [token async for token in self.client.stream([{"role": "user", "content": "Hi"}], "mistral-large-latest")]
+
+        assert len(tokens) == 6
+        assert "".join(tokens) == "I was at my nan's house"
+
+    async def test_closing_stream_early_frees_slot(self):
+        self.fake.reply = lambda messages: " ".join(["word"] * 50)
+        self.fake.token_delay = 0.01
+        client = LLMClient(api_key="test", server_url=self.fake.url, max_concurrency=1, timeout=2)
+        stream = client.stream([{"role": "user", "content": "Hi"}], "mistral-large-latest")
+        assert await stream.__anext__() == "word"
+        await stream.aclose()
+
+        # the only concurrency slot is free again
+        assert await asyncio.wait_for(client.complete([{"role": "user", "content": "Hi"}], "mistral-large-latest"), 2)
+        for _ in range(100):
+            if self.fake.streams_aborted:
+                break
+            await asyncio.sleep(0.01)
+        assert self.fake.streams_aborted == 1
+
+    async def test_full_queue_is_shed(self):
+        self.fake.latency = 0.3
+        client = LLMClient(api_key="test", server_url=self.fake.url, max_concurrency=1, max_queue=2, rate_limit=0)
+        messages = [{"role": "user", "content": "Classify this"}]
+        results = await asyncio.gather(*[client.complete(messages, "mistral-large-latest") for _ in range(4)],
+                                       return_exceptions=True)
+
+        assert results[:3] == ["Investigative"] * 3
+        assert isinstance(results[3], LLMUnavailable) and results[3].reason == "queue_full"
+
+    async def test_call_past_its_deadline_is_shed(self):
+        self.fake.latency = 0.5
+        client = LLMClient(api_key="test", server_url=self.fake.url, max_concurrency=1, deadline=0.2, rate_limit=0)
+        messages = [{"role": "user", "content": "Classify this"}]
+        start = time.perf_counter()
+        first, second = await asyncio.gather(client.complete(messages, "mistral-large-latest"),
+                                             client.complete(messages, "mistral-large-latest"), return_exceptions=True)
+
+        assert isinstance(first, LLMError) and not isinstance(first, LLMUnavailable)
+        assert isinstance(second, LLMUnavailable) and second.reason == "deadline"
+        assert time.perf_counter() - start < 0.45
+
+    async def test_circuit_opens_after_failures(self):
+        self.fake.fail_first = 10
+        client = LLMClient(api_key="test", server_url=self.fake.url, max_retries=0, breaker_failures=2,
+                           breaker_reset=60, rate_limit=0)
+        messages = [{"role": "user", "content": "Classify this"}]
+        for _ in range(2):
+            with self.assertRaises(LLMError):
+                await client.complete(messages, "mistral-large-latest")
+        with self.assertRaises(LLMUnavailable) as shed:
+            await client.complete(messages, "mistral-large-latest")
+
+        assert shed.exception.reason == "circuit_open"
+        assert len(self.fake.requests) == 2
+        assert client.stats()["circuit"] == "open"
+
+    async def test_aclose_closes_connection_pool(self):
+        await self.client.complete([{"role": "user", "content": "Classify this"}], "mistral-large-latest")
+        pool = self.client._async_http
+        await self.client.aclose()
+
+        assert pool.is_closed
+        assert await self.client.complete([{"role": "user", "content": "Classify this"}], "mistral-large-latest")
+        await self.client.aclose()
+
+    async def test_pool_of_previous_event_loop_is_closed(self):
+        messages = [{"role": "user", "content": "Classify this"}]
+        # the first call runs on an event loop of its own, which has finished by the next call
+        await asyncio.to_thread(asyncio.run, self.client.complete(messages, "mistral-large-latest"))
+        stale = self.client._async_http
+        await self.client.complete(messages, "mistral-large-latest")
+        await asyncio.sleep(0)
+
+        assert stale.is_closed and self.client._async_http is not stale
+        await self.client.aclose()
+
+    async def test_tools_use_shared_client(self):
+        self.fake.reply = lambda messages: "Scenario: A short scenario.\nName: Amy\nAge: 7"
+        for module in (LLM_classifier, conversational_child, generate_questions, scenario):
+            mock.patch.object(module, "llm_client", self.client).start()
+        mock.patch.multiple(LLM_classifier, question_type_cache=None, stage_cache=None).start()
+        self.addCleanup(mock.patch.stopall)
+
+        assert await LLM_classifier.LLM_get_stage_async("What happened?") == self.fake.reply([])
+        assert await LLM_classifier.LLM_get_question_type_async("What happened?") == self.fake.reply([])
+        assert await generate_questions.LLM_generate_question_async("Directive") == self.fake.reply([])
+        assert await conversational_child.get_child_response_async("scenario", "", "Hello") == self.fake.reply([])
+        assert await scenario.create_scenario_async() == {"Scenario": "A short scenario.", "Name": "Amy", "Age": "7"}
+        assert len(self.fake.requests) == 5
+
+    async def test_cache_failure_keeps_mistral_answer(self):
+        broken = mock.Mock()
+        broken.get.side_effect = broken.put.side_effect = ConnectionError("cache down")
+        mock.patch.object(LLM_classifier, "llm_client", self.client).start()
+        mock.patch.multiple(LLM_classifier, question_type_cache=broken, stage_cache=broken).start()
+        self.addCleanup(mock.patch.stopall)
+
+        assert await LLM_classifier.LLM_get_stage_async("What happened?") == "Investigative"
+        assert await LLM_classifier.LLM_get_question_type_async("What happened?") == "Investigative"
+        assert LLM_classifier.LLM_get_stage("What happened?") == "Investigative"
+        assert broken.put.call_count == 3
+
+    async def test_unexpected_failure_raises_llm_error(self):
+        client = mock.Mock()
+        client.complete = mock.AsyncMock(side_effect=ValueError("unparseable response"))
+        mock.patch.object(LLM_classifier, "llm_client", client).start()
+        mock.patch.multiple(LLM_classifier, question_type_cache=None, stage_cache=None).start()
+        self.addCleanup(mock.patch.stopall)
+
+        with self.assertRaises(LLMError):
+            await LLM_classifier.LLM_get_stage_async("What happened?")
+        with self.assertRaises(LLMError):
+            await LLM_classifier.LLM_get_question_type_async("What happened?")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import json
+import logging
+import unittest
+from tools import metrics
+from tools.logging_config import JsonFormatter, TextFormatter
+
+
+def sample(name, **labels):
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_timer_observes_labels_set_inside(self):
+        before = sample("sierra_llm_seconds_count", tool="test", outcome="ok")
+        with metrics.Timer(metrics.LLM_SECONDS, tool="test", outcome="error") as timer:
+            timer.labels["outcome"] = "ok"
+
+        assert sample("sierra_llm_seconds_count", tool="test", outcome="ok") == before + 1
+        assert sample("sierra_llm_seconds_count", tool="test", outcome="error") == 0.0
+
+    def test_render_includes_histograms(self):
+        with metrics.Timer(metrics.FORWARD_SECONDS, model="test"):
+            pass
+        body, content_type = metrics.render()
+
+        assert content_type.startswith("text/plain")
+        assert b'sierra_forward_seconds_bucket{le="0.0005",model="test"}' in body
+
+
+class TestLogFormatters(unittest.TestCase):
+
+    def record(self):
+        record = logging.LogRecord("tools.test", logging.WARNING, __file__, 1, "Mistral call failed", (), None)
+        record.tool = "stage"
+        return record
+
+    def test_json_includes_extra_fields(self):
+        entry = json.loads(JsonFormatter().format(self.record()))
+
+        assert entry["message"] == "Mistral call failed"
+        assert entry["level"] == "WARNING" and entry["tool"] == "stage"
+
+    def test_text_appends_extra_fields(self):
+        assert TextFormatter().format(self.record()).endswith("Mistral call failed tool=stage")
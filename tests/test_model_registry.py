@@ -0,0 +1,73 @@
+import threading
+import time
+import unittest
+from tools.model_registry import ModelRegistry
+
+
+class SlowLoader:
+
+    def __init__(self, delay=0.05, fail_first=0):
+        self.delay = delay
+        self.fail_first = fail_first
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.calls <= self.fail_first:
+            raise OSError("weights not found")
+        return object()
+
+
+class TestModelRegistry(unittest.TestCase):
+
+    def test_loads_on_first_use_only(self):
+        registry = ModelRegistry()
+        loader = SlowLoader()
+        registry.register("model", loader)
+
+        assert loader.calls == 0 and not registry.is_loaded("model")
+        assert registry.get("model") is registry.get("model")
+        assert loader.calls == 1
+        assert registry.status()["model"]["loaded"]
+
+    def test_concurrent_first_use_loads_once(self):
+        registry = ModelRegistry()
+        loader = SlowLoader(delay=0.1)
+        registry.register("model", loader)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get("model"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert loader.calls == 1
+        assert len({id(result) for result in results}) == 1
+
+    def test_warm_up_in_background(self):
+        registry = ModelRegistry()
+        registry.register("classifier", SlowLoader())
+        unused = SlowLoader()
+        registry.register("unused", unused, warm=False)
+
+        assert not registry.ready()
+        registry.warm_up().join()
+
+        assert registry.ready()
+        assert unused.calls == 0
+
+    def test_failed_load_is_reported_and_retried(self):
+        registry = ModelRegistry()
+        loader = SlowLoader(delay=0, fail_first=1)
+        registry.register("model", loader)
+        registry.load_all()
+
+        assert not registry.ready()
+        assert "weights not found" in registry.status()["model"]["error"]
+        assert registry.get("model") is not None
+        assert registry.ready()
+
+
+if __name__ == "__main__":
+    unittest.main()
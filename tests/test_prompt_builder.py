@@ -0,0 +1,95 @@
+import random
+import unittest
+from tools.conversational_child import render_prompt
+from tools.prompt_builder import PromptBuilder, estimate_tokens, truncate
+from tools.session_store import MemorySessionStore
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(["park", "mum", "Tuesday", "blue", "car", "school", "he", "said", "went"])
+                    for _ in range(words))
+
+
+def turn(rng, max_words=60):
+    return {"interviewer": sentence(rng, rng.randint(1, max_words)), "child": sentence(rng, rng.randint(1, max_words))}
+
+
+async def summarize(summary, turns):
+    return (summary + " " + " ".join(t["child"] for t in turns)).strip()
+
+
+class TestPromptBuilder(unittest.TestCase):
+
+    def test_budget_is_never_exceeded(self):
+        rng = random.Random(0)
+        for _ in range(300):
+            builder = PromptBuilder(budget=rng.randint(400, 1500), recent_turns=rng.randint(1, 8),
+                                    summary_tokens=rng.randint(10, 400))
+            scenario = sentence(rng, rng.randint(5, 600))
+            message = sentence(rng, rng.randint(1, 800))
+            turns = [turn(rng, rng.choice([20, 400])) for _ in range(rng.randint(0, 30))]
+            prompt = builder.build(scenario, message, sentence(rng, rng.randint(0, 500)), turns)
+
+            assert prompt.tokens == estimate_tokens(render_prompt(prompt.scenario, prompt.history, prompt.prompt_content))
+            assert prompt.tokens <= builder.budget
+
+    def test_keeps_recent_turns_and_summary_when_they_fit(self):
+        turns = [{"interviewer": f"question {i}", "child": f"answer {i}"} for i in range(3)]
+        prompt = PromptBuilder(budget=2000).build("scenario", "What happened next?", "She was at the park.", turns)
+
+        assert "She was at the park." in prompt.history
+        assert prompt.history.endswith("\n Interviewer: question 2\n You: answer 2")
+        assert all(f"question {i}" in prompt.history for i in range(3))
+        assert prompt.prompt_content == "What happened next?"
+
+    def test_newest_turn_wins_over_older_ones(self):
+        turns = [{"interviewer": "old " * 400, "child": "old"}, {"interviewer": "newest question", "child": "newest"}]
+        prompt = PromptBuilder(budget=600).build("scenario", "And then?", "", turns)
+
+        assert "newest question" in prompt.history and "old" not in prompt.history
+
+    def test_truncate(self):
+        assert truncate("abcdefghij", 2) == "abcdef"
+        assert truncate("abcdefghij", 2, keep_end=True) == "efghij"
+        assert truncate("abc", 5) == "abc"
+
+
+class TestRollingSummary(unittest.IsolatedAsyncioTestCase):
+
+    async def test_prompt_size_stays_bounded(self):
+        rng = random.Random(1)
+        store = MemorySessionStore()
+        session_id = await store.create()
+        builder = PromptBuilder(budget=1200, recent_turns=4, summary_tokens=100, summary_batch=2,
+                                summarize_fn=summarize)
+        sizes = []
+        for i in range(60):
+            prompt = await builder.for_session(store, session_id, "scenario", f"question {i}")
+            sizes.append(prompt.tokens)
+            await store.append_turn(session_id, f"question {i}", sentence(rng, 30))
+            await builder.fold(store, session_id)
+
+        meta = await store.metadata(session_id)
+        assert int(meta["summarized_turns"]) >= 60 - 4 - 2
+        assert estimate_tokens(meta["summary"]) <= 100
+        assert max(sizes) <= 1200 and max(sizes[30:]) - min(sizes[30:]) < 100
+
+    async def test_fold_waits_for_a_full_batch(self):
+        store = MemorySessionStore()
+        session_id = await store.create()
+        builder = PromptBuilder(recent_turns=2, summary_batch=3, summarize_fn=summarize)
+        for i in range(4):
+            await store.append_turn(session_id, f"q{i}", f"a{i}")
+
+        assert not await builder.fold(store, session_id)
+        await store.append_turn(session_id, "q4", "a4")
+        assert await builder.fold(store, session_id)
+        meta = await store.metadata(session_id)
+        assert meta["summary"] == "a0 a1 a2" and meta["summarized_turns"] == "3"
+
+        prompt = await builder.for_session(store, session_id, "scenario", "q5")
+        assert "a0 a1 a2" in prompt.history and "q2" not in prompt.history and "q3" in prompt.history
+
+
+if __name__ == "__main__":
+    unittest.main()
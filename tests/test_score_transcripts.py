@@ -0,0 +1,46 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+from tools.feedback import score_from_embeddings
+from tools.score_transcripts import load_done, read_transcripts, score_transcript
+
+
+class TestScoreTranscripts(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_reads_and_skips_done(self):
+        with open(self.path("in.jsonl"), "w") as f:
+            f.write(json.dumps({"id": "a", "responses": [{"question": "Q1", "response": "A1"}]}) + "\n\n")
+            f.write(json.dumps({"responses": [{"question": "Q1", "response": "A1"},
+                                              {"question": "Q2", "response": "A2"}]}) + "\n")
+
+        assert list(read_transcripts([self.path("in.jsonl")], done={"a"})) == [("in.jsonl:3", ["Q1", "A1", "Q2", "A2"])]
+
+    def test_resume_drops_cut_off_line(self):
+        with open(self.path("out.jsonl"), "w") as f:
+            f.write(json.dumps({"id": "a", "score": 5}) + "\n" + '{"id": "b", "sco')
+
+        assert load_done(self.path("out.jsonl")) == {"a"}
+        with open(self.path("out.jsonl")) as f:
+            assert f.read() == json.dumps({"id": "a", "score": 5}) + "\n"
+
+    def test_score_and_windows(self):
+        embeddings = np.random.default_rng(0).normal(size=(6, 8))
+        result = score_transcript("a", embeddings)
+
+        assert result["raw_score"] == float(score_from_embeddings(embeddings))
+        assert result["score"] == min(10, int(10 * result["raw_score"]))
+        assert [window["question"] for window in result["windows"]] == [2, 3]
+        assert "error" in score_transcript("b", embeddings[:1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+import redis
+import redis.asyncio
+from tools.redis_connection import REDIS_DB, REDIS_HOST, REDIS_PORT
+from tools.session_store import (MemorySessionStore, RedisSessionStore, SessionStore, create_session_store,
+                                 parse_legacy_history, render_history)
+
+
+class TestLegacyFormat(unittest.TestCase):
+
+    def test_parse_legacy_history(self):
+        history = "active\n Interviewer: Hello\n You: Hi\n Interviewer: What happened?\n You: I fell over."
+        turns = parse_legacy_history(history)
+
+        assert turns == [{"interviewer": "Hello", "child": "Hi"},
+                         {"interviewer": "What happened?", "child": "I fell over."}]
+        assert render_history(turns) == history[len("active"):]
+
+
+class TestInterface(unittest.TestCase):
+
+    def test_incomplete_backend_is_refused(self):
+        class AppendOnly(SessionStore):
+            async def append_turn(self, session_id, interviewer, child):
+                return 1
+
+        with self.assertRaises(TypeError):
+            AppendOnly()
+
+
+class SessionStoreTests:
+    """
+    Behaviour both backends share, run against `self.store` and `self.session_id`.
+    """
+
+    async def test_append_and_read(self):
+        await self.store.append_turn(self.session_id, "Hello", "Hi")
+        await self.store.append_turn(self.session_id, "What happened?", "I fell over.")
+
+        assert await self.store.recent_turns(self.session_id) == [
+            {"interviewer": "Hello", "child": "Hi"}, {"interviewer": "What happened?", "child": "I fell over."}]
+        assert (await self.store.metadata(self.session_id))["turns"] == "2"
+        assert await self.store.exists(self.session_id)
+
+    async def test_bounded_window(self):
+        for i in range(10):
+            await self.store.append_turn(self.session_id, f"question {i}", f"answer {i}")
+
+        turns = await self.store.recent_turns(self.session_id, 3)
+        assert [turn["interviewer"] for turn in turns] == ["question 7", "question 8", "question 9"]
+
+    async def test_turn_range_and_metadata_update(self):
+        for i in range(5):
+            await self.store.append_turn(self.session_id, f"question {i}", f"answer {i}")
+        await self.store.update_metadata(self.session_id, {"summary": "At the park.", "summarized_turns": 2})
+
+        assert [turn["interviewer"] for turn in await self.store.turn_range(self.session_id, 1, 3)] == \
+            ["question 1", "question 2"]
+        meta = await self.store.metadata(self.session_id)
+        assert meta["summary"] == "At the park." and meta["summarized_turns"] == "2" and meta["turns"] == "5"
+
+    async def test_concurrent_appends_are_not_lost(self):
+        await asyncio.gather(*[self.store.append_turn(self.session_id, f"q{i}", f"a{i}") for i in range(20)])
+
+        assert len(await self.store.recent_turns(self.session_id)) == 20
+
+
+class TestMemorySessionStore(SessionStoreTests, unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.store = MemorySessionStore(ttl=60)
+        self.session_id = await self.store.create()
+
+    async def test_expires_after_ttl(self):
+        self.store.ttl = 0.05
+        await self.store.append_turn(self.session_id, "Hello", "Hi")
+        time.sleep(0.06)
+
+        assert not await self.store.exists(self.session_id)
+        assert await self.store.recent_turns(self.session_id) == []
+
+    async def test_evicts_least_recently_used(self):
+        store = MemorySessionStore(ttl=60, max_sessions=2)
+        first, second = await store.create(), await store.create()
+        await store.append_turn(first, "Hello", "Hi")
+        third = await store.create()
+
+        assert await store.exists(first) and await store.exists(third)
+        assert not await store.exists(second)
+
+    def test_backend_from_config(self):
+        assert isinstance(create_session_store("memory"), MemorySessionStore)
+        with mock.patch("tools.session_store.get_async_redis"):
+            assert isinstance(create_session_store("redis"), RedisSessionStore)
+        with self.assertRaises(ValueError):
+            create_session_store("memcached")
+
+
+class TestRedisSessionStore(SessionStoreTests, unittest.IsolatedAsyncioTestCase):
+    """
+    Runs against the Redis instance from REDIS_HOST/REDIS_PORT, skipped when there isn't one.
+    """
+
+    async def asyncSetUp(self):
+        # a client of its own, since the shared one is bound to the first test's event loop
+        self.redis_client = redis.asyncio.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+        try:
+            await self.redis_client.ping()
+        except redis.ConnectionError:
+            self.skipTest("no Redis instance available")
+        self.store = RedisSessionStore(self.redis_client, ttl=60)
+        self.session_id = await self.store.create()
+
+    async def asyncTearDown(self):
+        await self.redis_client.delete(self.session_id, f"session:{self.session_id}:turns",
+                                       f"session:{self.session_id}:meta")
+        await self.redis_client.aclose()
+
+    async def test_ttl_is_refreshed(self):
+        await self.redis_client.expire(f"session:{self.session_id}:meta", 5)
+        await self.store.append_turn(self.session_id, "Hello", "Hi")
+
+        assert await self.redis_client.ttl(f"session:{self.session_id}:meta") > 5
+        assert await self.redis_client.ttl(f"session:{self.session_id}:turns") > 5
+
+    async def test_migrates_legacy_session(self):
+        await self.redis_client.set(self.session_id, "active\n Interviewer: Hello\n You: Hi", ex=60)
+        await self.store.append_turn(self.session_id, "What happened?", "I fell over.")
+
+        assert await self.redis_client.exists(self.session_id) == 0
+        assert await self.store.history(self.session_id) == \
+            "\n Interviewer: Hello\n You: Hi\n Interviewer: What happened?\n You: I fell over."
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
-from tools.feedback import calculate_similarity, calculate_score, InvalidQAQError
+from scipy.spatial import distance
+from tools.feedback import calculate_similarity, calculate_score, InvalidQAQError, sentence_model, THRESHOLD
 
 
 
@@ -31,6 +32,19 @@ class TestFeedback(unittest.TestCase):
 
         self.assertTrue("QAQ list must be of length 3" in str(context.exception))
        
+    def test_score_matches_pairwise(self):
+        QResponseList = ["Tell me what happened.", "We went to the park.", "Who was at the park?",
+                         "My uncle and my cousin.", "What did your uncle do?", "He shouted at me.", "Then what happened?"]
+        embeddings = [sentence_model.encode(text) for text in QResponseList]
+        expected = []
+        for i in range(2, len(QResponseList) - 1):
+            score = max(1, (1 - distance.cosine(embeddings[i - 2], embeddings[i])) / THRESHOLD)
+            if score < 0.2:
+                score = max(1, (1 - distance.cosine(embeddings[i - 1], embeddings[i])) / THRESHOLD)
+            expected.append(score)
+
+        self.assertAlmostEqual(calculate_score(QResponseList), sum(expected) / len(expected), places=5)
+
     def test_not_similar(self):
         QAQ = ["What is your name?", "The sky is Blue", "Toyota Corrolla?"]
         score = calculate_similarity(QAQ)
@@ -0,0 +1,68 @@
+import asyncio
+import unittest
+from tools.single_flight import SingleFlight
+
+
+class Work:
+
+    def __init__(self, result="Open-ended", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_duplicates_share_one_call(self):
+        flight, work = SingleFlight(), Work()
+        callers = [asyncio.create_task(flight.do("q_type", question, work))
+                   for question in ["What happened?", "what  happened?", " WHAT happened? "]]
+        await asyncio.sleep(0)
+        work.release.set()
+
+        assert await asyncio.gather(*callers) == ["Open-ended"] * 3
+        assert work.calls == 1
+        assert flight.stats()["q_type"] == {"leaders": 1, "followers": 2, "coalesced_rate": 2 / 3, "in_flight": 0}
+
+    async def test_different_keys_and_later_calls_run_again(self):
+        flight, work = SingleFlight(), Work()
+        work.release.set()
+        await asyncio.gather(flight.do("q_type", "What happened?", work), flight.do("stage", "What happened?", work),
+                             flight.do("q_type", "Who was there?", work))
+        await flight.do("q_type", "What happened?", work)
+
+        assert work.calls == 4
+
+    async def test_error_reaches_every_waiter(self):
+        flight, work = SingleFlight(), Work(error=RuntimeError("Mistral unavailable"))
+        callers = [asyncio.create_task(flight.do("llm_stage", "What happened?", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        work.release.set()
+
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert work.calls == 1
+
+    async def test_cancelled_caller_does_not_cancel_the_others(self):
+        flight, work = SingleFlight(), Work()
+        first = asyncio.create_task(flight.do("q_type", "What happened?", work))
+        second = asyncio.create_task(flight.do("q_type", "What happened?", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        work.release.set()
+
+        assert await second == "Open-ended"
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from tools.classifiers.cascade import StageCascade, stage_index
+from tools.llm_client import LLMUnavailable
+
+
+class TestStageCascade(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.llm_calls = []
+
+        async def llm(question):
+            self.llm_calls.append(question)
+            return "Closing"
+
+        self.cascade = StageCascade(threshold=0.8, llm_fn=llm)
+
+    def test_stage_names_from_both_tiers(self):
+        assert stage_index("Introduction") == 1
+        assert stage_index("Investigation stage") == stage_index("Investigative.") == 2
+        assert stage_index("Closing phase") == stage_index(" closing") == 3
+        assert stage_index("I think it is the middle") is None
+
+    async def test_confident_local_prediction_skips_llm(self):
+        result = await self.cascade.resolve("What happened next?", {"stage": "Investigation stage", "confidence": 0.95})
+
+        assert result == {"stage": 2, "confidence": 0.95, "tier": "local"}
+        assert self.llm_calls == []
+
+    async def test_unsure_local_prediction_escalates(self):
+        result = await self.cascade.resolve("Is there anything else?", {"stage": "Introduction", "confidence": 0.5})
+
+        assert result["stage"] == 3 and result["tier"] == "llm"
+        assert self.llm_calls == ["Is there anything else?"]
+
+    async def test_unusable_llm_answer_keeps_local_prediction(self):
+        async def llm(question):
+            return "Not sure"
+
+        cascade = StageCascade(threshold=0.8, llm_fn=llm)
+        result = await cascade.resolve("Hello", {"stage": "Introduction", "confidence": 0.5})
+
+        assert result == {"stage": 1, "confidence": 0.5, "tier": "local"}
+
+    async def test_failed_llm_call_keeps_local_prediction(self):
+        async def llm(question):
+            raise LLMUnavailable("Mistral is unavailable", "circuit_open")
+
+        cascade = StageCascade(threshold=0.8, llm_fn=llm)
+        result = await cascade.resolve("Hello", {"stage": "Introduction", "confidence": 0.5})
+
+        assert result == {"stage": 1, "confidence": 0.5, "tier": "local"}
+        assert cascade.stats()["llm_failures"] == 1
+
+    async def test_stats(self):
+        await self.cascade.resolve("Hi", {"stage": "Introduction", "confidence": 0.9})
+        await self.cascade.resolve("Hi", {"stage": "Introduction", "confidence": 0.9})
+        await self.cascade.resolve("Bye", {"stage": "Introduction", "confidence": 0.1})
+        stats = self.cascade.stats()
+
+        assert (stats["local"], stats["llm"]) == (2, 1)
+        assert abs(stats["llm_rate"] - 1 / 3) < 1e-9
+        assert set(stats["llm_latency_ms"]) == {"p50", "p95", "p99"}
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+from unittest import mock
+import redis
+import redis.asyncio
+from tools.redis_connection import REDIS_DB, REDIS_HOST, REDIS_PORT
+from tools import warm_pool
+from tools.warm_pool import REFILL_LOCK_KEY, WarmPool
+
+
+async def produce():
+    await asyncio.sleep(0.01)
+    return "What happened next?"
+
+
+class TestWarmPoolRefill(unittest.IsolatedAsyncioTestCase):
+    """
+    Runs against the Redis instance from REDIS_HOST/REDIS_PORT, skipped when there isn't one that
+    runs Lua scripts.
+    """
+
+    async def asyncSetUp(self):
+        self.redis_client = redis.asyncio.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+        try:
+            await self.redis_client.ping()
+        except redis.ConnectionError:
+            self.skipTest("no Redis instance available")
+        try:
+            await self.redis_client.eval("return 1", 0)
+        except (redis.ResponseError, redis.ConnectionError):
+            # e.g. a stand-in server without Lua scripting
+            self.skipTest("Redis instance can't run Lua scripts")
+        self.pool = WarmPool(self.redis_client, low=2, high=4, refill_concurrency=2)
+
+    async def asyncTearDown(self):
+        keys = [key async for key in self.redis_client.scan_iter("test-pool:*")]
+        await self.redis_client.delete(REFILL_LOCK_KEY, *keys)
+        await self.redis_client.aclose()
+
+    async def test_refill_tops_up_and_releases_lock(self):
+        self.pool._producers = lambda: [("test-pool:a", produce), ("test-pool:b", produce)]
+
+        assert await self.pool.refill() == 8
+        assert await self.redis_client.llen("test-pool:a") == 4
+        assert await self.redis_client.get(REFILL_LOCK_KEY) is None
+
+    async def test_lock_held_by_another_worker_is_left_alone(self):
+        self.pool._producers = lambda: [("test-pool:a", produce)]
+        await self.redis_client.set(REFILL_LOCK_KEY, "other-worker", ex=60)
+
+        assert await self.pool.refill() == 0
+        assert await self.redis_client.get(REFILL_LOCK_KEY) == "other-worker"
+
+    async def test_refill_stops_once_lock_is_lost(self):
+        async def lose_lock():
+            await self.redis_client.set(REFILL_LOCK_KEY, "other-worker", ex=60)
+            return await produce()
+
+        self.pool._producers = lambda: [("test-pool:a", lose_lock), ("test-pool:b", produce)]
+
+        assert await self.pool.refill() == 1
+        assert await self.redis_client.llen("test-pool:b") == 0
+        assert await self.redis_client.get(REFILL_LOCK_KEY) == "other-worker"
+
+
+class TestDisabledWarmPool(unittest.IsolatedAsyncioTestCase):
+
+    async def test_generates_live_without_asking_redis(self):
+        redis_client = mock.Mock()
+        mock.patch.object(warm_pool, "LLM_generate_question_async", mock.AsyncMock(return_value="Who was there?")).start()
+        mock.patch.object(warm_pool, "create_scenario_async", mock.AsyncMock(return_value={"Scenario": "A day out."})).start()
+        self.addCleanup(mock.patch.stopall)
+        pool = WarmPool(redis_client, enabled=False)
+
+        assert await pool.get_question("Directive questions") == "Who was there?"
+        assert await pool.get_scenario() == {"Scenario": "A day out."}
+        assert redis_client.lpop.call_count == redis_client.hincrby.call_count == 0
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing `rate` calls per second on average and bursts of up to `burst` calls.
+
+    A call reserves its token up front and is told how long to wait for it, so callers are served
+    in the order they asked and none waits longer than it has to.
+    """
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            rate: tokens added per second, 0 or less for no limit.
+            burst: most tokens the bucket holds.
+            clock: monotonic time in seconds.
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """
+        Takes a token, if one is available within `max_wait` seconds.
+
+        Args:
+            max_wait: longest the caller can wait for its token.
+
+        Returns:
+            float: seconds to wait before the token can be used, None (and no token taken) if that
+            would be longer than `max_wait`.
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # tokens go negative while there are reservations waiting for them
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing dependency for a while instead of letting every request wait for it
+    to time out.
+
+    After `failure_threshold` failures in a row the circuit opens and `allow` refuses calls. Once
+    `reset_timeout` seconds have passed a single call is let through as a probe: the circuit
+    closes if it succeeds and opens again if it fails.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            failure_threshold: consecutive failures that open the circuit.
+            reset_timeout: seconds the circuit stays open before a probe is let through.
+            clock: monotonic time in seconds.
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """
+        "closed" (calls go through), "open" (calls are refused) or "half_open" (a probe may go through
+        or is in flight).
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or self.clock() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go through now. A call that is allowed must be followed by
+        `record_success`, `record_failure` or `release`.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or self.clock() - self._opened_at < self.reset_timeout:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = self.clock()
+            self._probing = False
+
+    def release(self) -> None:
+        """
+        Ends an allowed call that says nothing about the dependency's health, e.g. a cancelled one.
+        """
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> Dict[str, str | int]:
+        return {"state": self.state, "consecutive_failures": self._failures}
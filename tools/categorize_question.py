@@ -1,10 +1,14 @@
 import random 
 import torch
 from transformers import BertTokenizer, BertForSequenceClassification
+from tools.model_registry import registry
 
-tokenizer = BertTokenizer.from_pretrained('nlptown/bert-base-multilingual-uncased-sentiment')
+SENTIMENT_MODEL_NAME = 'nlptown/bert-base-multilingual-uncased-sentiment'
 
-model = BertForSequenceClassification.from_pretrained('nlptown/bert-base-multilingual-uncased-sentiment')
+# not used by any endpoint, so it is only loaded when get_category is called and never warmed up
+registry.register("sentiment_tokenizer", lambda: BertTokenizer.from_pretrained(SENTIMENT_MODEL_NAME), warm=False)
+registry.register("sentiment_model", lambda: BertForSequenceClassification.from_pretrained(SENTIMENT_MODEL_NAME),
+                  warm=False)
 
 def get_category(question: str):
     """
@@ -18,6 +22,8 @@ def get_category(question: str):
     """
 
 
+    tokenizer = registry.get("sentiment_tokenizer")
+    model = registry.get("sentiment_model")
     with torch.no_grad():
         inputs = tokenizer(question, return_tensors="pt")
         outputs = model(**inputs)
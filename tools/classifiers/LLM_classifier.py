@@ -1,50 +1,132 @@
-from mistralai import Mistral
-import os
-
-api_key = os.getenv("MISTRAL_API_KEY")
+import asyncio
+import logging
+from typing import Optional
+from tools.llm_client import LLMError, llm_client
+from tools.llm_cache import SemanticCache, LLM_CACHE_ENABLED
+from tools.redis_connection import get_redis
 
 model = "mistral-large-latest"
+logger = logging.getLogger(__name__)
 
-client = Mistral(api_key=api_key)
 
-def LLM_get_question_type(question: str) -> str:
+def _embed(texts):
+    # imported here so the sentence model is only loaded once the cache needs a near-duplicate lookup
+    from tools.feedback import encode
+    return encode(texts)
+
+
+# answers are shared between workers through Redis, so a stock question is only sent to Mistral once
+question_type_cache = SemanticCache(f"question_type:{model}", get_redis(), _embed) if LLM_CACHE_ENABLED else None
+stage_cache = SemanticCache(f"stage:{model}", get_redis(), _embed) if LLM_CACHE_ENABLED else None
+
+
+def _cache_get(cache: Optional[SemanticCache], question: str) -> Optional[str]:
     """
-    Makes Mistral AI API call to classify a given question. This will be used as a backup when
-    our finetuned classifier is unsure.
+    Cached answer for the question, None when there is none or the cache (Redis or the sentence
+    model) fails, so a broken cache only costs a Mistral call.
+    """
+    if cache is None:
+        return None
+    try:
+        return cache.get(question)
+    except Exception as e:
+        logger.warning("LLM cache lookup failed", extra={"error": str(e)})
+        return None
 
-    Args:
-        question: question to be classified
 
-    Returns:
-        str: category question has been classified as.
+def _cache_put(cache: Optional[SemanticCache], question: str, answer: str) -> None:
     """
+    Caches an answer. A failure is logged and ignored, so the answer Mistral gave is never lost to it.
+    """
+    if cache is None:
+        return
     try:
-        chat_response = client.chat.complete(
-            model= model,
-            messages = [
-                {
-                    "role": "user",
-                    "content": f"""Categorise the question "{question}" into one of the categories.
+        cache.put(question, answer)
+    except Exception as e:
+        logger.warning("LLM cache write failed", extra={"error": str(e)})
+
+
+def _question_type_messages(question: str):
+    return [
+        {
+            "role": "user",
+            "content": f"""Categorise the question "{question}" into one of the categories.
                                 Open-ended (A question that encourages an open answer and cannot be answered by yes or no. Sometimes starts with who, what, when, where, or how such as in 'What happened?')
                                 Directive (A 'Who, What, When, Where, or How' question on a specific topic the question should suggest a short specific answer. )
                                 Option-Posing (A multiple choice question (this also includes yes/no questions) where the answer is part of the question but is not implied your question should not suggest anything.)
                                 Suggestive (Questions with presuppositions, implied correct answers, information that the interviewee did not reveal themselves.)
                                 None of the above (statement or question that does not fit into the categories)."""
-                }
-            ]
-        )
+        }
+    ]
+
+
+def _stage_messages(question: str):
+    return [
+        {
+            "role": "user",
+            "content": f"""You receive questions from a police interview and classify them into one of the following stages:
 
-        return chat_response.choices[0].message.content
+                                    
+Introduction (Rapport building, asking general questions not related to the event and establishing the interview process.)
+Investigative (Asking questions about the event that took place)
+Closing (Exiting the interview. Rapport building about the future, end-of-interview processes))
+
+                                    Respond with only the stage.
+
+                                    Classify {question}"""
+        }
+    ]
+
+
+def LLM_get_question_type(question: str) -> str:
+    """
+    Makes Mistral AI API call to classify a given question. This will be used as a backup when
+    our finetuned classifier is unsure. Answers are cached, so the same question (or a near-duplicate
+    of it) is only sent once.
+
+    Args:
+        question: question to be classified
+
+    Returns:
+        str: category question has been classified as.
+    """
+    try:
+        answer = _cache_get(question_type_cache, question)
+        if answer is None:
+            answer = llm_client.complete_sync(_question_type_messages(question), model, tool="question_type")
+            _cache_put(question_type_cache, question, answer)
+        return answer
 
     except Exception as e:
-        print(f"Error calling Mistral API: {e}")
+        logger.warning("Mistral call failed", extra={"tool": "question_type", "error": str(e)})
         return "MistralAI API call error."
 
 
+async def LLM_get_question_type_async(question: str) -> str:
+    """
+    Async version of `LLM_get_question_type`, does not block the event loop. Unlike it, any failure
+    raises `LLMError`, so the caller can fall back to the local classifier instead of getting an
+    error string as the question type.
+    """
+    try:
+        answer = await asyncio.to_thread(_cache_get, question_type_cache, question)
+        if answer is None:
+            answer = await llm_client.complete(_question_type_messages(question), model, tool="question_type")
+            await asyncio.to_thread(_cache_put, question_type_cache, question, answer)
+        return answer
+
+    except LLMError:
+        raise
+    except Exception as e:
+        logger.warning("Mistral call failed", extra={"tool": "question_type", "error": str(e)})
+        raise LLMError(f"question type classification failed: {e}") from e
+
+
 
 def LLM_get_stage(question: str) -> str:
     """
-    Makes Mistral AI API call to classify a question into an interview stage.
+    Makes Mistral AI API call to classify a question into an interview stage. Answers are cached
+    like those of `LLM_get_question_type`.
 
     Args:
         question: question to be classified
@@ -53,29 +135,31 @@ def LLM_get_stage(question: str) -> str:
         str: stage question has been classified as.
     """
     try:
-        chat_response = client.chat.complete(
-            model= model,
-            messages = [
-                {
-                    "role": "user",
-                    "content": f"""You receive questions from a police interview and classify them into one of the following stages:
-
-                                    
-Introduction (Rapport building, asking general questions not related to the event and establishing the interview process.)
-Investigative (Asking questions about the event that took place)
-Closing (Exiting the interview. Rapport building about the future, end-of-interview processes))
-
-                                    Respond with only the stage.
+        answer = _cache_get(stage_cache, question)
+        if answer is None:
+            answer = llm_client.complete_sync(_stage_messages(question), model, tool="stage")
+            _cache_put(stage_cache, question, answer)
+        return answer
 
-                                    Classify {question}"""
-                }
-            ]
-        )
+    except Exception as e:
+        logger.warning("Mistral call failed", extra={"tool": "stage", "error": str(e)})
+        return "Introduction"
 
-        return chat_response.choices[0].message.content
 
+async def LLM_get_stage_async(question: str) -> str:
+    """
+    Async version of `LLM_get_stage`, does not block the event loop. Unlike it, any failure raises
+    `LLMError` instead of defaulting to "Introduction".
+    """
+    try:
+        answer = await asyncio.to_thread(_cache_get, stage_cache, question)
+        if answer is None:
+            answer = await llm_client.complete(_stage_messages(question), model, tool="stage")
+            await asyncio.to_thread(_cache_put, stage_cache, question, answer)
+        return answer
+
+    except LLMError:
+        raise
     except Exception as e:
-        #print(f"Error calling Mistral API: {e}")
-        print("Error calling Mistral API")
-        print(e)
-        return "Introduction"
+        logger.warning("Mistral call failed", extra={"tool": "stage", "error": str(e)})
+        raise LLMError(f"stage classification failed: {e}") from e
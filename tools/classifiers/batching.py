@@ -0,0 +1,110 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+from tools.metrics import QUEUE_DEPTH
+
+MAX_BATCH_SIZE = int(os.getenv("CLASSIFIER_MAX_BATCH_SIZE", "16"))
+MAX_WAIT_MS = float(os.getenv("CLASSIFIER_MAX_WAIT_MS", "5"))
+
+
+class BatchInferenceEngine:
+    """
+    Gathers concurrent inference requests into a queue and runs them as a single batched call.
+
+    A batch is flushed when it reaches `max_batch_size` items or when the oldest queued item has
+    waited `max_wait_ms`. The batch function runs on a worker thread so the event loop is never
+    blocked by a forward pass, and each caller gets back its own future.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], max_batch_size: int = MAX_BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS, executor: Optional[ThreadPoolExecutor] = None,
+                 name: str = "batch"):
+        """
+        Args:
+            batch_fn: function taking a list of inputs and returning a list of results in the same order.
+            max_batch_size: largest number of inputs passed to `batch_fn` at once.
+            max_wait_ms: longest time the first queued input waits for the batch to fill up.
+            executor: thread pool used to run `batch_fn`, defaults to a dedicated single thread.
+            name: engine label of the queue depth metric.
+        """
+        self.batch_fn = batch_fn
+        self.name = name
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._executor = executor or ThreadPoolExecutor(max_workers=1)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._depth = QUEUE_DEPTH.labels(engine=name)
+
+    def submit(self, item: Any) -> asyncio.Future:
+        """
+        Queues an input for the next batch. Must be called from a running event loop.
+
+        Args:
+            item: a single input for `batch_fn`.
+
+        Returns:
+            asyncio.Future: resolves to the result for `item`, or raises the error of its batch.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+        future = loop.create_future()
+        self._queue.put_nowait((item, future))
+        self._depth.set(self._queue.qsize())
+        return future
+
+    def queue_depth(self) -> int:
+        """
+        Returns:
+            int: number of inputs waiting for a batch.
+        """
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        # anything that queued up while we were waiting joins this batch too
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        self._depth.set(self._queue.qsize())
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            batch = [(item, future) for item, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+
+            inputs = [item for item, _ in batch]
+            try:
+                results = list(await self._loop.run_in_executor(self._executor, self.batch_fn, inputs))
+                # results can't be matched to inputs when some are missing, so no caller gets one
+                if len(results) != len(inputs):
+                    raise RuntimeError(f"{self.name} batch returned {len(results)} results for {len(inputs)} inputs")
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
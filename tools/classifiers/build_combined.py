@@ -0,0 +1,108 @@
+"""
+Builds the combined question-type + stage classifier from the two existing checkpoints.
+
+The shared encoder and the question-type head are copied from `tools/classifiers/q_type`. The stage
+head starts from the `tools/classifiers/stage` classifier and is fine-tuned on the shared encoder's
+output. Questions in the training CSV that have a gold `stage` (or `q_type`) label are trained on
+that label. Questions without one are distilled from the original stage (or question-type) model,
+so an unlabelled list of interview questions is enough to get started.
+
+Run from the repository root:
+    python -m tools.classifiers.build_combined --data questions.csv [--epochs 3] [--unfreeze-encoder]
+
+The CSV needs a `question` column. The optional `q_type` and `stage` columns use the label names
+from `labels_qtype` / `labels_stage`. The result is saved to `tools/classifiers/combined`, ready for
+CLASSIFIER_MODE=combined.
+"""
+import argparse
+import os
+import random
+from typing import Dict, List, Optional
+
+import torch
+
+# the combined model is built from the two separate PyTorch checkpoints, so always load those
+os.environ["CLASSIFIER_MODE"] = "separate"
+os.environ["CLASSIFIER_BACKEND"] = "torch"
+
+from tools.classifiers import classifier
+from tools.classifiers.combined import BertMultiHeadClassifier
+from tools.classifiers.training_data import load_rows
+
+
+def head_loss(logits: torch.Tensor, teacher_logits: torch.Tensor, labels: List[Optional[int]]) -> torch.Tensor:
+    """
+    Cross-entropy on gold labels where present, KL divergence to the original model elsewhere.
+    """
+    log_probs = torch.nn.functional.log_softmax(logits, dim=-1)
+    teacher_probs = torch.nn.functional.softmax(teacher_logits, dim=-1)
+    losses = []
+    for i, label in enumerate(labels):
+        if label is not None:
+            losses.append(-log_probs[i, label])
+        else:
+            losses.append(torch.nn.functional.kl_div(log_probs[i], teacher_probs[i], reduction="sum"))
+    return torch.stack(losses).mean()
+
+
+def train(model: BertMultiHeadClassifier, rows: List[Dict], epochs: int, batch_size: int, lr: float,
+          unfreeze_encoder: bool) -> None:
+    for parameter in model.parameters():
+        parameter.requires_grad = unfreeze_encoder
+    # with a frozen encoder the question-type head is left exactly as it was in q_type
+    for parameter in model.stage_classifier.parameters():
+        parameter.requires_grad = True
+
+    optimizer = torch.optim.AdamW([p for p in model.parameters() if p.requires_grad], lr=lr)
+
+    for epoch in range(epochs):
+        random.shuffle(rows)
+        model.train()
+        total = 0.0
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            encoding = classifier.tokenizer([row["question"] for row in batch], return_tensors="pt", truncation=True,
+                                            max_length=classifier.MAX_SEQ_LEN, padding='longest')
+            with torch.no_grad():
+                teacher_qtype = classifier.model_qtype(**encoding).logits
+                teacher_stage = classifier.model_stage(**encoding).logits
+
+            qtype_logits, stage_logits = model(**encoding)
+            loss = head_loss(stage_logits, teacher_stage, [row["stage"] for row in batch])
+            if unfreeze_encoder:
+                loss = loss + head_loss(qtype_logits, teacher_qtype, [row["q_type"] for row in batch])
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(batch)
+        print(f"epoch {epoch + 1}/{epochs}: loss {total / len(rows):.4f}")
+    model.eval()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", required=True, help="CSV with a question column and optional q_type/stage labels")
+    parser.add_argument("--output", default=classifier.combined_path)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--lr", type=float, default=None,
+                        help="learning rate, defaults to 1e-3 for the stage head alone and 2e-5 with --unfreeze-encoder")
+    parser.add_argument("--unfreeze-encoder", action="store_true",
+                        help="fine-tune the shared encoder on both tasks instead of only the stage head")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    torch.manual_seed(args.seed)
+
+    lr = args.lr or (2e-5 if args.unfreeze_encoder else 1e-3)
+    rows = load_rows(args.data)
+    model = BertMultiHeadClassifier.from_separate(classifier.model_qtype, classifier.model_stage)
+    train(model, rows, args.epochs, args.batch_size, lr, args.unfreeze_encoder)
+    model.save_pretrained(args.output)
+    print(f"saved combined classifier to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
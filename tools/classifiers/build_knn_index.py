@@ -0,0 +1,53 @@
+"""
+Builds, or adds to, the nearest-neighbour index of labelled questions used by KNN_INDEX_ENABLED.
+
+Run from the repository root:
+    python -m tools.classifiers.build_knn_index --data questions.csv [--rebuild] [--label-missing]
+
+The CSV needs a `question` column and the `q_type` and `stage` columns use the label names from
+`labels_qtype` / `labels_stage`, like the CSV of `build_combined`. Questions already in the index
+are skipped, so the same command adds newly confirmed questions to an existing index. With
+`--label-missing`, labels missing from the CSV are filled in by the BERT classifiers where they are
+at least `--min-confidence` confident. A question left with no label at all is not indexed.
+"""
+import argparse
+import os
+import shutil
+import time
+
+from tools.classifiers.knn import KNN_APPEND_CONFIDENCE, KNN_INDEX_PATH, KnnIndex
+from tools.classifiers.training_data import label_missing, load_rows
+from tools.model_registry import registry
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", required=True, help="CSV with a question column and q_type/stage labels")
+    parser.add_argument("--output", default=KNN_INDEX_PATH, help="index directory")
+    parser.add_argument("--rebuild", action="store_true", help="delete the existing index first")
+    parser.add_argument("--label-missing", action="store_true",
+                        help="fill in missing labels with the classifiers' confident predictions")
+    parser.add_argument("--min-confidence", type=float, default=KNN_APPEND_CONFIDENCE,
+                        help="classifier confidence needed by --label-missing")
+    parser.add_argument("--batch-size", type=int, default=256, help="questions per model batch")
+    args = parser.parse_args()
+
+    if args.rebuild and os.path.isdir(args.output):
+        shutil.rmtree(args.output)
+
+    start = time.perf_counter()
+    rows = load_rows(args.data)
+    if args.label_missing:
+        label_missing(rows, args.min_confidence, args.batch_size)
+    rows = [row for row in rows if row["q_type"] is not None or row["stage"] is not None]
+
+    questions = [row["question"] for row in rows]
+    embeddings = registry.get("sentence_model").encode(questions, batch_size=args.batch_size, convert_to_numpy=True)
+    index = KnnIndex(args.output)
+    added = index.add(questions, [row["q_type"] for row in rows], [row["stage"] for row in rows], embeddings)
+    print(f"added {added} of {len(rows)} labelled questions to {args.output} ({len(index)} in the index) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
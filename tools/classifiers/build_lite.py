@@ -0,0 +1,88 @@
+"""
+Trains the lite question-type + stage classifier: small heads on the MiniLM sentence embeddings.
+
+The sentence model stays frozen, so every question is encoded once and only the heads are trained,
+in seconds on a CPU. A share of the CSV (`--holdout`) is kept out of training and the accuracy of
+both heads on it is printed at the end; `--holdout 0` trains on every question. With
+`--label-missing`, labels missing from the CSV are filled in by the BERT classifiers where they are
+at least `--min-confidence` confident; a question still missing a label only trains the other head.
+
+Run from the repository root:
+    python -m tools.classifiers.build_lite --data questions.csv [--hidden-size 256] [--epochs 50]
+
+The CSV needs a `question` column and the `q_type` and `stage` columns use the label names from
+`labels_qtype` / `labels_stage`, like the CSV of `build_combined`. The result is saved to
+`tools/classifiers/lite`, ready for CLASSIFIER_MODE=lite.
+"""
+import argparse
+import os
+import random
+
+import numpy as np
+
+# --label-missing asks the two separate PyTorch checkpoints
+os.environ["CLASSIFIER_MODE"] = "separate"
+os.environ["CLASSIFIER_BACKEND"] = "torch"
+
+from tools.classifiers import classifier
+from tools.classifiers.lite import EmbeddingHeads, train_heads
+from tools.classifiers.training_data import label_missing, load_rows
+from tools.feedback import SENTENCE_MODEL_NAME
+from tools.model_registry import registry
+
+
+def accuracy(model: EmbeddingHeads, embeddings: np.ndarray, rows, task: int, key: str) -> float:
+    labelled = [i for i, row in enumerate(rows) if row[key] is not None]
+    if not labelled:
+        return float("nan")
+    predictions = model.predict(embeddings[labelled])
+    return sum(prediction[task][0] == rows[i][key] for prediction, i in zip(predictions, labelled)) / len(labelled)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", required=True, help="CSV with a question column and q_type/stage labels")
+    parser.add_argument("--output", default=classifier.lite_path)
+    parser.add_argument("--hidden-size", type=int, default=256, help="hidden units of each head, 0 for linear heads")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--weight-decay", type=float, default=1e-2)
+    parser.add_argument("--dropout", type=float, default=0.1)
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of the questions kept out of training")
+    parser.add_argument("--label-missing", action="store_true",
+                        help="fill in missing labels with the BERT classifiers' confident predictions")
+    parser.add_argument("--min-confidence", type=float, default=0.9,
+                        help="classifier confidence needed by --label-missing")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = load_rows(args.data)
+    if args.label_missing:
+        label_missing(rows, args.min_confidence, args.batch_size)
+    rows = [row for row in rows if row["q_type"] is not None or row["stage"] is not None]
+    random.Random(args.seed).shuffle(rows)
+    held_out = int(len(rows) * args.holdout)
+    train_rows, test_rows = rows[held_out:], rows[:held_out]
+
+    sentence_model = registry.get("sentence_model")
+    embeddings = sentence_model.encode([row["question"] for row in rows], batch_size=args.batch_size,
+                                       convert_to_numpy=True)
+    train_embeddings, test_embeddings = embeddings[held_out:], embeddings[:held_out]
+
+    model = EmbeddingHeads(embeddings.shape[1], sorted(classifier.labels_qtype), sorted(classifier.labels_stage),
+                           hidden_size=args.hidden_size, dropout=args.dropout, embedding_model=SENTENCE_MODEL_NAME)
+    losses = train_heads(model, train_embeddings, [row["q_type"] for row in train_rows],
+                         [row["stage"] for row in train_rows], epochs=args.epochs, batch_size=args.batch_size,
+                         lr=args.lr, weight_decay=args.weight_decay, seed=args.seed)
+    print(f"trained on {len(train_rows)} questions, loss {losses[0]:.4f} -> {losses[-1]:.4f}")
+    if test_rows:
+        print(f"held-out accuracy ({len(test_rows)} questions): "
+              f"q_type {accuracy(model, test_embeddings, test_rows, 0, 'q_type'):.3f}, "
+              f"stage {accuracy(model, test_embeddings, test_rows, 1, 'stage'):.3f}")
+    model.save_pretrained(args.output)
+    print(f"saved lite classifier to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
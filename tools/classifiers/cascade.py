@@ -0,0 +1,105 @@
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+import numpy as np
+
+from tools.classifiers.LLM_classifier import LLM_get_stage_async
+from tools.llm_client import LLMError
+
+STAGE_CONFIDENCE_THRESHOLD = float(os.getenv("STAGE_CONFIDENCE_THRESHOLD", "0.8"))
+
+# stage numbers expected by the frontend, for the local model's labels and the LLM's answers
+STAGE_INDICES = {
+    "introduction": 1,
+    "investigation stage": 2,
+    "investigative": 2,
+    "closing phase": 3,
+    "closing": 3,
+}
+
+
+def stage_index(stage: str) -> Optional[int]:
+    """
+    Maps a stage name from either tier to the stage number used by the frontend.
+
+    Args:
+        stage: stage name from the local model ("Investigation stage") or the LLM ("Investigative.").
+
+    Returns:
+        int: 1 (Introduction), 2 (Investigative) or 3 (Closing), None if the name is not a stage.
+    """
+    return STAGE_INDICES.get(stage.strip().strip(".\"'").lower())
+
+
+class StageCascade:
+    """
+    Two-tier stage classification: the local stage model answers first, and the question is only sent
+    to the LLM when the local model's confidence is below the threshold.
+
+    Keeps a count of the questions answered by each tier and their latencies so the share of LLM
+    calls, and what they cost, can be tracked. When the LLM call fails or is shed (e.g. while
+    Mistral's circuit breaker is open) the local prediction is kept, so a slow or failing Mistral
+    never holds up the answer.
+    """
+
+    def __init__(self, threshold: float = STAGE_CONFIDENCE_THRESHOLD,
+                 llm_fn: Callable[[str], Awaitable[str]] = LLM_get_stage_async, window: int = 1000):
+        """
+        Args:
+            threshold: local confidence below which the LLM is asked.
+            llm_fn: async function returning the LLM's stage name for a question.
+            window: number of recent latencies kept per tier.
+        """
+        self.threshold = threshold
+        self.llm_fn = llm_fn
+        self._counts = {"local": 0, "llm": 0}
+        self._llm_failures = 0
+        self._latencies = {"local": deque(maxlen=window), "llm": deque(maxlen=window)}
+
+    async def resolve(self, question: str, local: Dict[str, str | float],
+                      started: Optional[float] = None) -> Dict[str, int | float | str]:
+        """
+        Decides the stage of a question from the local model's prediction, escalating to the LLM
+        when it is not confident enough.
+
+        Args:
+            question: the question being classified.
+            local: the local model's prediction, {"stage", "confidence"}.
+            started: `time.perf_counter()` when the request started, for the latency stats.
+
+        Returns:
+            dict: stage number, confidence and the tier ("local" or "llm") that answered.
+        """
+        started = time.perf_counter() if started is None else started
+        result = {"stage": stage_index(local["stage"]), "confidence": local["confidence"], "tier": "local"}
+
+        if local["confidence"] < self.threshold:
+            try:
+                stage = stage_index(await self.llm_fn(question))
+            except LLMError:
+                self._llm_failures += 1
+                stage = None
+            # an answer that isn't a stage keeps the local prediction
+            if stage is not None:
+                result = {"stage": stage, "confidence": 0.99, "tier": "llm"}
+
+        self._counts[result["tier"]] += 1
+        self._latencies[result["tier"]].append(time.perf_counter() - started)
+        return result
+
+    def stats(self) -> Dict[str, float | int | Dict[str, float]]:
+        """
+        Returns:
+            dict: questions answered by each tier, the share sent to the LLM, the LLM calls that failed
+            and p50/p95/p99 latency in milliseconds of each tier over the recent window.
+        """
+        total = sum(self._counts.values())
+        stats = {"threshold": self.threshold, **self._counts,
+                 "llm_rate": self._counts["llm"] / total if total else 0.0, "llm_failures": self._llm_failures}
+        for tier, latencies in self._latencies.items():
+            if latencies:
+                p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+                stats[f"{tier}_latency_ms"] = {"p50": p50, "p95": p95, "p99": p99}
+        return stats
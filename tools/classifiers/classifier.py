@@ -1,35 +1,241 @@
 from transformers import BertForSequenceClassification
-from transformers import AutoTokenizer 
+from transformers import AutoTokenizer
+from typing import Dict, List, Tuple
+from tools.classifiers.batching import BatchInferenceEngine
+from tools.classifiers.combined import BertMultiHeadClassifier
+from tools.classifiers.lite import EmbeddingHeads
+from tools.feedback import SENTENCE_MODEL_NAME, encode
+from tools.metrics import FORWARD_SECONDS, TOKENIZE_SECONDS, Timer
+from tools.model_registry import registry
+import threading
 import torch
+import os
 
 
 qtype_path = 'tools/classifiers/q_type'
 stage_path = 'tools/classifiers/stage'
-model_qtype = BertForSequenceClassification.from_pretrained(qtype_path)
-model_stage = BertForSequenceClassification.from_pretrained(stage_path)
-tokenizer = AutoTokenizer.from_pretrained("bert-base-uncased")
+combined_path = 'tools/classifiers/combined'
+lite_path = 'tools/classifiers/lite'
+
+# "separate" runs the two fine-tuned models, "combined" one shared encoder with both heads,
+# "lite" small heads on the MiniLM sentence embeddings instead of any BERT model
+CLASSIFIER_MODE = os.getenv("CLASSIFIER_MODE", "separate")
+# both labels of a question come from one forward pass in these modes
+SINGLE_PASS = CLASSIFIER_MODE in ("combined", "lite")
+# "torch" runs the checkpoints eagerly, "onnx" / "onnx-int8" the models exported by export_onnx.py
+CLASSIFIER_BACKEND = os.getenv("CLASSIFIER_BACKEND", "torch")
+
+
+def _load(path: str, model_class):
+    """
+    Loads a classifier checkpoint with the configured backend.
+    """
+    if CLASSIFIER_BACKEND == "torch":
+        return model_class.from_pretrained(path)
+    if CLASSIFIER_BACKEND not in ("onnx", "onnx-int8"):
+        raise ValueError(f"Unknown CLASSIFIER_BACKEND {CLASSIFIER_BACKEND!r}, expected torch, onnx or onnx-int8")
+    # onnxruntime is only needed when an ONNX backend is configured
+    from tools.classifiers.onnx_backend import OnnxClassifier
+    return OnnxClassifier.from_checkpoint(path, quantized=CLASSIFIER_BACKEND == "onnx-int8")
+
+
+def _load_lite() -> EmbeddingHeads:
+    """
+    Loads the lite heads, which always run in PyTorch, and checks they match the sentence model.
+    """
+    model = EmbeddingHeads.from_pretrained(lite_path)
+    if model.embedding_model != SENTENCE_MODEL_NAME:
+        raise ValueError(f"Lite classifier at {lite_path} was trained on {model.embedding_model}, not {SENTENCE_MODEL_NAME}")
+    return model
+
+
+# models are loaded by the registry on first use rather than when this module is imported
+registry.register("bert_tokenizer", lambda: AutoTokenizer.from_pretrained("bert-base-uncased"),
+                  warm=CLASSIFIER_MODE != "lite")
+# ONNX Runtime sessions don't survive a fork, so each worker loads its own
+_preload = CLASSIFIER_BACKEND == "torch"
+if CLASSIFIER_MODE == "combined":
+    registry.register("classifier_combined", lambda: _load(combined_path, BertMultiHeadClassifier), preload=_preload)
+elif CLASSIFIER_MODE == "lite":
+    registry.register("classifier_lite", _load_lite)
+else:
+    registry.register("classifier_q_type", lambda: _load(qtype_path, BertForSequenceClassification), preload=_preload)
+    registry.register("classifier_stage", lambda: _load(stage_path, BertForSequenceClassification), preload=_preload)
+
+# module attributes kept for the scripts that use the models directly
+_registered_models = {"tokenizer": "bert_tokenizer", "model_qtype": "classifier_q_type",
+                      "model_stage": "classifier_stage", "model_combined": "classifier_combined",
+                      "model_lite": "classifier_lite"}
+# the models each mode runs, any other CLASSIFIER_MODE runs the separate ones
+_mode_models = {"combined": ["model_combined"], "lite": ["model_lite"]}
+
+
+def __getattr__(name: str):
+    """
+    Resolves `tokenizer`, `model_qtype`, `model_stage`, `model_combined` and `model_lite` through
+    the registry, None for the models of the modes that aren't configured.
+    """
+    if name not in _registered_models:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if name != "tokenizer" and name not in _mode_models.get(CLASSIFIER_MODE, ["model_qtype", "model_stage"]):
+        return None
+    return registry.get(_registered_models[name])
+
+
+# the q_type and stage engines run on separate threads, and a fast tokenizer can't be used by two at once
+_tokenizer_lock = threading.Lock()
 labels_qtype = {0: "Neither", 1: "Open-ended", 2: "Directive", 3: "Option Posing", 4: "Suggestive"}
 
 labels_stage = {1: "Introduction", 2: "Investigation stage", 3: "Closing phase"}
-    
+
+# interview questions are short, so anything past this many tokens is truncated
+MAX_SEQ_LEN = int(os.getenv("CLASSIFIER_MAX_SEQ_LEN", "128"))
+# questions are grouped by token length so a long question doesn't inflate the padding of short ones
+LENGTH_BUCKETS = [16, 32, 64, 128, 256, 512]
+
+
+def _length_buckets(lengths: List[int]) -> List[List[int]]:
+    """
+    Groups input indices by token length.
+
+    Args:
+        lengths: token length of each input.
+
+    Returns:
+        list: lists of input indices, one per non-empty length bucket.
+    """
+    edges = [edge for edge in LENGTH_BUCKETS if edge < MAX_SEQ_LEN] + [MAX_SEQ_LEN]
+    buckets = {}
+    for index, length in enumerate(lengths):
+        edge = next(edge for edge in edges if length <= edge)
+        buckets.setdefault(edge, []).append(index)
+    return [buckets[edge] for edge in sorted(buckets)]
+
+
+def _classify_heads(model, questions: List[str], name: str = "other") -> List[List[Tuple[int, float]]]:
+    """
+    Runs a batch of questions through the model, one forward pass per length bucket.
+
+    Args:
+        model: sequence classification model to run, either single-head or `BertMultiHeadClassifier`.
+        questions: questions to be classified.
+        name: model label of the tokenization and forward pass timings.
+
+    Returns:
+        list: for each question in input order, a (predicted label index, confidence) pair per head.
+    """
+    tokenizer = registry.get("bert_tokenizer")
+    with _tokenizer_lock, Timer(TOKENIZE_SECONDS, model=name):
+        encoding = tokenizer(questions, return_tensors="pt", truncation=True, max_length=MAX_SEQ_LEN, padding='longest')
+    lengths = encoding["attention_mask"].sum(dim=1).tolist()
+    results = [None] * len(questions)
+
+    for bucket in _length_buckets(lengths):
+        # BERT pads on the right, so cutting the batch's padding back to the longest question in the
+        # bucket gives the same inputs as tokenizing the bucket on its own
+        rows, width = torch.tensor(bucket), max(lengths[i] for i in bucket)
+        bucket_encoding = {key: value[rows, :width] for key, value in encoding.items()}
+        with torch.no_grad(), Timer(FORWARD_SECONDS, model=name):
+            output = model(**bucket_encoding)
+        heads = output if isinstance(output, tuple) else (output.logits,)
+
+        per_head = []
+        for logits in heads:
+            probabilities = torch.nn.functional.softmax(logits, dim=-1)
+            confidences, predictions = torch.max(probabilities, dim=-1)
+            per_head.append(list(zip(predictions.tolist(), confidences.tolist())))
+        for position, i in enumerate(bucket):
+            results[i] = [head[position] for head in per_head]
+    return results
+
+
+def _classify(model, questions: List[str], name: str = "other") -> List[Tuple[int, float]]:
+    """
+    Single-head version of `_classify_heads`.
+
+    Returns:
+        list: (predicted label index, confidence) for each question, in input order.
+    """
+    return [heads[0] for heads in _classify_heads(model, questions, name)]
+
+
+def _classify_lite(questions: List[str]) -> List[List[Tuple[int, float]]]:
+    """
+    Runs a batch of questions through the lite heads. The embeddings come through the same cache as
+    feedback scoring, so a question scored for context switches is not encoded again.
+
+    Returns:
+        list: for each question in input order, a (predicted label index, confidence) pair per head.
+    """
+    model = registry.get("classifier_lite")
+    embeddings = encode(questions)
+    with Timer(FORWARD_SECONDS, model="lite"):
+        return model.predict(embeddings)
+
+
+def classify(questions: List[str]) -> List[Tuple[Tuple[str, float], Dict[str, str | float]]]:
+    """
+    Gets both the question type and the stage of each question. In combined mode this is a single
+    forward pass through the shared encoder, in lite mode a single sentence encoding.
+
+    Args:
+        questions: questions to be classified.
+
+    Returns:
+        list: ((question type, confidence), {"stage", "confidence"}) for each question.
+    """
+    if not SINGLE_PASS:
+        return list(zip(get_question_types(questions), get_stages(questions)))
+
+    if CLASSIFIER_MODE == "lite":
+        heads = _classify_lite(questions)
+    else:
+        heads = _classify_heads(registry.get("classifier_combined"), questions, "combined")
+    return [((labels_qtype[qtype], qtype_confidence), {"stage": labels_stage[stage], "confidence": stage_confidence})
+            for (qtype, qtype_confidence), (stage, stage_confidence) in heads]
+
+
+def get_question_types(questions: List[str]) -> List[Tuple[str, float]]:
+    """
+    Batched version of `get_question_type`.
+
+    Args:
+        questions: questions to be classified.
+
+    Returns:
+        list: (question type, confidence) for each question.
+    """
+    if SINGLE_PASS:
+        return [qtype for qtype, _ in classify(questions)]
+    return [(labels_qtype[prediction], confidence)
+            for prediction, confidence in _classify(registry.get("classifier_q_type"), questions, "q_type")]
+
+
+def get_stages(questions: List[str]) -> List[Dict[str, str | float]]:
+    """
+    Batched version of `get_stage`.
+
+    Args:
+        questions: questions to be classified.
+
+    Returns:
+        list: {"stage", "confidence"} for each question.
+    """
+    if SINGLE_PASS:
+        return [stage for _, stage in classify(questions)]
+    return [{"stage": labels_stage[prediction], "confidence": confidence}
+            for prediction, confidence in _classify(registry.get("classifier_stage"), questions, "stage")]
+
 
 def get_question_type(question):
-    encoding = tokenizer(question, return_tensors="pt", truncation=True, padding='max_length')
-    with torch.no_grad():
-        output = model_qtype(**encoding)
-    logits = output.logits 
-    probabilities = torch.nn.functional.softmax(logits, dim=-1)
-    prediction = torch.argmax(probabilities, dim=-1).item()
-    confidence = probabilities[0, prediction].item()
-    return (labels_qtype[prediction], confidence)
+    return get_question_types([question])[0]
 
 
 def get_stage(question):
-    encoding = tokenizer(question, return_tensors="pt", truncation=True, padding='max_length')
-    with torch.no_grad():
-        output = model_stage(**encoding)
-    logits = output.logits 
-    probabilities = torch.nn.functional.softmax(logits, dim=-1)
-    prediction = torch.argmax(probabilities, dim=-1).item()
-    confidence = probabilities[0, prediction].item()
-    return {"stage": labels_stage[prediction], "confidence": confidence}
+    return get_stages([question])[0]
+
+
+# shared micro-batching engines used by the async endpoints
+qtype_engine = BatchInferenceEngine(get_question_types, name="q_type")
+stage_engine = BatchInferenceEngine(get_stages, name="stage")
+classify_engine = BatchInferenceEngine(classify, name="classify")
@@ -0,0 +1,64 @@
+from transformers import BertConfig, BertModel, BertPreTrainedModel
+from typing import Tuple
+import torch
+
+
+class BertMultiHeadClassifier(BertPreTrainedModel):
+    """
+    A single BERT encoder with a question-type head and a stage head on its pooled output.
+
+    One forward pass answers both classification tasks, so the combined model replaces the two
+    separate `BertForSequenceClassification` checkpoints at roughly half the memory.
+    The config carries the head sizes as `num_qtype_labels` and `num_stage_labels`, and the label
+    names of each head as `qtype_id2label` and `stage_id2label`.
+    """
+
+    def __init__(self, config: BertConfig):
+        super().__init__(config)
+        # JSON turns the label ids into strings, as PretrainedConfig does for id2label
+        for name in ("qtype_id2label", "stage_id2label"):
+            if hasattr(config, name):
+                setattr(config, name, {int(index): label for index, label in getattr(config, name).items()})
+        self.bert = BertModel(config)
+        dropout = config.classifier_dropout if config.classifier_dropout is not None else config.hidden_dropout_prob
+        self.dropout = torch.nn.Dropout(dropout)
+        self.qtype_classifier = torch.nn.Linear(config.hidden_size, config.num_qtype_labels)
+        self.stage_classifier = torch.nn.Linear(config.hidden_size, config.num_stage_labels)
+        self.post_init()
+
+    def forward(self, input_ids=None, attention_mask=None, token_type_ids=None) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Returns:
+            tuple: (question type logits, stage logits)
+        """
+        pooled = self.bert(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids).pooler_output
+        pooled = self.dropout(pooled)
+        return self.qtype_classifier(pooled), self.stage_classifier(pooled)
+
+    @classmethod
+    def from_separate(cls, model_qtype, model_stage) -> "BertMultiHeadClassifier":
+        """
+        Builds a combined model from the two single-task checkpoints. The encoder and question-type
+        head come from `model_qtype`, so question-type predictions are unchanged. The stage head
+        starts from `model_stage`'s classifier and needs fine-tuning on the shared encoder
+        (see `tools/classifiers/build_combined.py`).
+
+        Args:
+            model_qtype: fine-tuned question-type `BertForSequenceClassification`.
+            model_stage: fine-tuned stage `BertForSequenceClassification`.
+
+        Returns:
+            BertMultiHeadClassifier: the combined model.
+        """
+        config = BertConfig.from_dict(model_qtype.config.to_dict())
+        config.num_qtype_labels = model_qtype.config.num_labels
+        config.num_stage_labels = model_stage.config.num_labels
+        config.qtype_id2label = dict(model_qtype.config.id2label)
+        config.stage_id2label = dict(model_stage.config.id2label)
+        config.architectures = [cls.__name__]
+
+        model = cls(config)
+        model.bert.load_state_dict(model_qtype.bert.state_dict())
+        model.qtype_classifier.load_state_dict(model_qtype.classifier.state_dict())
+        model.stage_classifier.load_state_dict(model_stage.classifier.state_dict())
+        return model
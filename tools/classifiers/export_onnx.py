@@ -0,0 +1,89 @@
+"""
+Exports the question-type and stage classifiers to ONNX for CLASSIFIER_BACKEND=onnx / onnx-int8.
+
+Each checkpoint is exported with dynamic batch and sequence axes to `model.onnx` in its own
+directory. With `--quantize` a dynamically quantized copy (int8 weights, activations quantized at
+run time) is also written to `model.int8.onnx`.
+
+Run from the repository root:
+    python -m tools.classifiers.export_onnx [--quantize] [--models q_type stage combined] [--opset 14]
+
+Check the exported models with `python -m benchmarks.onnx_backend`.
+"""
+import argparse
+import os
+
+import torch
+
+# the exporter needs the PyTorch models, whichever backend the server is configured with
+os.environ["CLASSIFIER_BACKEND"] = "torch"
+
+from transformers import BertForSequenceClassification
+
+from tools.classifiers import classifier
+from tools.classifiers.combined import BertMultiHeadClassifier
+from tools.classifiers.onnx_backend import onnx_path
+
+CHECKPOINTS = {
+    "q_type": (classifier.qtype_path, BertForSequenceClassification),
+    "stage": (classifier.stage_path, BertForSequenceClassification),
+    "combined": (classifier.combined_path, BertMultiHeadClassifier),
+}
+
+
+class _Logits(torch.nn.Module):
+    """
+    Wraps a classifier so the exported graph returns plain logits tensors, one per head.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        output = self.model(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)
+        return output if isinstance(output, tuple) else (output.logits,)
+
+
+def export(name: str, opset: int, quantize: bool) -> None:
+    checkpoint, model_class = CHECKPOINTS[name]
+    model = model_class.from_pretrained(checkpoint)
+    model.eval()
+
+    encoding = classifier.tokenizer(["What happened after you got home?", "Hi"], return_tensors="pt",
+                                    padding="longest")
+    inputs = (encoding["input_ids"], encoding["attention_mask"], encoding["token_type_ids"])
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    output_names = ["qtype_logits", "stage_logits"] if name == "combined" else ["logits"]
+    dynamic_axes = {input_name: {0: "batch", 1: "sequence"} for input_name in input_names}
+    dynamic_axes.update({output_name: {0: "batch"} for output_name in output_names})
+
+    path = onnx_path(checkpoint)
+    with torch.no_grad():
+        # the TorchScript exporter, which handles dynamic_axes without extra dependencies
+        torch.onnx.export(_Logits(model), inputs, path, input_names=input_names, output_names=output_names,
+                          dynamic_axes=dynamic_axes, opset_version=opset, do_constant_folding=True,
+                          dynamo=False)
+    print(f"{name}: exported {path} ({os.path.getsize(path) / 2**20:.1f} MiB)")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_path = onnx_path(checkpoint, quantized=True)
+        quantize_dynamic(path, quantized_path, weight_type=QuantType.QInt8)
+        print(f"{name}: quantized {quantized_path} ({os.path.getsize(quantized_path) / 2**20:.1f} MiB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", choices=sorted(CHECKPOINTS), default=["q_type", "stage"])
+    parser.add_argument("--quantize", action="store_true", help="also write a dynamic int8 copy")
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+
+    for name in args.models:
+        export(name, args.opset, args.quantize)
+
+
+if __name__ == "__main__":
+    main()
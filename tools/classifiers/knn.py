@@ -0,0 +1,432 @@
+"""
+Nearest-neighbour fast tier for question classification.
+
+The index holds labelled questions as MiniLM embeddings (the sentence model of `tools/feedback.py`).
+A question whose nearest neighbour in the index is at least `KNN_THRESHOLD` similar takes that
+neighbour's question type and stage, and skips the BERT classifiers. Anything less similar falls
+through to BERT.
+
+The index is a directory of append-only files, so every worker memory-maps the same copy:
+
+    meta.json       sentence model name and embedding size
+    embeddings.f32  unit-length float32 embeddings, one row per question
+    labels.i8       int8 (q_type, stage) label indices per row, -1 where a label is unknown
+    questions.jsonl the indexed questions, for inspection and rebuilds
+
+Rows are added by `python -m tools.classifiers.build_knn_index` or, with KNN_APPEND, from the
+server's confirmed predictions. Appends take a file lock, and readers pick up new rows on their
+next lookup.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from tools.classifiers.batching import BatchInferenceEngine
+from tools.feedback import SENTENCE_MODEL_NAME, encode
+from tools.classifiers.classifier import SINGLE_PASS, classify_engine, labels_qtype, labels_stage, qtype_engine, stage_engine
+
+KNN_INDEX_ENABLED = os.getenv("KNN_INDEX_ENABLED", "false").lower() in ("1", "true", "yes")
+KNN_INDEX_PATH = os.getenv("KNN_INDEX_PATH", "tools/classifiers/knn_index")
+# cosine similarity the nearest neighbour needs for its labels to be used
+KNN_THRESHOLD = float(os.getenv("KNN_THRESHOLD", "0.92"))
+# adds the server's confirmed predictions to the index: stages decided by the LLM, and classifier
+# predictions at least KNN_APPEND_CONFIDENCE confident
+KNN_APPEND = os.getenv("KNN_APPEND", "false").lower() in ("1", "true", "yes")
+KNN_APPEND_CONFIDENCE = float(os.getenv("KNN_APPEND_CONFIDENCE", "0.99"))
+# seconds between checks for rows appended by other processes
+KNN_REFRESH_INTERVAL = float(os.getenv("KNN_REFRESH_INTERVAL", "5"))
+
+NO_LABEL = -1
+# a question at least this similar to an indexed one is already in the index
+DUPLICATE_SIMILARITY = 0.995
+
+logger = logging.getLogger(__name__)
+
+
+class Neighbour(NamedTuple):
+    """
+    Nearest indexed question of a lookup.
+    """
+    q_type: Optional[int]
+    stage: Optional[int]
+    similarity: float
+
+
+class KnnIndex:
+    """
+    Memory-mapped index of labelled question embeddings, searched by brute-force cosine similarity.
+    """
+
+    def __init__(self, path: str = KNN_INDEX_PATH, threshold: float = KNN_THRESHOLD,
+                 encode_fn: Callable[[List[str]], np.ndarray] = encode,
+                 refresh_interval: float = KNN_REFRESH_INTERVAL, model_name: str = SENTENCE_MODEL_NAME):
+        """
+        Args:
+            path: directory of the index files.
+            threshold: similarity the nearest neighbour needs to count as a hit.
+            encode_fn: batched sentence model call returning one embedding row per text.
+            refresh_interval: seconds between checks for rows appended by other processes.
+            model_name: sentence model the embeddings come from, checked against the index's.
+        """
+        self.path = path
+        self.threshold = threshold
+        self.encode_fn = encode_fn
+        self.refresh_interval = refresh_interval
+        self.model_name = model_name
+        self._embeddings: Optional[np.ndarray] = None
+        self._labels: Optional[np.ndarray] = None
+        self._dim: Optional[int] = None
+        self._checked = float("-inf")
+        self._pending: List[Tuple[str, Optional[int], Optional[int]]] = []
+        self._lock = threading.Lock()
+        self._counters = {"lookups": 0, "hits": 0, "appended": 0}
+        # why lookups are switched off, e.g. the index was built with another sentence model
+        self._error: Optional[str] = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _read_meta(self) -> Optional[Dict]:
+        try:
+            with open(self._file("meta.json")) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        if meta["model"] != self.model_name:
+            raise ValueError(f"KNN index at {self.path} was built with {meta['model']}, not {self.model_name}")
+        return meta
+
+    def _refresh(self, force: bool = False) -> None:
+        """
+        Maps the index files again if other processes have added rows since the last check.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked < self.refresh_interval:
+            return
+        self._checked = now
+        if self._dim is None:
+            meta = self._read_meta()
+            if meta is None:
+                return
+            self._dim = meta["dim"]
+        try:
+            rows = min(os.path.getsize(self._file("embeddings.f32")) // (4 * self._dim),
+                       os.path.getsize(self._file("labels.i8")) // 2)
+        except FileNotFoundError:
+            return
+        if rows == 0 or (self._embeddings is not None and len(self._embeddings) == rows):
+            return
+        # a row is only used once both its embedding and its labels are complete
+        self._embeddings = np.memmap(self._file("embeddings.f32"), dtype=np.float32, mode="r", shape=(rows, self._dim))
+        self._labels = np.memmap(self._file("labels.i8"), dtype=np.int8, mode="r", shape=(rows, 2))
+
+    def _usable(self) -> bool:
+        """
+        Refreshes the mapped files for a lookup. An index that can't be used, such as one built with
+        another sentence model, is logged once and switched off, so lookups miss and the classifiers
+        answer instead of every request failing. Called with `_lock` held.
+        """
+        if self._error is None:
+            try:
+                self._refresh()
+            except ValueError as e:
+                self._error = str(e)
+                logger.error("KNN index switched off", extra={"path": self.path, "error": self._error})
+        return self._error is None
+
+    def validate(self) -> bool:
+        """
+        Checks the index can be used, so a bad index is reported at startup rather than on the first
+        lookup.
+
+        Returns:
+            bool: False if lookups are switched off.
+        """
+        with self._lock:
+            return self._usable()
+
+    def __len__(self) -> int:
+        with self._lock:
+            if not self._usable():
+                return 0
+            return 0 if self._embeddings is None else len(self._embeddings)
+
+    def _nearest(self, embeddings: np.ndarray) -> List[Tuple[int, float]]:
+        """
+        Row and similarity of the nearest indexed question to each of `embeddings`.
+        """
+        if self._embeddings is None:
+            return [(-1, 0.0)] * len(embeddings)
+        nearest = []
+        # in chunks, so building from a large file never holds a full similarity matrix
+        for start in range(0, len(embeddings), 1024):
+            similarities = embeddings[start:start + 1024] @ self._embeddings.T
+            rows = np.argmax(similarities, axis=1)
+            nearest.extend((int(row), float(similarities[i, row])) for i, row in enumerate(rows))
+        return nearest
+
+    def search(self, questions: List[str]) -> List[Optional[Neighbour]]:
+        """
+        Looks up the nearest indexed question of each question. Questions added with `confirm` since
+        the last call are written to the index first.
+
+        Args:
+            questions: questions to look up.
+
+        Returns:
+            list: the nearest neighbour of each question when it is at least `threshold` similar,
+            None otherwise.
+        """
+        self.flush()
+        if self._error is not None:
+            with self._lock:
+                self._counters["lookups"] += len(questions)
+            return [None] * len(questions)
+        embeddings = _normalize(self.encode_fn(questions))
+        with self._lock:
+            nearest = self._nearest(embeddings) if self._usable() else [(-1, 0.0)] * len(questions)
+            results = []
+            for row, similarity in nearest:
+                if row < 0 or similarity < self.threshold:
+                    results.append(None)
+                    continue
+                q_type, stage = (int(label) for label in self._labels[row])
+                results.append(Neighbour(None if q_type == NO_LABEL else q_type,
+                                         None if stage == NO_LABEL else stage, similarity))
+            self._counters["lookups"] += len(questions)
+            self._counters["hits"] += sum(result is not None for result in results)
+        return results
+
+    def add(self, questions: List[str], q_types: List[Optional[int]], stages: List[Optional[int]],
+            embeddings: Optional[np.ndarray] = None) -> int:
+        """
+        Appends labelled questions to the index, skipping those already in it.
+
+        Args:
+            questions: questions to add.
+            q_types: question type label index of each question (as in `labels_qtype`), None if unknown.
+            stages: stage label index of each question (as in `labels_stage`), None if unknown.
+            embeddings: embeddings of the questions, encoded here when not given.
+
+        Returns:
+            int: number of questions added.
+        """
+        if not questions:
+            return 0
+        embeddings = _normalize(self.encode_fn(questions) if embeddings is None else embeddings)
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock, self._file_lock():
+            if self._read_meta() is None:
+                with open(self._file("meta.json"), "w") as f:
+                    json.dump({"model": self.model_name, "dim": int(embeddings.shape[1])}, f)
+            self._truncate_partial_rows(int(embeddings.shape[1]))
+            self._refresh(force=True)
+
+            # near-copies of indexed questions, and repeats within the batch, are skipped
+            seen = set()
+            rows = []
+            for i, (_, similarity) in enumerate(self._nearest(embeddings)):
+                text = " ".join(questions[i].split()).lower()
+                if similarity < DUPLICATE_SIMILARITY and text not in seen:
+                    seen.add(text)
+                    rows.append(i)
+            if rows:
+                labels = np.array([[NO_LABEL if q_types[i] is None else q_types[i],
+                                    NO_LABEL if stages[i] is None else stages[i]] for i in rows], dtype=np.int8)
+                # the embeddings go last, since they decide how many rows readers see
+                with open(self._file("questions.jsonl"), "a") as f:
+                    f.writelines(json.dumps(questions[i]) + "\n" for i in rows)
+                with open(self._file("labels.i8"), "ab") as f:
+                    f.write(labels.tobytes())
+                with open(self._file("embeddings.f32"), "ab") as f:
+                    f.write(embeddings[rows].tobytes())
+            self._refresh(force=True)
+            self._counters["appended"] += len(rows)
+        return len(rows)
+
+    def _truncate_partial_rows(self, dim: int) -> None:
+        """
+        Cuts the files back to the rows complete in all of them, in case an earlier append stopped
+        between its writes. Otherwise the rows appended next would get another row's labels. Called
+        under the file lock. Readers only map complete rows, so none of them loses a mapped row.
+        """
+        sizes = {"embeddings.f32": 4 * dim, "labels.i8": 2}
+        lengths = {name: os.path.getsize(self._file(name)) if os.path.exists(self._file(name)) else 0
+                   for name in sizes}
+        rows = min(lengths[name] // row_size for name, row_size in sizes.items())
+        for name, row_size in sizes.items():
+            if lengths[name] != rows * row_size:
+                logger.warning("Truncating a partly written KNN index file",
+                               extra={"file": name, "rows": rows, "bytes": lengths[name]})
+                os.truncate(self._file(name), rows * row_size)
+        if os.path.exists(self._file("questions.jsonl")):
+            with open(self._file("questions.jsonl")) as f:
+                lines = f.readlines()
+            if len(lines) > rows:
+                with open(self._file("questions.jsonl"), "w") as f:
+                    f.writelines(lines[:rows])
+
+    @contextmanager
+    def _file_lock(self):
+        # serializes appends between the worker processes and the build CLI
+        with open(self._file(".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def confirm(self, question: str, q_type: Optional[int] = None, stage: Optional[int] = None) -> None:
+        """
+        Queues a confirmed prediction for the index. It is written by the next `search` (on the
+        lookup thread) or `flush`, so the request that confirmed it never waits for the write.
+        """
+        if (q_type is None and stage is None) or self._error is not None:
+            return
+        with self._lock:
+            self._pending.append((question, q_type, stage))
+
+    def flush(self) -> int:
+        """
+        Writes the confirmed predictions queued by `confirm`.
+
+        Returns:
+            int: number of questions added.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        try:
+            questions, q_types, stages = (list(column) for column in zip(*pending))
+            return self.add(questions, q_types, stages)
+        except (OSError, ValueError) as e:
+            logger.warning("Adding confirmed predictions to the KNN index failed", extra={"error": str(e)})
+            return 0
+
+    def stats(self) -> Dict[str, float | int]:
+        """
+        Returns:
+            dict: questions in the index, lookups, hits, hit rate, questions appended by this worker and
+            why lookups are switched off (None while they work).
+        """
+        size = len(self)
+        with self._lock:
+            lookups = self._counters["lookups"]
+            return {"size": size, "threshold": self.threshold, **self._counters,
+                    "hit_rate": self._counters["hits"] / lookups if lookups else 0.0, "error": self._error}
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+knn_index = KnnIndex()
+# lookups are batched like the classifiers, and run on their own thread
+knn_engine = BatchInferenceEngine(knn_index.search, name="knn")
+
+_qtype_ids = {label: index for index, label in labels_qtype.items()}
+_stage_ids = {label: index for index, label in labels_stage.items()}
+
+
+async def _lookup(question: str) -> Optional[Neighbour]:
+    return await knn_engine.submit(question) if KNN_INDEX_ENABLED else None
+
+
+def _confirm(question: str, q_type: Optional[Tuple[str, float]] = None,
+             stage: Optional[Dict[str, str | float]] = None) -> None:
+    """
+    Queues the classifier's predictions for the index, those confident enough to count as confirmed.
+    """
+    if not (KNN_INDEX_ENABLED and KNN_APPEND):
+        return
+    q_type_id = _qtype_ids[q_type[0]] if q_type is not None and q_type[1] >= KNN_APPEND_CONFIDENCE else None
+    stage_id = _stage_ids[stage["stage"]] if stage is not None and stage["confidence"] >= KNN_APPEND_CONFIDENCE else None
+    knn_index.confirm(question, q_type_id, stage_id)
+
+
+def confirm_stage(question: str, stage: Dict[str, int | float | str]) -> None:
+    """
+    Queues a stage decided by the LLM for the index. Only a stage Mistral actually answered counts:
+    the cascade keeps the local prediction (tier "local") when the call fails or the answer is not
+    a stage. Mistral gives no confidence of its own (the cascade reports a fixed 0.99), so
+    KNN_APPEND_CONFIDENCE only applies to the classifier's predictions.
+
+    Args:
+        question: the question.
+        stage: the stage cascade's result, {"stage" (1 to 3), "confidence", "tier"}.
+    """
+    if not (KNN_INDEX_ENABLED and KNN_APPEND):
+        return
+    if stage["tier"] == "llm" and stage["stage"] in labels_stage:
+        knn_index.confirm(question, stage=stage["stage"])
+
+
+async def question_type(question: str) -> Tuple[str, float]:
+    """
+    Question type from the nearest labelled question, or from the q_type classifier when none is
+    similar enough.
+
+    Returns:
+        tuple: question type label and confidence (the neighbour's similarity for an index hit).
+    """
+    neighbour = await _lookup(question)
+    if neighbour is not None and neighbour.q_type is not None:
+        return labels_qtype[neighbour.q_type], neighbour.similarity
+    result = await qtype_engine.submit(question)
+    _confirm(question, q_type=result)
+    return result
+
+
+async def question_stage(question: str) -> Dict[str, str | float]:
+    """
+    Stage from the nearest labelled question, or from the stage classifier when none is similar enough.
+
+    Returns:
+        dict: stage label and confidence, as the stage classifier returns them.
+    """
+    neighbour = await _lookup(question)
+    if neighbour is not None and neighbour.stage is not None:
+        return {"stage": labels_stage[neighbour.stage], "confidence": neighbour.similarity}
+    result = await stage_engine.submit(question)
+    _confirm(question, stage=result)
+    return result
+
+
+async def question_type_and_stage(question: str) -> Tuple[Tuple[str, float], Dict[str, str | float]]:
+    """
+    Both labels of a question from a single index lookup. The classifiers only run for the labels
+    the index couldn't give, in one forward pass in combined and lite mode.
+    """
+    neighbour = await _lookup(question)
+    q_type = stage = None
+    if neighbour is not None:
+        if neighbour.q_type is not None:
+            q_type = labels_qtype[neighbour.q_type], neighbour.similarity
+        if neighbour.stage is not None:
+            stage = {"stage": labels_stage[neighbour.stage], "confidence": neighbour.similarity}
+    if q_type is not None and stage is not None:
+        return q_type, stage
+
+    if SINGLE_PASS:
+        predicted_type, predicted_stage = await classify_engine.submit(question)
+    elif q_type is None and stage is None:
+        predicted_type, predicted_stage = await asyncio.gather(qtype_engine.submit(question),
+                                                               stage_engine.submit(question))
+    elif q_type is None:
+        predicted_type, predicted_stage = await qtype_engine.submit(question), None
+    else:
+        predicted_type, predicted_stage = None, await stage_engine.submit(question)
+    _confirm(question, q_type=predicted_type if q_type is None else None,
+             stage=predicted_stage if stage is None else None)
+    return q_type or predicted_type, stage or predicted_stage
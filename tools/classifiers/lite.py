@@ -0,0 +1,136 @@
+from typing import List, Optional, Tuple
+import json
+import os
+import random
+
+import numpy as np
+import torch
+
+
+class EmbeddingHeads(torch.nn.Module):
+    """
+    Question-type and stage heads on a sentence embedding, each a linear layer or an MLP with one
+    hidden layer.
+
+    The heads read the MiniLM embedding the server already computes for feedback scoring, so with
+    CLASSIFIER_MODE=lite no BERT model is loaded and a question is encoded once for classification
+    and context-switch scoring. Each head has one output per label id, in the order of
+    `qtype_labels` / `stage_labels`.
+    """
+
+    def __init__(self, embedding_dim: int, qtype_labels: List[int], stage_labels: List[int], hidden_size: int = 0,
+                 dropout: float = 0.1, embedding_model: str = ""):
+        """
+        Args:
+            embedding_dim: size of the sentence embeddings.
+            qtype_labels: question-type label ids, as in `labels_qtype`.
+            stage_labels: stage label ids, as in `labels_stage`.
+            hidden_size: hidden units of each head, 0 for a linear head.
+            dropout: dropout on the embedding while training.
+            embedding_model: name of the sentence model the heads were trained on.
+        """
+        super().__init__()
+        self.config = {"embedding_dim": embedding_dim, "qtype_labels": list(qtype_labels),
+                       "stage_labels": list(stage_labels), "hidden_size": hidden_size, "dropout": dropout,
+                       "embedding_model": embedding_model}
+        self.qtype_labels = list(qtype_labels)
+        self.stage_labels = list(stage_labels)
+        self.embedding_model = embedding_model
+        self.dropout = torch.nn.Dropout(dropout)
+        self.qtype_classifier = self._head(embedding_dim, hidden_size, len(qtype_labels))
+        self.stage_classifier = self._head(embedding_dim, hidden_size, len(stage_labels))
+
+    @staticmethod
+    def _head(embedding_dim: int, hidden_size: int, num_labels: int) -> torch.nn.Module:
+        if hidden_size <= 0:
+            return torch.nn.Linear(embedding_dim, num_labels)
+        return torch.nn.Sequential(torch.nn.Linear(embedding_dim, hidden_size), torch.nn.GELU(),
+                                   torch.nn.Linear(hidden_size, num_labels))
+
+    def forward(self, embeddings: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Returns:
+            tuple: (question type logits, stage logits)
+        """
+        embeddings = self.dropout(embeddings)
+        return self.qtype_classifier(embeddings), self.stage_classifier(embeddings)
+
+    def predict(self, embeddings: np.ndarray) -> List[List[Tuple[int, float]]]:
+        """
+        Classifies a batch of sentence embeddings.
+
+        Returns:
+            list: for each embedding, a (label id, confidence) pair for the question type and one
+            for the stage, like `_classify_heads` in `classifier.py`.
+        """
+        with torch.no_grad():
+            logits = self(torch.as_tensor(np.asarray(embeddings), dtype=torch.float32))
+        per_head = []
+        for head_logits, label_ids in zip(logits, (self.qtype_labels, self.stage_labels)):
+            confidences, positions = torch.max(torch.nn.functional.softmax(head_logits, dim=-1), dim=-1)
+            per_head.append([(label_ids[position], confidence)
+                             for position, confidence in zip(positions.tolist(), confidences.tolist())])
+        return [list(heads) for heads in zip(*per_head)]
+
+    def save_pretrained(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "config.json"), "w") as f:
+            json.dump(self.config, f, indent=2)
+        torch.save(self.state_dict(), os.path.join(path, "heads.pt"))
+
+    @classmethod
+    def from_pretrained(cls, path: str) -> "EmbeddingHeads":
+        with open(os.path.join(path, "config.json")) as f:
+            model = cls(**json.load(f))
+        model.load_state_dict(torch.load(os.path.join(path, "heads.pt"), map_location="cpu", weights_only=True))
+        return model.eval()
+
+
+def train_heads(model: EmbeddingHeads, embeddings: np.ndarray, q_types: List[Optional[int]],
+                stages: List[Optional[int]], epochs: int = 50, batch_size: int = 32, lr: float = 1e-3,
+                weight_decay: float = 1e-2, seed: int = 0) -> List[float]:
+    """
+    Trains both heads on precomputed embeddings. A question without a label for one of the tasks
+    only trains the other head.
+
+    Args:
+        model: heads to train.
+        embeddings: one sentence embedding row per question.
+        q_types: question-type label id of each question, or None.
+        stages: stage label id of each question, or None.
+        epochs: passes over the questions.
+        batch_size: questions per optimizer step.
+        lr: AdamW learning rate.
+        weight_decay: AdamW weight decay.
+        seed: seed of the shuffling and initial weights.
+
+    Returns:
+        list: mean training loss of each epoch.
+    """
+    torch.manual_seed(seed)
+    rng = random.Random(seed)
+    # positions of the label ids in each head, -100 (ignored by the loss) where a label is missing
+    qtype_targets = torch.tensor([-100 if label is None else model.qtype_labels.index(label) for label in q_types])
+    stage_targets = torch.tensor([-100 if label is None else model.stage_labels.index(label) for label in stages])
+    inputs = torch.as_tensor(np.asarray(embeddings), dtype=torch.float32)
+    loss_fn = torch.nn.CrossEntropyLoss(ignore_index=-100, reduction="sum")
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=weight_decay)
+
+    losses = []
+    order = list(range(len(inputs)))
+    model.train()
+    for _ in range(epochs):
+        rng.shuffle(order)
+        total = 0.0
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            qtype_logits, stage_logits = model(inputs[batch])
+            labelled = max(1, int((qtype_targets[batch] >= 0).sum() + (stage_targets[batch] >= 0).sum()))
+            loss = (loss_fn(qtype_logits, qtype_targets[batch]) + loss_fn(stage_logits, stage_targets[batch])) / labelled
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(batch)
+        losses.append(total / len(order))
+    model.eval()
+    return losses
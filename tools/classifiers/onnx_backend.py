@@ -0,0 +1,54 @@
+import os
+from typing import Tuple
+
+import onnxruntime
+import torch
+
+# 0 lets ONNX Runtime pick the number of threads
+CLASSIFIER_ONNX_THREADS = int(os.getenv("CLASSIFIER_ONNX_THREADS", "0"))
+
+
+def onnx_path(checkpoint: str, quantized: bool = False) -> str:
+    """
+    Where the exported ONNX model of a checkpoint is stored, next to its weights.
+
+    Args:
+        checkpoint: directory of the Hugging Face checkpoint, e.g. `tools/classifiers/q_type`.
+        quantized: the int8 model rather than the fp32 one.
+
+    Returns:
+        str: path of the .onnx file.
+    """
+    return os.path.join(checkpoint, "model.int8.onnx" if quantized else "model.onnx")
+
+
+class OnnxClassifier:
+    """
+    ONNX Runtime session that can stand in for the PyTorch classifiers in `classifier.py`.
+
+    It is called with the tokenizer's encoding like the PyTorch model and returns the logits of each
+    head as a tuple of tensors, so the rest of the inference path is unchanged.
+    """
+
+    def __init__(self, path: str, threads: int = CLASSIFIER_ONNX_THREADS):
+        """
+        Args:
+            path: the exported .onnx file.
+            threads: intra-op threads of the session, 0 for the ONNX Runtime default.
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found, export it with `python -m tools.classifiers.export_onnx`")
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.path = path
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint: str, quantized: bool = False) -> "OnnxClassifier":
+        return cls(onnx_path(checkpoint, quantized))
+
+    def __call__(self, **encoding: torch.Tensor) -> Tuple[torch.Tensor, ...]:
+        inputs = {name: encoding[name].numpy() for name in self.input_names}
+        return tuple(torch.from_numpy(logits) for logits in self.session.run(None, inputs))
@@ -0,0 +1,43 @@
+"""
+Labelled question CSVs for the build scripts (`build_combined`, `build_knn_index`, `build_lite`).
+
+The CSV needs a `question` column. The optional `q_type` and `stage` columns use the label names
+from `labels_qtype` / `labels_stage`, and are read as label indices.
+"""
+import csv
+from typing import Dict, List, Optional
+
+from tools.classifiers import classifier
+
+qtype_ids = {label: index for index, label in classifier.labels_qtype.items()}
+stage_ids = {label: index for index, label in classifier.labels_stage.items()}
+
+
+def load_rows(path: str) -> List[Dict[str, Optional[int]]]:
+    """
+    Reads the CSV into questions and label indices (None where a label is missing).
+    """
+    rows = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            rows.append({
+                "question": row["question"],
+                "q_type": qtype_ids.get(row.get("q_type") or ""),
+                "stage": stage_ids.get(row.get("stage") or ""),
+            })
+    return rows
+
+
+def label_missing(rows: List[Dict], min_confidence: float, batch_size: int) -> None:
+    """
+    Fills in missing labels with the classifiers' confident predictions.
+    """
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        questions = [row["question"] for row in batch]
+        for row, (q_type, confidence) in zip(batch, classifier.get_question_types(questions)):
+            if row["q_type"] is None and confidence >= min_confidence:
+                row["q_type"] = qtype_ids[q_type]
+        for row, stage in zip(batch, classifier.get_stages(questions)):
+            if row["stage"] is None and stage["confidence"] >= min_confidence:
+                row["stage"] = stage_ids[stage["stage"]]
@@ -1,16 +1,10 @@
-import os
-from mistralai import Mistral
-import os
-from dotenv import load_dotenv
+import logging
+from tools.llm_client import LLMUnavailable, llm_client
 from langchain_core.prompts import PromptTemplate 
-
-load_dotenv()
-
-api_key = os.getenv("MISTRAL_API_KEY")
+from typing import AsyncIterator
 
 model = "mistral-large-latest"
-
-client = Mistral(api_key=api_key)
+logger = logging.getLogger(__name__)
 
 # create a prompt template with holes for the conversation history and the user's input 
 
@@ -37,6 +31,27 @@ prompt_template = PromptTemplate.from_template(
     """
 )
 
+def render_prompt(scenario: str, history: str, prompt_content: str) -> str:
+    """
+    The chatbot prompt for the given scenario, conversation history and interviewer message.
+    """
+    return prompt_template.invoke({
+        "scenario":scenario, "history":history, "prompt_content":prompt_content
+    }).to_string()
+
+
+def _messages(scenario: str, history: str, prompt_content: str):
+    message_content = render_prompt(scenario, history, prompt_content)
+    
+    logger.debug("Child prompt", extra={"prompt": message_content})
+    return [
+        {
+            "role": "user",
+            "content": message_content,
+        },
+    ]
+
+
 def get_child_response(scenario: str, history: str, prompt_content: str) -> str:
     """
     Generates a chatbot response based on the given scenario, conversation history, and prompt content.
@@ -50,28 +65,49 @@ def get_child_response(scenario: str, history: str, prompt_content: str) -> str:
         str: The chatbot's response text or an error message if the API call fails.
     """    
 
-    message_content = prompt_template.invoke({
-        "scenario":scenario, "history":history, "prompt_content":prompt_content
-    }).to_string()
-    
-    print(f"Message content: {message_content}")
     try:
-        chat_response = client.chat.complete(
-            model=model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": message_content,
-                },
-            ]
-        )
-        
-        if text := chat_response.choices[0].message.content:
+        if text := llm_client.complete_sync(_messages(scenario, history, prompt_content), model, tool="child"):
             return text
         else:
             return "No response from the chatbot"
     except Exception as e:
-        print(f"Error calling mistral api: {e}")
+        logger.warning("Mistral call failed", extra={"tool": "child", "error": str(e)})
         return "This is an error message, something went wrong :("
 
 
+async def get_child_response_async(scenario: str, history: str, prompt_content: str) -> str:
+    """
+    Async version of `get_child_response`, does not block the event loop. Raises `LLMUnavailable`
+    when the call is shed, so the endpoint can answer with a 503.
+    """
+
+    try:
+        if text := await llm_client.complete(_messages(scenario, history, prompt_content), model, tool="child"):
+            return text
+        else:
+            return "No response from the chatbot"
+    except LLMUnavailable:
+        raise
+    except Exception as e:
+        logger.warning("Mistral call failed", extra={"tool": "child", "error": str(e)})
+        return "This is an error message, something went wrong :("
+
+
+async def stream_child_response(scenario: str, history: str, prompt_content: str) -> AsyncIterator[str]:
+    """
+    Streams the chatbot response as it is generated, for the same inputs as `get_child_response`.
+
+    Args:
+        scenario (str): The specific context or scenario for the chatbot.
+        history (str): The conversation so far.
+        prompt_content (str): The main content or user query for generating a response.
+
+    Yields:
+        str: Consecutive pieces of the chatbot's response text.
+
+    Raises:
+        LLMError: If the API call fails.
+    """
+
+    async for token in llm_client.stream(_messages(scenario, history, prompt_content), model, tool="child"):
+        yield token
@@ -0,0 +1,124 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import redis
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_REDIS = os.getenv("EMBEDDING_CACHE_REDIS", "false").lower() in ("1", "true", "yes")
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Content-hashed cache for sentence embeddings.
+
+    Lookups go to an in-process LRU first, then to the optional shared Redis tier, where embeddings
+    are stored as raw float32 bytes so every worker can reuse them. Only texts missing from both
+    tiers are sent to the model.
+    """
+
+    def __init__(self, model_name: str, max_size: int = EMBEDDING_CACHE_SIZE,
+                 redis_client: Optional[redis.Redis] = None, ttl: int = EMBEDDING_CACHE_TTL):
+        """
+        Args:
+            model_name: name of the embedding model, part of the key so models never share entries.
+            max_size: largest number of embeddings kept in process.
+            redis_client: binary (decode_responses=False) client for the shared tier, None to disable it.
+            ttl: lifetime in seconds of embeddings in the shared tier.
+        """
+        self.model_name = model_name
+        self.max_size = max_size
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"local_hits": 0, "redis_hits": 0, "misses": 0, "redis_errors": 0}
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"emb:{self.model_name}:{digest}"
+
+    def _get_local(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            embedding = self._local.get(key)
+            if embedding is not None:
+                self._local.move_to_end(key)
+            return embedding
+
+    def _put_local(self, key: str, embedding: np.ndarray) -> None:
+        with self._lock:
+            self._local[key] = embedding
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+    def _count(self, counter: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] += n
+
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Gets the embedding of every text, calling `encode_fn` once for the texts that aren't cached.
+
+        Args:
+            texts: texts to embed.
+            encode_fn: batched model call returning one embedding row per text.
+
+        Returns:
+            np.ndarray: one float32 embedding row per text, in input order.
+        """
+        keys = [self._key(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+
+        for key in keys:
+            embedding = self._get_local(key)
+            if embedding is not None:
+                found[key] = embedding
+        self._count("local_hits", sum(key in found for key in keys))
+
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if missing and self.redis_client is not None:
+            try:
+                for key, value in zip(missing, self.redis_client.mget(missing)):
+                    if value is not None:
+                        found[key] = np.frombuffer(value, dtype=np.float32)
+                        self._put_local(key, found[key])
+                        self._count("redis_hits")
+            except redis.RedisError as e:
+                self._count("redis_errors")
+                logger.warning("Embedding cache Redis lookup failed", extra={"error": str(e)})
+
+        to_encode = {key: text for key, text in zip(keys, texts) if key not in found}
+        if to_encode:
+            self._count("misses", len(to_encode))
+            embeddings = np.asarray(encode_fn(list(to_encode.values())), dtype=np.float32)
+            for key, embedding in zip(to_encode, embeddings):
+                found[key] = embedding
+                self._put_local(key, embedding)
+
+            if self.redis_client is not None:
+                try:
+                    pipe = self.redis_client.pipeline(transaction=False)
+                    for key in to_encode:
+                        pipe.set(key, found[key].tobytes(), ex=self.ttl)
+                    pipe.execute()
+                except redis.RedisError as e:
+                    self._count("redis_errors")
+                    logger.warning("Embedding cache Redis write failed", extra={"error": str(e)})
+
+        return np.stack([found[key] for key in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            dict: hit/miss counters and the number of embeddings held in process.
+        """
+        with self._lock:
+            return {**self._counters, "local_size": len(self._local)}
@@ -6,13 +6,31 @@ from typing import Dict
 from langchain_core.prompts import PromptTemplate
 
 from typing import List
+import numpy as np
 from numpy import float64 
 
-from scipy.spatial import distance 
 from sentence_transformers import SentenceTransformer
+from tools.embedding_cache import EmbeddingCache, EMBEDDING_CACHE_REDIS
+from tools.metrics import ENCODE_SECONDS
+from tools.model_registry import registry
+from tools.redis_connection import get_redis
 
 THRESHOLD = 0.85
-sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
+# a QAQ window scoring below this is a switch of context
+CONTEXT_SWITCH_THRESHOLD = 0.3
+SENTENCE_MODEL_NAME = 'all-MiniLM-L6-v2'
+registry.register("sentence_model", lambda: SentenceTransformer(SENTENCE_MODEL_NAME))
+embedding_cache = EmbeddingCache(SENTENCE_MODEL_NAME,
+                                 redis_client=get_redis(decode_responses=False) if EMBEDDING_CACHE_REDIS else None)
+
+
+def __getattr__(name: str):
+    """
+    `sentence_model` is loaded by the model registry the first time it is used.
+    """
+    if name == "sentence_model":
+        return registry.get("sentence_model")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class InvalidQAQError(Exception):
@@ -25,42 +43,89 @@ class InvalidQAQError(Exception):
         super().__init__(message)
 
 
-def calculate_similarity(QAQ: List[str]) -> float64:
-    if len(QAQ) == 3:
-        q1, a, q2 = QAQ
-        q1_embedding = sentence_model.encode(q1)
-        q2_embedding = sentence_model.encode(q2)
-        a_embedding = sentence_model.encode(a)
+def encode(texts: List[str]) -> np.ndarray:
+    """
+    Encodes every utterance, looking it up in the embedding cache first. Utterances that aren't
+    cached are encoded in a single batched call to the sentence model.
+
+    Args:
+        texts: utterances to encode.
+
+    Returns:
+        np.ndarray: one embedding row per utterance.
+    """
+    def encode_misses(misses: List[str]) -> np.ndarray:
+        model = registry.get("sentence_model")
+        with ENCODE_SECONDS.time():
+            return model.encode(misses)
+
+    return embedding_cache.encode(texts, encode_misses)
+
+
+def cosine_similarities(embeddings: np.ndarray, lag: int) -> np.ndarray:
+    """
+    Cosine similarity between each embedding and the one `lag` rows after it.
+
+    Args:
+        embeddings: one embedding row per utterance.
+        lag: distance between the compared utterances.
+
+    Returns:
+        np.ndarray: similarity of rows (i, i + lag) for every i.
+    """
+    embeddings = embeddings.astype(np.float64)
+    norms = np.linalg.norm(embeddings, axis=1)
+    dots = np.einsum("ij,ij->i", embeddings[:-lag], embeddings[lag:])
+    # same clipping as scipy.spatial.distance.cosine
+    return 1 - np.clip(1 - dots / (norms[:-lag] * norms[lag:]), 0.0, 2.0)
+
+
+def window_scores(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Scores every QAQ window of a transcript at once.
 
+    Args:
+        embeddings: embeddings of the transcript utterances, in order.
 
-        # calculate score between q2 and q1 and if its too small, q2 and a 
-        score = max(1, (1 - distance.cosine(q1_embedding, q2_embedding)) / THRESHOLD)
-        if score < 0.2:
-            score = max(1, (1 - distance.cosine(a_embedding, q2_embedding)) / THRESHOLD)
-        return float64(score)
+    Returns:
+        np.ndarray: score of the window starting at each utterance (length n - 2).
+    """
+    # calculate score between q2 and q1 and if its too small, q2 and a 
+    score = np.maximum(1, cosine_similarities(embeddings, 2) / THRESHOLD)
+    fallback = np.maximum(1, cosine_similarities(embeddings, 1)[1:] / THRESHOLD)
+    return np.where(score < 0.2, fallback, score)
+
+
+def calculate_similarity(QAQ: List[str]) -> float64:
+    if len(QAQ) not in (2, 3):
+        raise InvalidQAQError(f"QAQ list must be of length 3 (or 2 for a single question and response), got {len(QAQ)}")
+    embeddings = encode(QAQ)
+    if len(QAQ) == 3:
+        return float64(window_scores(embeddings)[0])
     else:
-        q1, a = QAQ 
-        q1_embedding = sentence_model.encode(q1) 
-        a_embedding = sentence_model.encode(a)
-        score = max(1, (1 - distance.cosine(q1_embedding, a_embedding)) / THRESHOLD)
-        return float64(score)
+        return score_from_embeddings(embeddings)
 
 def calculate_score(QResponseList: List[str]) -> float64:
-    total = 0
-    count = 0
-   
     if len(QResponseList) >= 3:
-        for i in range(2, len(QResponseList)-1):
-            QAQ = [QResponseList[i-2], QResponseList[i-1], QResponseList[i]]
-            score = calculate_similarity(QAQ)
-            total += score 
-            count += 1
-    else:
-        score = calculate_similarity(QResponseList)
-        total += score 
-        count += 1
-
-    mean = 0
-    if count > 0:
-        mean = total / count
-    return float64(mean) 
+        return score_from_embeddings(encode(QResponseList))
+    return calculate_similarity(QResponseList)
+
+
+def score_from_embeddings(embeddings: np.ndarray) -> float64:
+    """
+    Mean QAQ window score of a transcript of at least 3 utterances, from its embeddings. A single
+    question and response is scored on their similarity.
+
+    Args:
+        embeddings: embeddings of the transcript utterances, in order.
+
+    Returns:
+        float64: mean score, 0 if the transcript has no complete window.
+    """
+    if len(embeddings) == 2:
+        return float64(max(1, cosine_similarities(embeddings, 1)[0] / THRESHOLD))
+    # the final window is not scored
+    scores = window_scores(embeddings)[:-1]
+    if len(scores) == 0:
+        return float64(0)
+    return float64(scores.mean())
@@ -0,0 +1,276 @@
+"""
+Queue of end-stage feedback jobs, so long transcripts are scored by worker processes of their own
+instead of inside the web workers that serve `/chat`.
+
+The server submits a transcript and answers with a job id at once. Workers take jobs off a Redis
+list, encode every distinct utterance of a batch of jobs in one call and store each result with a
+TTL, where the server reads it when the client polls. A job's id is the hash of its transcript, so
+submitting a transcript that is already queued, running or done returns the same job instead of
+scoring it again.
+
+Each job is a Redis hash (`feedback_jobs:job:<id>`) with its status (queued, running, done or
+error), the transcript until it is scored, then the result or the error. Run the workers from the
+repository root, next to the server, with the same REDIS_* settings:
+
+    python -m tools.feedback_jobs [--workers 2] [--batch-size 16]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import redis
+import redis.asyncio
+
+from tools.score_transcripts import score_transcript
+
+# seconds a job and its result are kept after the last change
+FEEDBACK_JOB_TTL = int(os.getenv("FEEDBACK_JOB_TTL", "3600"))
+# most jobs a worker scores at once
+FEEDBACK_JOB_BATCH = int(os.getenv("FEEDBACK_JOB_BATCH", "16"))
+# a job running for longer than this is taken to have lost its worker and is queued again when resubmitted
+FEEDBACK_JOB_TIMEOUT = int(os.getenv("FEEDBACK_JOB_TIMEOUT", "300"))
+
+QUEUE_KEY = "feedback_jobs:queue"
+
+logger = logging.getLogger(__name__)
+
+
+def _job_key(job_id: str) -> str:
+    return f"feedback_jobs:job:{job_id}"
+
+
+def transcript_hash(utterances: List[str]) -> str:
+    """
+    Id of the job scoring a transcript, the same for every submission of the same utterances.
+    """
+    return hashlib.sha256(json.dumps(utterances).encode("utf-8")).hexdigest()
+
+
+def _public(job_id: str, job: Dict[str, str]) -> Dict:
+    """
+    The job as the API returns it: its id, status and, once finished, its result or error.
+    """
+    public = {"job_id": job_id, "status": job["status"]}
+    if "result" in job:
+        public.update(json.loads(job["result"]))
+    if "error" in job:
+        public["error"] = job["error"]
+    return public
+
+
+class FeedbackJobs:
+    """
+    Server side of the queue: submits jobs and reads their status, through the async client.
+    """
+
+    def __init__(self, redis_client: redis.asyncio.Redis, ttl: int = FEEDBACK_JOB_TTL,
+                 timeout: int = FEEDBACK_JOB_TIMEOUT):
+        """
+        Args:
+            redis_client: async client with decode_responses=True.
+            ttl: seconds a job is kept after its last change.
+            timeout: seconds after which a running job can be queued again.
+        """
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.timeout = timeout
+
+    async def submit(self, utterances: List[str]) -> Dict:
+        """
+        Queues a transcript for scoring, unless the same transcript is already queued, running or
+        scored. A job that failed, or whose worker stopped before it finished, is queued again.
+
+        Args:
+            utterances: question and response utterances of the transcript, in order.
+
+        Returns:
+            dict: the job, as `get` returns it.
+        """
+        job_id = transcript_hash(utterances)
+        key = _job_key(job_id)
+        # only the first submission creates the job, so concurrent duplicates queue it once
+        if not await self.redis_client.hsetnx(key, "status", "queued"):
+            job = await self.redis_client.hgetall(key)
+            stale = job.get("status") == "running" and time.time() - float(job.get("started_at", 0)) > self.timeout
+            if job and job["status"] != "error" and not stale:
+                return _public(job_id, job)
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.hdel(key, "error", "result", "started_at")
+        pipe.hset(key, mapping={"status": "queued", "transcript": json.dumps(utterances), "submitted_at": time.time()})
+        pipe.expire(key, self.ttl)
+        pipe.lpush(QUEUE_KEY, job_id)
+        await pipe.execute()
+        return {"job_id": job_id, "status": "queued"}
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """
+        Returns:
+            dict: the job's id and status, plus the score fields once it is done or the error if it
+            failed. None if there is no such job, or it expired.
+        """
+        job = await self.redis_client.hgetall(_job_key(job_id))
+        return _public(job_id, job) if job else None
+
+    async def wait(self, job_id: str, timeout: float, interval: float = 0.2) -> Optional[Dict]:
+        """
+        Like `get`, but waits up to `timeout` seconds for the job to finish.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.get(job_id)
+            if job is None or job["status"] in ("done", "error") or time.monotonic() >= deadline:
+                return job
+            await asyncio.sleep(min(interval, max(0.0, deadline - time.monotonic())))
+
+    async def queue_length(self) -> int:
+        return await self.redis_client.llen(QUEUE_KEY)
+
+
+class FeedbackWorker:
+    """
+    Worker side of the queue: takes batches of jobs and scores them, through the sync client.
+    """
+
+    def __init__(self, redis_client: redis.Redis, encode_fn: Callable[[List[str]], np.ndarray],
+                 batch_size: int = FEEDBACK_JOB_BATCH, ttl: int = FEEDBACK_JOB_TTL):
+        """
+        Args:
+            redis_client: client with decode_responses=True.
+            encode_fn: encodes a list of utterances into one embedding row each.
+            batch_size: most jobs scored at once.
+            ttl: seconds a result is kept.
+        """
+        self.redis_client = redis_client
+        self.encode_fn = encode_fn
+        self.batch_size = max(1, batch_size)
+        self.ttl = ttl
+
+    def take(self, timeout: float = 5) -> List[str]:
+        """
+        Waits up to `timeout` seconds for a job, then takes whatever else is queued, up to a batch.
+
+        Returns:
+            list: ids of the jobs taken, oldest first, empty if none came.
+        """
+        first = self.redis_client.brpop([QUEUE_KEY], timeout=timeout)
+        if first is None:
+            return []
+        rest = self.redis_client.rpop(QUEUE_KEY, self.batch_size - 1) if self.batch_size > 1 else None
+        return [first[1]] + (rest or [])
+
+    def process(self, job_ids: List[str]) -> int:
+        """
+        Scores a batch of jobs, encoding each distinct utterance of the batch once, and stores their
+        results.
+
+        Returns:
+            int: number of jobs scored.
+        """
+        pipe = self.redis_client.pipeline(transaction=False)
+        for job_id in job_ids:
+            pipe.hget(_job_key(job_id), "transcript")
+        jobs = {}
+        # a job can be queued twice (resubmitted after an error) or have expired while queued
+        for job_id, transcript in zip(job_ids, pipe.execute()):
+            if transcript is not None:
+                jobs[job_id] = json.loads(transcript)
+        if not jobs:
+            return 0
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for job_id in jobs:
+            pipe.hset(_job_key(job_id), mapping={"status": "running", "started_at": time.time()})
+        pipe.execute()
+
+        texts = list(dict.fromkeys(text for utterances in jobs.values() for text in utterances))
+        rows = {text: row for row, text in enumerate(texts)}
+        pipe = self.redis_client.pipeline(transaction=False)
+        try:
+            embeddings = np.asarray(self.encode_fn(texts))
+            for job_id, utterances in jobs.items():
+                result = score_transcript(job_id, embeddings[[rows[text] for text in utterances]])
+                del result["id"]
+                if "error" in result:
+                    self._finish(pipe, job_id, {"status": "error", "error": result["error"]})
+                else:
+                    self._finish(pipe, job_id, {"status": "done", "result": json.dumps(result)})
+        except Exception as e:
+            logger.exception("Scoring feedback jobs failed", extra={"jobs": len(jobs)})
+            pipe = self.redis_client.pipeline(transaction=False)
+            for job_id in jobs:
+                self._finish(pipe, job_id, {"status": "error", "error": f"scoring failed: {e}"})
+        pipe.execute()
+        logger.info("Scored feedback jobs", extra={"jobs": len(jobs), "utterances": len(texts)})
+        return len(jobs)
+
+    def _finish(self, pipe: redis.client.Pipeline, job_id: str, fields: Dict[str, str]) -> None:
+        key = _job_key(job_id)
+        pipe.hdel(key, "transcript")
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, self.ttl)
+
+    def run(self) -> None:
+        """
+        Takes and scores jobs until the process is stopped.
+        """
+        while True:
+            try:
+                if job_ids := self.take():
+                    self.process(job_ids)
+            except redis.ConnectionError as e:
+                logger.warning("Lost the connection to Redis", extra={"error": str(e)})
+                time.sleep(1)
+
+
+def _run_worker(threads: int, batch_size: int) -> None:
+    """
+    Entry point of a worker process: loads the sentence model once, then serves the queue.
+    """
+    import torch
+    from tools.feedback import encode
+    from tools.logging_config import configure_logging
+    from tools.model_registry import registry
+    from tools.redis_connection import get_redis
+
+    configure_logging()
+    torch.set_num_threads(threads)
+    registry.get("sentence_model")
+    FeedbackWorker(get_redis(), encode, batch_size=batch_size).run()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="PyTorch threads in each worker, default CPU count / workers")
+    parser.add_argument("--batch-size", type=int, default=FEEDBACK_JOB_BATCH, help="most jobs scored at once")
+    args = parser.parse_args(argv)
+
+    workers = max(1, args.workers)
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    if workers == 1:
+        _run_worker(threads, args.batch_size)
+        return
+    # spawned rather than forked, so no worker inherits a PyTorch thread pool from the parent
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_run_worker, args=(threads, args.batch_size), daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,16 @@
-from mistralai import Mistral
+from tools.llm_client import LLMUnavailable, llm_client
+import logging
 import random
-import os
-
-api_key = os.getenv("MISTRAL_API_KEY")
 
 model = "mistral-large-latest"
+logger = logging.getLogger(__name__)
 
-client = Mistral(api_key=api_key)
+question_categories = [
+    "Open-ended (A question that encourages a open answer and cannot be answered by yes or no, they do not start with what, where, when, how, or, why) ", 
+    "Directive (A 'Who, What, When, Where, or How' question on a specific topic the question should suggest a short specific answer. )", 
+    "Option-Posing (A multiple choice question (this also includes yes/no questions) where the answer is part of the question but is not implied your question should not suggest anything.)", 
+    "Suggestive (Questions with presuppositions, implied correct answers, information that the interviewee did not reveal themselves.)"
+]
 
 def get_question_category() -> str:
     """
@@ -16,12 +20,17 @@ def get_question_category() -> str:
         str: category to be generated, includes a description of the type of question for the LLM
     """
 
-    return random.choice([
-        "Open-ended (A question that encourages a open answer and cannot be answered by yes or no, they do not start with what, where, when, how, or, why) ", 
-        "Directive (A 'Who, What, When, Where, or How' question on a specific topic the question should suggest a short specific answer. )", 
-        "Option-Posing (A multiple choice question (this also includes yes/no questions) where the answer is part of the question but is not implied your question should not suggest anything.)", 
-        "Suggestive (Questions with presuppositions, implied correct answers, information that the interviewee did not reveal themselves.)"
-    ])
+    return random.choice(question_categories)
+
+def _question_messages(category: str):
+    return [
+        {
+            "role": "user",
+            "content":
+            "You are the police interviewing a child about their abuse. Give only questions. Give me a " + category + " question. "
+        }
+    ]
+
 
 def LLM_generate_question(category: str) -> str:
     """
@@ -35,21 +44,25 @@ def LLM_generate_question(category: str) -> str:
 
     """
     try:
-        chat_response = client.chat.complete(
-            model = model,
-            messages = [
-                {
-                    "role": "user",
-                    "content":
-                    "You are the police interviewing a child about their abuse. Give only questions. Give me a " + category + " question. "
-                }
-            ]
-        )
-
-        return chat_response.choices[0].message.content
+        return llm_client.complete_sync(_question_messages(category), model, tool="question")
+
+    except Exception as e:
+        logger.warning("Mistral call failed", extra={"tool": "question", "error": str(e)})
+        return "MistralAI API call error."
+
+
+async def LLM_generate_question_async(category: str) -> str:
+    """
+    Async version of `LLM_generate_question`, does not block the event loop. Raises `LLMUnavailable`
+    when the call is shed.
+    """
+    try:
+        return await llm_client.complete(_question_messages(category), model, tool="question")
 
+    except LLMUnavailable:
+        raise
     except Exception as e:
-        print(f"Error calling Mistral API: {e}")
+        logger.warning("Mistral call failed", extra={"tool": "question", "error": str(e)})
         return "MistralAI API call error."
 
 
@@ -0,0 +1,192 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import redis
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_THRESHOLD = float(os.getenv("LLM_CACHE_THRESHOLD", "0.92"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_INDEX_REFRESH = float(os.getenv("LLM_CACHE_INDEX_REFRESH", "10"))
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text: str) -> str:
+    """
+    Normalizes a question for exact matching: lower case, surrounding quotes and whitespace removed,
+    runs of whitespace collapsed. Punctuation is kept, since "You were scared." and "You were scared?"
+    are different kinds of question.
+    """
+    return " ".join(text.strip().strip("\"'").split()).lower()
+
+
+class SemanticCache:
+    """
+    Shared cache of LLM answers keyed by question, stored in Redis.
+
+    A question is first looked up by exact match on its normalized text. Failing that, it is embedded
+    and compared with the questions already in the cache, and the answer of the most similar one is
+    returned if their cosine similarity is at least the threshold.
+
+    Each answer is a Redis string under `llmcache:<namespace>:<sha256>` that expires after the TTL. The
+    normalized questions are kept in a sorted set scored by last use, so the least recently used
+    entries are evicted once there are more than `max_entries`. Each worker keeps an in-process matrix
+    of the cached questions' embeddings for the near-duplicate lookup, refreshed from the sorted set
+    every `index_refresh` seconds. A Redis failure counts as a miss.
+    """
+
+    def __init__(self, namespace: str, redis_client: redis.Redis, embed_fn: Callable[[List[str]], np.ndarray],
+                 threshold: float = LLM_CACHE_THRESHOLD, ttl: int = LLM_CACHE_TTL,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES, index_refresh: float = LLM_CACHE_INDEX_REFRESH):
+        """
+        Args:
+            namespace: name of the cached function, part of every key.
+            redis_client: client with decode_responses=True.
+            embed_fn: batched embedding function returning one row per text.
+            threshold: smallest cosine similarity at which a cached question counts as the same question.
+            ttl: lifetime in seconds of a cached answer.
+            max_entries: number of questions kept before the least recently used are evicted.
+            index_refresh: seconds between reloads of the near-duplicate index from Redis.
+        """
+        self.namespace = namespace
+        self.redis_client = redis_client
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.index_refresh = index_refresh
+        self._lru_key = f"llmcache:{namespace}:lru"
+        self._lock = threading.Lock()
+        self._texts: List[str] = []
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._refreshed_at = 0.0
+        self._counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "redis_errors": 0}
+
+    def _key(self, text: str) -> str:
+        return f"llmcache:{self.namespace}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        embeddings = np.asarray(self.embed_fn(texts), dtype=np.float32)
+        return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+    def _refresh_index(self) -> None:
+        """
+        Reloads the cached questions from Redis if the local index is older than `index_refresh`.
+        Only questions this worker hasn't embedded yet are embedded.
+        """
+        if time.monotonic() - self._refreshed_at < self.index_refresh:
+            return
+        texts = self.redis_client.zrange(self._lru_key, 0, -1)
+        with self._lock:
+            known = dict(zip(self._texts, self._matrix))
+        new = [text for text in texts if text not in known]
+        if new:
+            known.update(zip(new, self._embed(new)))
+        with self._lock:
+            self._texts = texts
+            self._matrix = np.stack([known[text] for text in texts]) if texts else np.empty((0, 0), dtype=np.float32)
+            self._refreshed_at = time.monotonic()
+
+    def _nearest(self, text: str) -> Optional[str]:
+        """
+        Returns:
+            str: the cached question most similar to `text`, None if none reaches the threshold.
+        """
+        self._refresh_index()
+        with self._lock:
+            texts, matrix = self._texts, self._matrix
+        if not texts:
+            return None
+        similarities = matrix @ self._embed([text])[0]
+        best = int(np.argmax(similarities))
+        return texts[best] if similarities[best] >= self.threshold else None
+
+    def get(self, question: str) -> Optional[str]:
+        """
+        Looks up the cached answer for a question or a near-duplicate of it.
+
+        Args:
+            question: the question sent to the LLM.
+
+        Returns:
+            str: the cached answer, None on a miss.
+        """
+        text = normalize(question)
+        try:
+            answer = self.redis_client.get(self._key(text))
+            if answer is not None:
+                self._count("exact_hits")
+            else:
+                match = self._nearest(text)
+                if match is not None:
+                    answer = self.redis_client.get(self._key(match))
+                    if answer is None:
+                        # expired since the index was loaded
+                        self.redis_client.zrem(self._lru_key, match)
+                    else:
+                        self._count("semantic_hits")
+                        text = match
+            if answer is None:
+                self._count("misses")
+                return None
+            self.redis_client.zadd(self._lru_key, {text: time.time()})
+            return answer
+        except redis.RedisError as e:
+            self._count("redis_errors")
+            logger.warning("LLM cache lookup failed", extra={"namespace": self.namespace, "error": str(e)})
+            return None
+
+    def put(self, question: str, answer: str) -> None:
+        """
+        Caches the LLM's answer to a question, evicting the least recently used questions if the
+        cache is full.
+
+        Args:
+            question: the question sent to the LLM.
+            answer: the LLM's answer.
+        """
+        text = normalize(question)
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.set(self._key(text), answer, ex=self.ttl)
+            pipe.zadd(self._lru_key, {text: time.time()})
+            # questions unused for a whole TTL have expired answers
+            pipe.zremrangebyscore(self._lru_key, "-inf", time.time() - self.ttl)
+            pipe.zcard(self._lru_key)
+            size = pipe.execute()[-1]
+            if size > self.max_entries:
+                evicted = [member for member, _ in self.redis_client.zpopmin(self._lru_key, size - self.max_entries)]
+                self.redis_client.delete(*[self._key(member) for member in evicted])
+        except redis.RedisError as e:
+            self._count("redis_errors")
+            logger.warning("LLM cache write failed", extra={"namespace": self.namespace, "error": str(e)})
+            return
+
+        # this worker can match near-duplicates of the question straight away, without waiting for a refresh
+        embedding = self._embed([text])
+        with self._lock:
+            if text not in self._texts:
+                self._texts = self._texts + [text]
+                self._matrix = np.concatenate([self._matrix.reshape(-1, embedding.shape[1]), embedding])
+
+    def stats(self) -> Dict[str, int | float]:
+        """
+        Returns:
+            dict: exact and near-duplicate hits, misses, Redis errors, the hit rate and the size of
+            this worker's near-duplicate index.
+        """
+        with self._lock:
+            hits = self._counters["exact_hits"] + self._counters["semantic_hits"]
+            lookups = hits + self._counters["misses"]
+            return {**self._counters, "hit_rate": hits / lookups if lookups else 0.0,
+                    "index_size": len(self._texts)}
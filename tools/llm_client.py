@@ -0,0 +1,365 @@
+import asyncio
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+from dotenv import load_dotenv
+from mistralai import Mistral, models
+
+from tools.admission import CircuitBreaker, TokenBucket
+from tools.metrics import LLM_CIRCUIT_OPEN, LLM_IN_FLIGHT, LLM_QUEUED, LLM_SECONDS, LLM_SHED, Timer
+
+load_dotenv()
+
+MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
+# None uses the Mistral API, point this at a local server for testing
+MISTRAL_SERVER_URL = os.getenv("MISTRAL_SERVER_URL")
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+# calls per second sent to Mistral on average, and the burst allowed above it, 0 for no limit
+LLM_RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", "10"))
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", "20"))
+# calls waiting for a slot at once, more are refused straight away
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+# seconds a call may take from when it asks for a slot, retries included (for a stream, until it opens)
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "20"))
+# consecutive failed calls that open the circuit, and the seconds before a probe call is let through
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+# rate limits and server-side failures are worth another attempt, bad requests are not
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """
+    Exception raised when an LLM call fails after all retries.
+    """
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class LLMUnavailable(LLMError):
+    """
+    Exception raised without calling Mistral when the call is shed: the wait queue is full, no slot
+    came up before the call's deadline, or the circuit breaker is open. Served as a 503.
+    """
+    def __init__(self, message: str, reason: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, models.SDKError):
+        return e.status_code in RETRY_STATUS_CODES
+    return isinstance(e, (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError))
+
+
+class LLMClient:
+    """
+    Shared Mistral client for every tool that calls the LLM.
+
+    HTTP connections are pooled and reused across calls. At most `max_concurrency` calls are in
+    flight per event loop, each with a timeout, and failed calls are retried with exponential
+    backoff and full jitter.
+
+    Async calls go through admission control first. They are started at most `rate_limit` times a
+    second, at most `max_queue` wait for a slot at once, and each has `deadline` seconds to get its
+    slot and finish its attempts. A circuit breaker stops all calls for `breaker_reset` seconds
+    after `breaker_failures` calls in a row failed on timeouts, rate limits or server errors. A call
+    that can't be admitted raises `LLMUnavailable` at once instead of piling up behind the others.
+    """
+
+    def __init__(self, api_key: Optional[str] = MISTRAL_API_KEY, server_url: Optional[str] = MISTRAL_SERVER_URL,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, max_connections: int = LLM_MAX_CONNECTIONS,
+                 timeout: float = LLM_TIMEOUT, max_retries: int = LLM_MAX_RETRIES,
+                 retry_base_delay: float = LLM_RETRY_BASE_DELAY, rate_limit: float = LLM_RATE_LIMIT,
+                 rate_burst: int = LLM_RATE_BURST, max_queue: int = LLM_MAX_QUEUE, deadline: float = LLM_DEADLINE,
+                 breaker_failures: int = LLM_BREAKER_FAILURES, breaker_reset: float = LLM_BREAKER_RESET):
+        """
+        Args:
+            api_key: Mistral API key.
+            server_url: base URL of the Mistral API, None for the default.
+            max_concurrency: largest number of calls in flight at once.
+            max_connections: size of the HTTP connection pool.
+            timeout: seconds before a single attempt is abandoned.
+            max_retries: number of extra attempts after a retryable failure.
+            retry_base_delay: backoff before the first retry in seconds, doubled for each one after.
+            rate_limit: calls started per second on average, 0 for no limit.
+            rate_burst: calls that can be started at once above the average rate.
+            max_queue: largest number of calls waiting for a slot.
+            deadline: seconds from asking for a slot to the end of the last attempt.
+            breaker_failures: consecutive failed calls that open the circuit.
+            breaker_reset: seconds the circuit stays open before a probe call.
+        """
+        self.api_key = api_key
+        self.server_url = server_url
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.bucket = TokenBucket(rate_limit, rate_burst)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        self._waiting = 0
+        self._shed: Dict[str, int] = {}
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._sync_sdk: Optional[Mistral] = None
+        self._async_sdk: Optional[Mistral] = None
+        self._sync_http: Optional[httpx.Client] = None
+        self._async_http: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing: Set[asyncio.Task] = set()
+
+    def _sdk_sync(self) -> Mistral:
+        if self._sync_sdk is None:
+            self._sync_http = httpx.Client(limits=self._limits, timeout=self.timeout)
+            self._sync_sdk = Mistral(api_key=self.api_key, server_url=self.server_url, client=self._sync_http)
+        return self._sync_sdk
+
+    def _sdk_async(self) -> Mistral:
+        # the connection pool and semaphore belong to the event loop that first used them
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._close_stale_pool()
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._async_http = httpx.AsyncClient(limits=self._limits, timeout=self.timeout)
+            self._async_sdk = Mistral(api_key=self.api_key, server_url=self.server_url, async_client=self._async_http)
+        return self._async_sdk
+
+    def _close_stale_pool(self) -> None:
+        """
+        Closes the connection pool of the event loop used before this one, on that loop if it still
+        runs (in another thread), else as well as a closed loop allows.
+        """
+        http, loop = self._async_http, self._loop
+        self._async_http = None
+        if http is None or loop is None:
+            return
+        if loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(http.aclose(), loop)
+            return
+
+        async def close():
+            try:
+                await http.aclose()
+            except RuntimeError:
+                # its sockets belong to the closed loop, only the pool itself can be shut
+                pass
+        task = asyncio.get_running_loop().create_task(close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def aclose(self) -> None:
+        """
+        Closes the pooled HTTP connections. Called when the server shuts down, on the loop that
+        made the calls.
+        """
+        if self._async_http is not None:
+            await self._async_http.aclose()
+        if self._sync_http is not None:
+            self._sync_http.close()
+        self._async_http = self._sync_http = None
+        self._async_sdk = self._sync_sdk = None
+        self._loop = None
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, self.retry_base_delay * 2 ** attempt)
+
+    def _timeout_ms(self, deadline: float) -> int:
+        # an attempt never runs past the call's deadline
+        return max(1, int(min(self.timeout, deadline - time.monotonic()) * 1000))
+
+    def _unavailable(self, tool: str, reason: str) -> LLMUnavailable:
+        self._shed[reason] = self._shed.get(reason, 0) + 1
+        LLM_SHED.labels(tool=tool, reason=reason).inc()
+        if reason == "circuit_open":
+            return LLMUnavailable("Mistral is unavailable, calls are paused after repeated failures", reason,
+                                  retry_after=self.breaker.reset_timeout)
+        return LLMUnavailable("Too many Mistral calls waiting, try again shortly", reason)
+
+    def check_admission(self, tool: str = "other") -> None:
+        """
+        Raises `LLMUnavailable` if a call made now would be refused straight away, so a streaming
+        endpoint can answer with a 503 before it starts its response.
+        """
+        if self.breaker.state == "open":
+            raise self._unavailable(tool, "circuit_open")
+        if self._waiting >= self.max_queue:
+            raise self._unavailable(tool, "queue_full")
+
+    @asynccontextmanager
+    async def _admitted(self, tool: str, deadline: float):
+        """
+        Holds a concurrency slot for one call, once the circuit breaker, the wait queue and the rate
+        limiter have let it through before its deadline. Records the call's outcome with the breaker.
+        """
+        if self._waiting >= self.max_queue:
+            raise self._unavailable(tool, "queue_full")
+        if not self.breaker.allow():
+            LLM_CIRCUIT_OPEN.set(1)
+            raise self._unavailable(tool, "circuit_open")
+        self._waiting += 1
+        LLM_QUEUED.inc()
+        admitted = False
+        try:
+            wait = self.bucket.reserve(deadline - time.monotonic())
+            if wait is None:
+                raise self._unavailable(tool, "deadline")
+            if wait:
+                await asyncio.sleep(wait)
+            if self._semaphore.locked():
+                try:
+                    await asyncio.wait_for(self._semaphore.acquire(), timeout=deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    raise self._unavailable(tool, "deadline") from None
+            else:
+                await self._semaphore.acquire()
+            admitted = True
+        finally:
+            self._waiting -= 1
+            LLM_QUEUED.dec()
+            if not admitted:
+                self.breaker.release()
+
+        try:
+            yield
+        except LLMError as e:
+            # only timeouts, rate limits and server errors say Mistral is unhealthy
+            if _is_retryable(e.__cause__):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self._semaphore.release()
+            LLM_CIRCUIT_OPEN.set(int(self.breaker.state != "closed"))
+
+    def stats(self) -> Dict[str, str | int | Dict[str, int]]:
+        """
+        Returns:
+            dict: circuit breaker state, calls waiting for a slot and calls shed by reason in this worker.
+        """
+        return {"circuit": self.breaker.state, "waiting": self._waiting, "shed": dict(self._shed)}
+
+    async def complete(self, messages: List[Dict[str, str]], model: str, tool: str = "other") -> str:
+        """
+        Sends a chat completion request without blocking the event loop.
+
+        Args:
+            messages: chat messages, e.g. [{"role": "user", "content": "..."}].
+            model: name of the Mistral model.
+            tool: name of the calling tool, the label of the call's metrics.
+
+        Returns:
+            str: content of the first choice.
+
+        Raises:
+            LLMUnavailable: if the call is shed before reaching Mistral.
+            LLMError: if every attempt fails.
+        """
+        sdk = self._sdk_async()
+        deadline = time.monotonic() + self.deadline
+        with Timer(LLM_SECONDS, tool=tool, outcome="shed") as timer:
+            async with self._admitted(tool, deadline):
+                timer.labels["outcome"] = "error"
+                with LLM_IN_FLIGHT.labels(tool=tool).track_inprogress():
+                    for attempt in range(self.max_retries + 1):
+                        try:
+                            response = await sdk.chat.complete_async(model=model, messages=messages,
+                                                                     timeout_ms=self._timeout_ms(deadline))
+                            timer.labels["outcome"] = "ok"
+                            return response.choices[0].message.content
+                        except Exception as e:
+                            backoff = self._backoff(attempt)
+                            if (attempt == self.max_retries or not _is_retryable(e)
+                                    or time.monotonic() + backoff >= deadline):
+                                raise LLMError(f"Mistral call failed after {attempt + 1} attempt(s): {e}") from e
+                            await asyncio.sleep(backoff)
+
+    async def stream(self, messages: List[Dict[str, str]], model: str, tool: str = "other") -> AsyncIterator[str]:
+        """
+        Streams a chat completion as it is generated. Opening the stream is retried like
+        `complete`, failures after the first token are not. Closing the iterator early (e.g. when
+        the client disconnects) closes the upstream connection and frees the concurrency slot.
+
+        Args:
+            messages: chat messages, e.g. [{"role": "user", "content": "..."}].
+            model: name of the Mistral model.
+            tool: name of the calling tool, the label of the call's metrics.
+
+        Yields:
+            str: pieces of the first choice's content, in order.
+
+        Raises:
+            LLMUnavailable: if the call is shed before reaching Mistral.
+            LLMError: if the stream can't be opened or breaks off.
+        """
+        sdk = self._sdk_async()
+        deadline = time.monotonic() + self.deadline
+        with Timer(LLM_SECONDS, tool=tool, outcome="shed") as timer:
+            async with self._admitted(tool, deadline):
+                timer.labels["outcome"] = "error"
+                with LLM_IN_FLIGHT.labels(tool=tool).track_inprogress():
+                    for attempt in range(self.max_retries + 1):
+                        try:
+                            # the deadline covers opening the stream, not generating the whole reply
+                            events = await asyncio.wait_for(
+                                sdk.chat.stream_async(model=model, messages=messages,
+                                                      timeout_ms=int(self.timeout * 1000)),
+                                timeout=deadline - time.monotonic())
+                            break
+                        except Exception as e:
+                            backoff = self._backoff(attempt)
+                            if (attempt == self.max_retries or not _is_retryable(e)
+                                    or time.monotonic() + backoff >= deadline):
+                                raise LLMError(f"Mistral stream failed after {attempt + 1} attempt(s): {e}") from e
+                            await asyncio.sleep(backoff)
+
+                    async with events:
+                        try:
+                            async for event in events:
+                                content = event.data.choices[0].delta.content
+                                if isinstance(content, str) and content:
+                                    yield content
+                        except (models.SDKError, httpx.HTTPError) as e:
+                            raise LLMError(f"Mistral stream broke off: {e}") from e
+                        except GeneratorExit:
+                            timer.labels["outcome"] = "cancelled"
+                            raise
+                    timer.labels["outcome"] = "ok"
+
+    def complete_sync(self, messages: List[Dict[str, str]], model: str, tool: str = "other") -> str:
+        """
+        Blocking version of `complete` for scripts and other synchronous callers.
+        """
+        sdk = self._sdk_sync()
+        with Timer(LLM_SECONDS, tool=tool, outcome="error") as timer, LLM_IN_FLIGHT.labels(tool=tool).track_inprogress():
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = sdk.chat.complete(model=model, messages=messages, timeout_ms=int(self.timeout * 1000))
+                    timer.labels["outcome"] = "ok"
+                    return response.choices[0].message.content
+                except Exception as e:
+                    if attempt == self.max_retries or not _is_retryable(e):
+                        raise LLMError(f"Mistral call failed after {attempt + 1} attempt(s): {e}") from e
+                    time.sleep(self._backoff(attempt))
+
+
+llm_client = LLMClient()
@@ -0,0 +1,69 @@
+import json
+import logging
+import os
+import sys
+
+# DEBUG, INFO, WARNING, ERROR, or OFF to turn the server's own logging off
+SIERRA_LOG_LEVEL = os.getenv("SIERRA_LOG_LEVEL", "INFO").upper()
+# "json" (one object per line, for log collectors) or "text"
+SIERRA_LOG_FORMAT = os.getenv("SIERRA_LOG_FORMAT", "json").lower()
+
+LOGGERS = ("app", "tools")
+
+# attributes every LogRecord has, anything else was passed with `extra=`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def _extra(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object, with the fields passed through `extra=` as keys of their own.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                 "message": record.getMessage(), **_extra(record)}
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Formats a record as a line of text, with the fields passed through `extra=` appended as key=value.
+    """
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra = " ".join(f"{key}={value}" for key, value in _extra(record).items())
+        return f"{line} {extra}" if extra else line
+
+
+def configure_logging(level: str = SIERRA_LOG_LEVEL, fmt: str = SIERRA_LOG_FORMAT) -> None:
+    """
+    Sends the records of the server's loggers ("app" and "tools.*") to stderr, leaving the logging
+    of uvicorn and the libraries as it is.
+
+    Args:
+        level: log level name, or "OFF" to drop every record.
+        fmt: "json" or "text".
+    """
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    for name in LOGGERS:
+        logger = logging.getLogger(name)
+        for old in list(logger.handlers):
+            logger.removeHandler(old)
+        logger.propagate = False
+        if level == "OFF":
+            logger.addHandler(logging.NullHandler())
+            logger.setLevel(logging.CRITICAL + 1)
+        else:
+            logger.addHandler(handler)
+            logger.setLevel(level)
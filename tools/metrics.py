@@ -0,0 +1,81 @@
+import os
+import time
+from typing import Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+
+# set by deployments running several worker processes (e.g. Gunicorn), so /metrics adds up every worker
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# in-process phases take from under a millisecond (tokenization) to a few hundred (a large batch)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Mistral calls and whole requests take from a few hundred milliseconds to tens of seconds
+SLOW_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REQUEST_SECONDS = Histogram("sierra_request_seconds", "Time to handle a request, until the response starts",
+                            ["endpoint", "method", "status"], buckets=SLOW_BUCKETS)
+REQUESTS_IN_FLIGHT = Gauge("sierra_requests_in_flight", "Requests being handled", ["endpoint"],
+                           multiprocess_mode="livesum")
+TOKENIZE_SECONDS = Histogram("sierra_tokenize_seconds", "Time to tokenize a batch of questions for a classifier",
+                             ["model"], buckets=FAST_BUCKETS)
+FORWARD_SECONDS = Histogram("sierra_forward_seconds", "Time of one classifier forward pass (one length bucket)",
+                            ["model"], buckets=FAST_BUCKETS)
+ENCODE_SECONDS = Histogram("sierra_encode_seconds", "Time of one SentenceTransformer encode call on cache misses",
+                           buckets=FAST_BUCKETS)
+LLM_SECONDS = Histogram("sierra_llm_seconds", "Time of a Mistral call including retries, by calling tool",
+                        ["tool", "outcome"], buckets=SLOW_BUCKETS)
+LLM_IN_FLIGHT = Gauge("sierra_llm_in_flight", "Mistral calls in flight", ["tool"], multiprocess_mode="livesum")
+LLM_QUEUED = Gauge("sierra_llm_queued", "Mistral calls waiting for admission", multiprocess_mode="livesum")
+LLM_SHED = Counter("sierra_llm_shed", "Mistral calls refused without being sent, by reason (queue_full, deadline, "
+                   "circuit_open)", ["tool", "reason"])
+LLM_CIRCUIT_OPEN = Gauge("sierra_llm_circuit_open", "1 while a worker's Mistral circuit breaker is open or probing",
+                         multiprocess_mode="livemax")
+REDIS_SECONDS = Histogram("sierra_redis_seconds", "Time of a Redis command or pipeline", ["operation"],
+                          buckets=FAST_BUCKETS)
+PROMPT_TOKENS = Histogram("sierra_prompt_tokens", "Estimated tokens of each chatbot prompt",
+                          buckets=(250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000))
+SINGLE_FLIGHT_CALLS = Counter("sierra_single_flight_calls", "Calls to coalesced operations, by whether they did "
+                              "the work (leader) or waited for an identical call in flight (follower)",
+                              ["operation", "role"])
+QUEUE_DEPTH = Gauge("sierra_batch_queue_depth", "Inputs waiting in a classifier batching queue", ["engine"],
+                    multiprocess_mode="livesum")
+
+
+class Timer:
+    """
+    Context manager that observes the elapsed time into a histogram, with labels that can be set
+    once the outcome is known.
+
+    Usage:
+        with Timer(LLM_SECONDS, tool="stage", outcome="ok") as timer:
+            ...
+            timer.labels["outcome"] = "error"
+    """
+
+    def __init__(self, histogram: Histogram, **labels: str):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        elapsed = time.perf_counter() - self.start
+        (self.histogram.labels(**self.labels) if self.labels else self.histogram).observe(elapsed)
+
+
+def render() -> Tuple[bytes, str]:
+    """
+    Renders every metric in the Prometheus text format, combined across worker processes when
+    PROMETHEUS_MULTIPROC_DIR is set.
+
+    Returns:
+        tuple: the body and its content type.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,142 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# "lazy" loads each model on first use, "background" also warms them up in a thread once the server
+# has started, "eager" loads them all before the server accepts requests
+MODEL_LOADING = os.getenv("MODEL_LOADING", "background")
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Central place where the tools register their models instead of loading them at import time.
+
+    A model is loaded by its loader the first time it is asked for, once per process: concurrent
+    callers wait for the same load. `warm_up` loads every model registered with `warm=True` in a
+    background thread, so a worker can start serving straight away and the first requests don't
+    pay for the loading.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._warm: List[str] = []
+        self._preload: List[str] = []
+        self._models: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._warm_thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, loader: Callable[[], Any], warm: bool = True, preload: bool = True) -> None:
+        """
+        Args:
+            name: name the model is looked up by.
+            loader: function that loads and returns the model.
+            warm: load the model during `warm_up`, False for models no endpoint needs.
+            preload: the model can be loaded before the server forks its workers (see `preload_for_fork`),
+                False for models that don't survive a fork, like ONNX Runtime sessions and their thread pools.
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+            self._status[name] = {"loaded": False, "load_seconds": None, "error": None}
+            if warm and name not in self._warm:
+                self._warm.append(name)
+            if warm and preload and name not in self._preload:
+                self._preload.append(name)
+
+    def get(self, name: str) -> Any:
+        """
+        Returns the model, loading it first if this is the first time it is used.
+
+        Args:
+            name: name the model was registered with.
+
+        Returns:
+            the loaded model.
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if name not in self._loaders:
+            raise KeyError(f"No model registered as {name!r}")
+
+        with self._locks[name]:
+            if name not in self._models:
+                start = time.perf_counter()
+                try:
+                    self._models[name] = self._loaders[name]()
+                except Exception as e:
+                    self._status[name]["error"] = f"{type(e).__name__}: {e}"
+                    raise
+                self._status[name] = {"loaded": True, "load_seconds": time.perf_counter() - start, "error": None}
+                logger.info("Loaded model", extra={"model": name, "seconds": self._status[name]["load_seconds"]})
+        return self._models[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def load_all(self) -> None:
+        """
+        Loads every model registered with `warm=True`, in registration order. A model that fails to
+        load is recorded in `status` and retried on its next use.
+        """
+        for name in list(self._warm):
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error("Loading model failed", extra={"model": name, "error": str(e)})
+
+    def preload_for_fork(self) -> List[str]:
+        """
+        Loads the models that can be shared with forked workers, in the process that will fork them.
+        PyTorch modules are put in eval mode with gradients off, so nothing writes to the weights and
+        their pages stay shared copy-on-write between the workers.
+
+        Returns:
+            list: names of the models loaded.
+        """
+        import torch
+
+        for name in list(self._preload):
+            model = self.get(name)
+            if isinstance(model, torch.nn.Module):
+                model.eval()
+                model.requires_grad_(False)
+        return list(self._preload)
+
+    def warm_up(self) -> threading.Thread:
+        """
+        Starts `load_all` in a background thread, if it isn't already running.
+
+        Returns:
+            threading.Thread: the warm-up thread.
+        """
+        with self._lock:
+            if self._warm_thread is None or not self._warm_thread.is_alive():
+                self._warm_thread = threading.Thread(target=self.load_all, name="model-warm-up", daemon=True)
+                self._warm_thread.start()
+            return self._warm_thread
+
+    def ready(self) -> bool:
+        """
+        Returns:
+            bool: whether every model registered with `warm=True` is loaded.
+        """
+        return all(name in self._models for name in self._warm)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns:
+            dict: for each registered model, whether it is loaded, how long the load took and the
+            error of the last failed load.
+        """
+        with self._lock:
+            return {name: dict(status) for name, status in self._status.items()}
+
+
+registry = ModelRegistry()
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import math
+import os
+import uuid
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Set
+
+from tools.conversational_child import render_prompt
+from tools.llm_client import LLMError, llm_client
+from tools.metrics import PROMPT_TOKENS
+from tools.session_store import SessionStore, render_history
+
+# most tokens the chatbot prompt may take, scenario and interviewer message included
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+# most recent turns kept word for word, older turns are folded into the summary
+PROMPT_RECENT_TURNS = int(os.getenv("PROMPT_RECENT_TURNS", "6"))
+# most tokens the rolling summary may take
+PROMPT_SUMMARY_TOKENS = int(os.getenv("PROMPT_SUMMARY_TOKENS", "300"))
+# the summary is updated once this many turns have dropped out of the recent window
+PROMPT_SUMMARY_BATCH = int(os.getenv("PROMPT_SUMMARY_BATCH", "4"))
+PROMPT_SUMMARY_MODEL = os.getenv("PROMPT_SUMMARY_MODEL", "mistral-small-latest")
+
+# Mistral's tokenizer averages about 4 characters per token on English text, so counting one per 3
+# overestimates and keeps the real prompt inside the budget
+CHARS_PER_TOKEN = 3
+
+logger = logging.getLogger(__name__)
+
+summary_template = """You are keeping notes on an investigative interview with a child.
+
+### Notes so far:
+{summary}
+
+### Next part of the interview:
+{turns}
+
+Rewrite the notes so they also cover the next part of the interview. Keep every fact the child has
+disclosed (people, places, times, events) and what the interviewer has already asked about. Write
+plain sentences, at most {words} words, and nothing else."""
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Upper estimate of the number of Mistral tokens in `text`.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate(text: str, max_tokens: int, count_tokens: Callable[[str], int] = estimate_tokens,
+             keep_end: bool = False) -> str:
+    """
+    Longest prefix (or suffix, with `keep_end`) of `text` that fits in `max_tokens`.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[-middle:] if keep_end else text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    if low == 0:
+        return ""
+    return text[-low:] if keep_end else text[:low]
+
+
+def render_summary(summary: str) -> str:
+    return f"\n (Summary of the earlier conversation: {summary})" if summary else ""
+
+
+class ChildPrompt(NamedTuple):
+    """
+    Inputs of the chatbot prompt, cut down to fit the token budget.
+    """
+    scenario: str
+    history: str
+    prompt_content: str
+    tokens: int
+
+
+class PromptBuilder:
+    """
+    Builds the chatbot prompt within a token budget, however long the interview gets.
+
+    The prompt holds the last `recent_turns` turns word for word and a rolling summary of everything
+    before them. The summary is stored in the session metadata (`summary`, and `summarized_turns`
+    for how many turns it covers) and updated in the background by `fold`, a batch of turns at a
+    time, so a turn never waits for it. Turns that have left the recent window but aren't in the
+    summary yet still go in the prompt, newest first, while they fit.
+    """
+
+    def __init__(self, budget: int = PROMPT_TOKEN_BUDGET, recent_turns: int = PROMPT_RECENT_TURNS,
+                 summary_tokens: int = PROMPT_SUMMARY_TOKENS, summary_batch: int = PROMPT_SUMMARY_BATCH,
+                 count_tokens: Callable[[str], int] = estimate_tokens,
+                 summarize_fn: Optional[Callable[[str, List[Dict[str, str]]], Awaitable[str]]] = None):
+        """
+        Args:
+            budget: most tokens the prompt may take.
+            recent_turns: turns kept word for word.
+            summary_tokens: most tokens the summary may take.
+            summary_batch: turns folded into the summary at once.
+            count_tokens: token counter, conservative by default.
+            summarize_fn: async function of the previous summary and the turns to add, returning the
+                new summary, defaults to asking Mistral.
+        """
+        self.budget = budget
+        self.recent_turns = max(1, recent_turns)
+        self.summary_tokens = summary_tokens
+        self.summary_batch = max(1, summary_batch)
+        self.count_tokens = count_tokens
+        self.summarize_fn = summarize_fn or self._llm_summary
+        self._folding: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def build(self, scenario: str, prompt_content: str, summary: str, turns: List[Dict[str, str]]) -> ChildPrompt:
+        """
+        Fits the prompt in the budget. The interviewer's message and the scenario come first, then
+        the newest turn, the summary and older turns while they fit. Anything that doesn't fit is cut.
+
+        Args:
+            scenario: the session's scenario.
+            prompt_content: the interviewer's message.
+            summary: summary of the turns before `turns`.
+            turns: turns not covered by the summary, oldest first.
+
+        Returns:
+            ChildPrompt: the prompt inputs and their token count.
+        """
+        # only an oversized message or scenario can make the prompt overflow without any history
+        prompt_content = truncate(prompt_content, self.budget,
+                                  lambda text: self.count_tokens(render_prompt(scenario, "", text)))
+        scenario = truncate(scenario, self.budget,
+                            lambda text: self.count_tokens(render_prompt(text, "", prompt_content)))
+        # the rest of the prompt is fixed now, so render it once and count the history between its two halves
+        marker = uuid.uuid4().hex
+        before, _, after = render_prompt(scenario, marker, prompt_content).partition(marker)
+        count = lambda history: self.count_tokens(before + history + after)
+        fits = lambda history: count(history) <= self.budget
+
+        summary = truncate(summary, self.summary_tokens, self.count_tokens, keep_end=True)
+        kept: List[Dict[str, str]] = []
+        for turn in reversed(turns):
+            candidate = [turn] + kept
+            # the newest turn goes in before the summary, older ones only after it
+            if not fits((render_summary(summary) if kept else "") + render_history(candidate)):
+                break
+            kept = candidate
+        # the summary shrinks to what is left, then the newest turn is cut if it doesn't fit on its own
+        summary = truncate(summary, self.budget, lambda text: count(render_summary(text) + render_history(kept)),
+                           keep_end=True)
+        history = render_summary(summary) + render_history(kept if kept else turns[-1:])
+        history = truncate(history, self.budget, count, keep_end=True)
+
+        tokens = count(history)
+        PROMPT_TOKENS.observe(tokens)
+        return ChildPrompt(scenario, history, prompt_content, tokens)
+
+    async def for_session(self, store: SessionStore, session_id: str, scenario: str,
+                          prompt_content: str) -> ChildPrompt:
+        """
+        Builds the prompt from the session's summary and the turns it doesn't cover.
+        """
+        meta = await store.metadata(session_id)
+        total = int(meta.get("turns", 0))
+        summarized = min(int(meta.get("summarized_turns", 0)), total)
+        turns = await store.recent_turns(session_id, total - summarized) if total > summarized else []
+        return self.build(scenario, prompt_content, meta.get("summary", ""), turns)
+
+    async def fold(self, store: SessionStore, session_id: str) -> bool:
+        """
+        Folds the turns that have left the recent window into the session's summary, once there are
+        at least `summary_batch` of them.
+
+        Returns:
+            bool: whether the summary was updated.
+        """
+        meta = await store.metadata(session_id)
+        total = int(meta.get("turns", 0))
+        summarized = int(meta.get("summarized_turns", 0))
+        stop = total - self.recent_turns
+        if stop - summarized < self.summary_batch:
+            return False
+
+        turns = await store.turn_range(session_id, summarized, stop)
+        summary = await self.summarize_fn(meta.get("summary", ""), turns)
+        summary = truncate(summary.strip(), self.summary_tokens, self.count_tokens)
+        await store.update_metadata(session_id, {"summary": summary, "summarized_turns": summarized + len(turns)})
+        return True
+
+    def schedule_fold(self, store: SessionStore, session_id: str) -> None:
+        """
+        Runs `fold` in the background, at most once at a time per session in this worker.
+        """
+        if session_id in self._folding:
+            return
+        self._folding.add(session_id)
+
+        async def run():
+            try:
+                await self.fold(store, session_id)
+            except Exception:
+                logger.exception("Updating the session summary failed", extra={"session_id": session_id})
+            finally:
+                self._folding.discard(session_id)
+
+        task = asyncio.get_running_loop().create_task(run())
+        # the loop only keeps a weak reference to its tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _llm_summary(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        """
+        Asks Mistral for the updated summary. If the call fails, the new turns are appended to the
+        old summary as they are, and cut to the summary budget keeping the most recent.
+        """
+        words = self.summary_tokens * 3 // 4
+        prompt = summary_template.format(summary=summary or "(none yet)", turns=render_history(turns), words=words)
+        try:
+            if text := await llm_client.complete([{"role": "user", "content": prompt}], PROMPT_SUMMARY_MODEL,
+                                                 tool="summary"):
+                return text
+        except LLMError as e:
+            logger.warning("Mistral call failed", extra={"tool": "summary", "error": str(e)})
+        return truncate(summary + render_history(turns), self.summary_tokens, self.count_tokens, keep_end=True)
+
+
+prompt_builder = PromptBuilder()
@@ -0,0 +1,117 @@
+import os
+import time
+import redis
+import redis.asyncio
+import redis.asyncio.client
+import redis.client
+
+from tools.metrics import REDIS_SECONDS
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+REDIS_DB = int(os.getenv("REDIS_DB", "0"))
+# connections in each worker's async pool, a request waits up to REDIS_POOL_TIMEOUT seconds for a free one
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "64"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+
+_clients = {}
+_async_clients = {}
+
+
+def _observe(operation: str, start: float) -> None:
+    REDIS_SECONDS.labels(operation=operation).observe(time.perf_counter() - start)
+
+
+class TimedPipeline(redis.client.Pipeline):
+    """
+    Pipeline whose round trip is timed as a single "pipeline" operation.
+    """
+
+    def execute(self, raise_on_error: bool = True):
+        start = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            _observe("pipeline", start)
+
+
+class TimedRedis(redis.Redis):
+    """
+    Client that times every command into the `sierra_redis_seconds` histogram, labelled by command name.
+    """
+
+    def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            _observe(str(args[0]).upper(), start)
+
+    def pipeline(self, transaction=True, shard_hint=None) -> TimedPipeline:
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class AsyncTimedPipeline(redis.asyncio.client.Pipeline):
+    """
+    Async version of `TimedPipeline`.
+    """
+
+    async def execute(self, raise_on_error: bool = True):
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            _observe("pipeline", start)
+
+
+class AsyncTimedRedis(redis.asyncio.Redis):
+    """
+    Async version of `TimedRedis`.
+    """
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            _observe(str(args[0]).upper(), start)
+
+    def pipeline(self, transaction=True, shard_hint=None) -> AsyncTimedPipeline:
+        return AsyncTimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def get_redis(decode_responses: bool = True) -> redis.Redis:
+    """
+    Returns the shared client for the server's Redis instance. Clients are pooled, so every tool
+    that talks to Redis should get its client from here rather than building its own.
+
+    Args:
+        decode_responses: decode values to str, pass False for binary values such as embeddings.
+
+    Returns:
+        redis.Redis: shared client.
+    """
+    if decode_responses not in _clients:
+        _clients[decode_responses] = TimedRedis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB,
+                                                decode_responses=decode_responses)
+    return _clients[decode_responses]
+
+
+def get_async_redis(decode_responses: bool = True) -> redis.asyncio.Redis:
+    """
+    Async version of `get_redis`, for code running on the event loop. Its connection pool holds at
+    most REDIS_MAX_CONNECTIONS connections, and a command waits for a free one when they are all busy
+    instead of opening more.
+
+    Args:
+        decode_responses: decode values to str, pass False for binary values.
+
+    Returns:
+        redis.asyncio.Redis: shared async client.
+    """
+    if decode_responses not in _async_clients:
+        pool = redis.asyncio.BlockingConnectionPool(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB,
+                                                    decode_responses=decode_responses,
+                                                    max_connections=REDIS_MAX_CONNECTIONS, timeout=REDIS_POOL_TIMEOUT)
+        _async_clients[decode_responses] = AsyncTimedRedis(connection_pool=pool)
+    return _async_clients[decode_responses]
@@ -1,16 +1,9 @@
-import os
-from mistralai import Mistral
-import os
-from dotenv import load_dotenv
+import logging
+from tools.llm_client import LLMUnavailable, llm_client
 from typing import Dict
 
-load_dotenv()
-
-api_key = os.getenv("MISTRAL_API_KEY")
-
 model = "mistral-large-latest"
-
-client = Mistral(api_key=api_key)
+logger = logging.getLogger(__name__)
 
 prompt_content = """Your task is to generate scenarios for an investigative interviewer to imagine themselves within. The interviewer primarily works with abused children (including sexual), up to age 18. Please generate a scenario of the form: Scenario: [Scenario] Age: [age]. The scenario should be short, include no dialogue and only have a few details. The scenario should just be some brief information about evidence. Also include the name and age of the child as separate fields. They cannot be named Lucas.
 
@@ -21,6 +14,13 @@ Scenario: A six-year-old girl named Emily is brought to testify in court regardi
 Name: Emily
 Age: 6 """
 
+messages = [
+    {
+        "role": "user",
+        "content": prompt_content,
+    },
+]
+
 def parse_text_to_dict(text) -> Dict[str, str]:
     """
     Helper function to parse text into a dictionary. This is used to extract Scenario, Name, and Age from the generated text.
@@ -51,20 +51,26 @@ def create_scenario() -> Dict[str, str]:
     """
 
     try:
-        chat_response = client.chat.complete(
-            model= model,
-            messages = [
-                {
-                    "role": "user",
-                    "content": prompt_content,
-                },
-            ]
-        )
-            
-        text = chat_response.choices[0].message.content
+        text = llm_client.complete_sync(messages, model, tool="scenario")
+        return parse_text_to_dict(text)
+    except Exception as e:
+        logger.warning("Mistral call failed", extra={"tool": "scenario", "error": str(e)})
+        return "This is an error message, something went wrong :("
+
+
+async def create_scenario_async() -> Dict[str, str]:
+    """
+    Async version of `create_scenario`, does not block the event loop. Raises `LLMUnavailable`
+    when the call is shed.
+    """
+
+    try:
+        text = await llm_client.complete(messages, model, tool="scenario")
         return parse_text_to_dict(text)
+    except LLMUnavailable:
+        raise
     except Exception as e:
-        print(f"Error calling mistral api: {e}")
+        logger.warning("Mistral call failed", extra={"tool": "scenario", "error": str(e)})
         return "This is an error message, something went wrong :("
 
 
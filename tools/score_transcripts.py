@@ -0,0 +1,220 @@
+"""
+Scores archived interview transcripts in bulk, the same way `/end-stage-feedback` scores one.
+
+Each input line is one transcript in the `/end-stage-feedback` request format, with an optional id:
+
+    {"id": "interview-17", "responses": [{"question": "...", "response": "..."}, ...]}
+
+Transcripts are read lazily from the JSONL files and sent in chunks to a pool of worker processes.
+Every worker loads the sentence model once, then encodes all the distinct utterances of a chunk in
+large batches. Each result is appended to the output JSONL as soon as its chunk is done:
+
+    {"id": ..., "score": 7, "raw_score": 1.04, "windows": [{"question": 2, "score": 1.0, "context_switch": false}, ...]}
+
+`score` is the 0-10 score of `/end-stage-feedback`. `windows` has one entry per QAQ window, by the
+position of its second question, flagged the way `/live-feedback` flags a context switch.
+Transcripts that can't be scored get an "error" instead. Transcripts without an id are named
+"<file name>:<line number>".
+
+An interrupted run picks up where it stopped: transcripts whose id is already in the output are
+skipped. Progress and the final throughput report go to stderr.
+
+Run from the repository root:
+    python -m tools.score_transcripts transcripts/*.jsonl --output scores.jsonl [--workers 4] [--batch-size 256]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from tools.feedback import CONTEXT_SWITCH_THRESHOLD, score_from_embeddings, window_scores
+
+Transcript = Tuple[str, List[str]]
+
+_model = None
+_batch_size = 256
+
+
+def read_transcripts(paths: List[str], done: Set[str]) -> Iterator[Transcript]:
+    """
+    Streams (id, utterances) from JSONL files, skipping the ids in `done`.
+
+    Args:
+        paths: input JSONL files.
+        done: ids already in the output.
+
+    Returns:
+        iterator: id and question/response utterances, in order, of each transcript.
+    """
+    for path in paths:
+        with open(path) as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                transcript_id = str(record.get("id", f"{os.path.basename(path)}:{line_number}"))
+                if transcript_id in done:
+                    continue
+                utterances = []
+                for pair in record["responses"]:
+                    utterances.append(pair["question"])
+                    utterances.append(pair["response"])
+                yield transcript_id, utterances
+
+
+def load_done(output: str) -> Set[str]:
+    """
+    Ids already scored in an existing output file. A last line cut off by an interrupted run is
+    removed, so its transcript is scored again.
+
+    Args:
+        output: the output JSONL file.
+
+    Returns:
+        set: ids of the transcripts in the output.
+    """
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "rb+") as f:
+        complete = 0
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                break
+            complete += len(line)
+        f.truncate(complete)
+    return done
+
+
+def score_transcript(transcript_id: str, embeddings: np.ndarray) -> Dict:
+    """
+    Score of one transcript from its utterance embeddings, as `/end-stage-feedback` computes it,
+    and the context switch flag of each QAQ window.
+
+    Args:
+        transcript_id: id written with the result.
+        embeddings: embeddings of the transcript utterances, in order.
+
+    Returns:
+        dict: the output record.
+    """
+    if len(embeddings) < 2:
+        return {"id": transcript_id, "error": f"a transcript needs at least one question and response, "
+                                             f"got {len(embeddings)} utterance(s)"}
+    raw_score = float(score_from_embeddings(embeddings))
+    # QAQ windows start at the questions, every other utterance
+    scores = window_scores(embeddings)[0::2] if len(embeddings) >= 3 else []
+    windows = [{"question": i + 2, "score": float(score), "context_switch": bool(score < CONTEXT_SWITCH_THRESHOLD)}
+               for i, score in enumerate(scores)]
+    return {"id": transcript_id, "score": min(10, int(10 * raw_score)), "raw_score": raw_score, "windows": windows}
+
+
+def _init_worker(threads: int, batch_size: int) -> None:
+    """
+    Loads the sentence model once per worker process.
+    """
+    global _model, _batch_size
+    import torch
+    from tools.model_registry import registry
+
+    torch.set_num_threads(threads)
+    _model = registry.get("sentence_model")
+    _batch_size = batch_size
+
+
+def _score_chunk(chunk: List[Transcript]) -> Tuple[List[Dict], int]:
+    """
+    Scores a chunk of transcripts in a worker, encoding each distinct utterance of the chunk once.
+
+    Returns:
+        tuple: the output records and the number of utterances scored.
+    """
+    texts = list(dict.fromkeys(text for _, utterances in chunk for text in utterances))
+    rows = {text: row for row, text in enumerate(texts)}
+    embeddings = _model.encode(texts, batch_size=_batch_size, convert_to_numpy=True) if texts else None
+    results = [score_transcript(transcript_id, embeddings[[rows[text] for text in utterances]]
+                                if utterances else np.empty((0, 0)))
+               for transcript_id, utterances in chunk]
+    return results, sum(len(utterances) for _, utterances in chunk)
+
+
+def chunked(transcripts: Iterator[Transcript], size: int, slots: threading.Semaphore) -> Iterator[List[Transcript]]:
+    """
+    Groups transcripts into chunks. A chunk is only read once `slots` has room, so the pool's task
+    queue never holds more than a few chunks however large the input is.
+    """
+    chunk = []
+    for transcript in transcripts:
+        chunk.append(transcript)
+        if len(chunk) == size:
+            slots.acquire()
+            yield chunk
+            chunk = []
+    if chunk:
+        slots.acquire()
+        yield chunk
+
+
+def report(done: int, utterances: int, errors: int, skipped: int, elapsed: float) -> Dict[str, float]:
+    return {"transcripts": done, "utterances": utterances, "errors": errors, "skipped": skipped,
+            "seconds": elapsed, "transcripts_per_second": done / elapsed if elapsed else 0.0,
+            "utterances_per_second": utterances / elapsed if elapsed else 0.0}
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, float]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="JSONL files of transcripts")
+    parser.add_argument("--output", required=True, help="JSONL file the scores are appended to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="PyTorch threads in each worker, default CPU count / workers")
+    parser.add_argument("--chunk-size", type=int, default=64, help="transcripts sent to a worker at once")
+    parser.add_argument("--batch-size", type=int, default=256, help="utterances per sentence model batch")
+    parser.add_argument("--progress-every", type=float, default=10, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    workers = max(1, args.workers)
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    done = load_done(args.output)
+    slots = threading.Semaphore(2 * workers)
+    chunks = chunked(read_transcripts(args.inputs, done), args.chunk_size, slots)
+
+    scored = utterances = errors = 0
+    started = last_progress = time.perf_counter()
+    # spawned rather than forked, so no worker inherits a PyTorch thread pool from the parent
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=_init_worker, initargs=(threads, args.batch_size)) as pool, \
+            open(args.output, "a") as out:
+        for results, count in pool.imap_unordered(_score_chunk, chunks):
+            slots.release()
+            for result in results:
+                out.write(json.dumps(result) + "\n")
+            out.flush()
+            scored += len(results)
+            errors += sum("error" in result for result in results)
+            utterances += count
+            if time.perf_counter() - last_progress >= args.progress_every:
+                last_progress = time.perf_counter()
+                elapsed = last_progress - started
+                print(f"{scored} transcripts, {scored / elapsed:.1f}/s, {utterances / elapsed:.0f} utterances/s",
+                      file=sys.stderr)
+        pool.close()
+        pool.join()
+
+    result = report(scored, utterances, errors, len(done), time.perf_counter() - started)
+    print(f"scored {result['transcripts']} transcripts ({result['errors']} errors, {result['skipped']} already done) "
+          f"in {result['seconds']:.1f}s: {result['transcripts_per_second']:.1f} transcripts/s, "
+          f"{result['utterances_per_second']:.0f} utterances/s", file=sys.stderr)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import json
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import redis
+import redis.asyncio
+
+from tools.redis_connection import get_async_redis
+
+# "redis" shares sessions between workers and restarts, "memory" keeps them in the process, for a
+# single worker or tests without a Redis instance
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "redis")
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+# sessions kept by the in-memory backend before the least recently used are dropped
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+
+
+def _turns_key(session_id: str) -> str:
+    return f"session:{session_id}:turns"
+
+
+def _meta_key(session_id: str) -> str:
+    return f"session:{session_id}:meta"
+
+
+def parse_legacy_history(history: str) -> List[Dict[str, str]]:
+    """
+    Splits a history string in the old single-key format ("active\\n Interviewer: ...\\n You: ...")
+    into turns.
+
+    Args:
+        history: the old transcript string.
+
+    Returns:
+        list: {"interviewer", "child"} for each turn.
+    """
+    turns = []
+    for chunk in history.split("\n Interviewer: ")[1:]:
+        interviewer, _, child = chunk.partition("\n You: ")
+        turns.append({"interviewer": interviewer, "child": child})
+    return turns
+
+
+def render_history(turns: List[Dict[str, str]]) -> str:
+    """
+    Formats turns as the conversation history given to the chatbot prompt.
+
+    Args:
+        turns: {"interviewer", "child"} for each turn, oldest first.
+
+    Returns:
+        str: the conversation history.
+    """
+    return "".join(f"\n Interviewer: {turn['interviewer']}\n You: {turn['child']}" for turn in turns)
+
+
+class SessionStore(ABC):
+    """
+    Interface of the session backends: an append-only list of turns and a metadata dict per session,
+    both expiring `ttl` seconds after the last write. A backend missing any of the abstract methods
+    can't be instantiated.
+    """
+
+    @abstractmethod
+    async def create(self) -> str:
+        """
+        Starts a new, empty session.
+
+        Returns:
+            str: the session id.
+        """
+
+    @abstractmethod
+    async def exists(self, session_id: str) -> bool:
+        """
+        Whether the session exists and hasn't expired.
+        """
+
+    @abstractmethod
+    async def append_turn(self, session_id: str, interviewer: str, child: str) -> int:
+        """
+        Appends one interviewer message and the chatbot's reply to the session.
+
+        Args:
+            session_id: the session to append to.
+            interviewer: the interviewer's message.
+            child: the chatbot's reply.
+
+        Returns:
+            int: number of turns in the session after the append.
+        """
+
+    @abstractmethod
+    async def recent_turns(self, session_id: str, n: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        Reads the last `n` turns of a session without loading the rest.
+
+        Args:
+            session_id: the session to read.
+            n: number of turns to return, None for the whole session.
+
+        Returns:
+            list: {"interviewer", "child"} for each turn, oldest first.
+        """
+
+    @abstractmethod
+    async def turn_range(self, session_id: str, start: int, stop: int) -> List[Dict[str, str]]:
+        """
+        Reads the turns from position `start` up to, not including, `stop`.
+
+        Returns:
+            list: {"interviewer", "child"} for each turn, oldest first.
+        """
+
+    @abstractmethod
+    async def metadata(self, session_id: str) -> Dict[str, str]:
+        """
+        The metadata fields of a session, empty if it has none.
+        """
+
+    @abstractmethod
+    async def update_metadata(self, session_id: str, fields: Dict[str, Any]) -> None:
+        """
+        Sets metadata fields of a session, such as its rolling summary, and refreshes its TTL.
+
+        Args:
+            session_id: the session to update.
+            fields: values to set, stored as strings.
+        """
+
+    async def history(self, session_id: str, n: Optional[int] = None) -> str:
+        """
+        The last `n` turns of a session formatted for the chatbot prompt.
+        """
+        return render_history(await self.recent_turns(session_id, n))
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Append-only session history in Redis, through the async client so a request never blocks the
+    event loop while it waits for Redis.
+
+    Each session is a list of turns (`session:<id>:turns`, one JSON object per turn) and a metadata
+    hash (`session:<id>:meta`). Appending a turn is a single RPUSH, so a turn never re-reads or
+    rewrites the rest of the history and concurrent turns on the same session can't overwrite
+    each other. Every write refreshes the TTL of both keys in the same MULTI/EXEC transaction.
+    Sessions stored in the old format (the whole transcript as one string under the session id)
+    are migrated the first time they are touched.
+    """
+
+    def __init__(self, redis_client: redis.asyncio.Redis, ttl: int = SESSION_TTL):
+        """
+        Args:
+            redis_client: async client with decode_responses=True.
+            ttl: seconds a session lives after its last write.
+        """
+        self.redis_client = redis_client
+        self.ttl = ttl
+
+    async def create(self) -> str:
+        session_id = str(uuid.uuid4())
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.hset(_meta_key(session_id), mapping={"status": "active", "created_at": time.time(), "turns": 0})
+        pipe.expire(_meta_key(session_id), self.ttl)
+        await pipe.execute()
+        return session_id
+
+    async def exists(self, session_id: str) -> bool:
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.type(session_id)
+        pipe.exists(_meta_key(session_id))
+        legacy, exists = await pipe.execute()
+        return legacy == "string" or bool(exists)
+
+    async def append_turn(self, session_id: str, interviewer: str, child: str) -> int:
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.type(session_id)
+        pipe.rpush(_turns_key(session_id), json.dumps({"interviewer": interviewer, "child": child}))
+        pipe.hset(_meta_key(session_id), mapping={"status": "active", "updated_at": time.time()})
+        pipe.hincrby(_meta_key(session_id), "turns", 1)
+        pipe.expire(_turns_key(session_id), self.ttl)
+        pipe.expire(_meta_key(session_id), self.ttl)
+        legacy, length = (await pipe.execute())[:2]
+        if legacy == "string":
+            length += await self._migrate_legacy(session_id)
+        return length
+
+    async def recent_turns(self, session_id: str, n: Optional[int] = None) -> List[Dict[str, str]]:
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.type(session_id)
+        pipe.lrange(_turns_key(session_id), -n if n else 0, -1)
+        legacy, turns = await pipe.execute()
+        if legacy == "string":
+            await self._migrate_legacy(session_id)
+            return await self.recent_turns(session_id, n)
+        return [json.loads(turn) for turn in turns]
+
+    async def turn_range(self, session_id: str, start: int, stop: int) -> List[Dict[str, str]]:
+        if stop <= start:
+            return []
+        if await self.redis_client.type(session_id) == "string":
+            await self._migrate_legacy(session_id)
+        return [json.loads(turn) for turn in await self.redis_client.lrange(_turns_key(session_id), start, stop - 1)]
+
+    async def metadata(self, session_id: str) -> Dict[str, str]:
+        if await self.redis_client.type(session_id) == "string":
+            await self._migrate_legacy(session_id)
+        return await self.redis_client.hgetall(_meta_key(session_id))
+
+    async def update_metadata(self, session_id: str, fields: Dict[str, Any]) -> None:
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.hset(_meta_key(session_id), mapping=fields)
+        pipe.expire(_meta_key(session_id), self.ttl)
+        pipe.expire(_turns_key(session_id), self.ttl)
+        await pipe.execute()
+
+    async def _migrate_legacy(self, session_id: str) -> int:
+        """
+        Moves a session stored as one transcript string under its id into the turn list format.
+        The old turns are prepended, so turns appended before the migration keep their place.
+
+        Returns:
+            int: number of turns migrated.
+        """
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            try:
+                # another worker migrating the same session at once makes this transaction fail harmlessly
+                await pipe.watch(session_id)
+                history = await pipe.get(session_id)
+                ttl = await pipe.ttl(session_id)
+                if history is None:
+                    return 0
+                turns = parse_legacy_history(history)
+
+                pipe.multi()
+                if turns:
+                    pipe.lpush(_turns_key(session_id), *[json.dumps(turn) for turn in reversed(turns)])
+                    pipe.expire(_turns_key(session_id), max(ttl, self.ttl))
+                pipe.hset(_meta_key(session_id), mapping={"status": "active", "migrated": 1})
+                pipe.hincrby(_meta_key(session_id), "turns", len(turns))
+                pipe.expire(_meta_key(session_id), max(ttl, self.ttl))
+                pipe.delete(session_id)
+                await pipe.execute()
+                return len(turns)
+            except redis.WatchError:
+                return 0
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Sessions kept in the process, for a single worker or tests: they are lost on restart and not
+    shared between workers. Sessions expire `ttl` seconds after their last write, and the least
+    recently used are dropped once there are more than `max_sessions`. Metadata values are strings,
+    as the Redis backend returns them.
+    """
+
+    def __init__(self, ttl: int = SESSION_TTL, max_sessions: int = SESSION_MAX_SESSIONS):
+        """
+        Args:
+            ttl: seconds a session lives after its last write.
+            max_sessions: number of sessions kept before the least recently used are dropped.
+        """
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if session["expires"] <= time.monotonic():
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _touch(self, session_id: str) -> Dict[str, Any]:
+        """
+        The session, created if missing, with its TTL refreshed as on every write.
+        """
+        session = self._get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = {"turns": [], "meta": {}}
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        session["expires"] = time.monotonic() + self.ttl
+        return session
+
+    async def create(self) -> str:
+        session_id = str(uuid.uuid4())
+        with self._lock:
+            self._touch(session_id)["meta"] = {"status": "active", "created_at": str(time.time()), "turns": "0"}
+        return session_id
+
+    async def exists(self, session_id: str) -> bool:
+        with self._lock:
+            return self._get(session_id) is not None
+
+    async def append_turn(self, session_id: str, interviewer: str, child: str) -> int:
+        with self._lock:
+            session = self._touch(session_id)
+            session["turns"].append({"interviewer": interviewer, "child": child})
+            session["meta"].update(status="active", updated_at=str(time.time()),
+                                   turns=str(int(session["meta"].get("turns", 0)) + 1))
+            return len(session["turns"])
+
+    async def recent_turns(self, session_id: str, n: Optional[int] = None) -> List[Dict[str, str]]:
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return []
+            return [dict(turn) for turn in session["turns"][-n if n else 0:]]
+
+    async def turn_range(self, session_id: str, start: int, stop: int) -> List[Dict[str, str]]:
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return []
+            return [dict(turn) for turn in session["turns"][start:max(start, stop)]]
+
+    async def metadata(self, session_id: str) -> Dict[str, str]:
+        with self._lock:
+            session = self._get(session_id)
+            return dict(session["meta"]) if session is not None else {}
+
+    async def update_metadata(self, session_id: str, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            self._touch(session_id)["meta"].update({key: str(value) for key, value in fields.items()})
+
+
+def create_session_store(backend: str = SESSION_BACKEND) -> SessionStore:
+    """
+    Builds the session backend chosen by SESSION_BACKEND.
+
+    Args:
+        backend: "redis" or "memory".
+
+    Returns:
+        SessionStore: the session store.
+    """
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "redis":
+        return RedisSessionStore(get_async_redis())
+    raise ValueError(f"Unknown SESSION_BACKEND {backend!r}, expected 'redis' or 'memory'")
@@ -0,0 +1,81 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from tools.metrics import SINGLE_FLIGHT_CALLS
+
+
+def normalize_text(text: str) -> str:
+    """
+    Key of a question for coalescing: lower case with runs of whitespace collapsed, which the
+    uncased BERT tokenizer and the LLM cache both ignore, so coalesced requests get the result
+    they would have got on their own.
+    """
+    return " ".join(text.split()).lower()
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent work: while a call for an (operation, input) key is in flight,
+    later calls with the same key wait for its result instead of starting their own. Once the call
+    finishes the key is released, so results aren't cached beyond the calls that overlapped.
+
+    The work runs as a task of its own, so a caller that goes away (a client disconnecting) doesn't
+    cancel it for the others. An exception is raised to every caller waiting on it.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {"leader": 0, "follower": 0})
+
+    async def do(self, operation: str, text: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs `fn`, or waits for the identical call already running.
+
+        Args:
+            operation: name of the work, part of the key, e.g. "q_type".
+            text: input of the work, normalized with `normalize_text` into the key.
+            fn: starts the work, only called when no identical call is in flight.
+
+        Returns:
+            the result of `fn`, shared by every caller with the same key.
+        """
+        key = (operation, normalize_text(text))
+        future = self._in_flight.get(key)
+        if future is None:
+            role = "leader"
+            future = asyncio.ensure_future(fn())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._release(key, done))
+        else:
+            role = "follower"
+        self._counts[operation][role] += 1
+        SINGLE_FLIGHT_CALLS.labels(operation=operation, role=role).inc()
+        return await asyncio.shield(future)
+
+    def _release(self, key: Tuple[str, str], future: asyncio.Future) -> None:
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        if not future.cancelled():
+            # marks the exception as retrieved even if every caller went away before it was raised
+            future.exception()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns:
+            dict: for each operation, the calls that did the work (leaders), the calls that waited
+            for another one (followers), the share of calls coalesced and the keys in flight now.
+        """
+        in_flight = defaultdict(int)
+        for operation, _ in self._in_flight:
+            in_flight[operation] += 1
+        stats = {}
+        for operation, counts in self._counts.items():
+            total = counts["leader"] + counts["follower"]
+            stats[operation] = {"leaders": counts["leader"], "followers": counts["follower"],
+                                "coalesced_rate": counts["follower"] / total if total else 0.0,
+                                "in_flight": in_flight[operation]}
+        return stats
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,259 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import redis.asyncio
+
+from tools.generate_questions import LLM_generate_question_async, question_categories
+from tools.llm_client import LLMUnavailable
+from tools.scenario import create_scenario_async
+
+# off by default: a refill makes its Mistral calls through the same rate limit and queue as user
+# requests, and filling every pool at startup takes about 100 of them
+WARM_POOL_ENABLED = os.getenv("WARM_POOL_ENABLED", "false").lower() in ("1", "true", "yes")
+WARM_POOL_LOW = int(os.getenv("WARM_POOL_LOW", "5"))
+WARM_POOL_HIGH = int(os.getenv("WARM_POOL_HIGH", "20"))
+WARM_POOL_REFILL_CONCURRENCY = int(os.getenv("WARM_POOL_REFILL_CONCURRENCY", "2"))
+WARM_POOL_INTERVAL = float(os.getenv("WARM_POOL_INTERVAL", "5"))
+
+SCENARIO_POOL = "pool:scenarios"
+STATS_KEY = "pool:stats"
+REFILL_LOCK_KEY = "pool:refill-lock"
+# seconds the refill lock is held without being renewed; it is renewed before every generated item
+REFILL_LOCK_TTL = 300
+
+# the lock is only released or renewed by the worker holding it, checked and changed in one step
+_RELEASE_LOCK = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+_RENEW_LOCK = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("EXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def category_name(category: str) -> str:
+    """
+    Short name of a question category, e.g. "Directive" for the full description given to the LLM.
+    """
+    return category.split(" ", 1)[0]
+
+
+def question_pool(category: str) -> str:
+    return f"pool:questions:{category_name(category)}"
+
+
+class WarmPool:
+    """
+    Pool of pre-generated scenarios and questions, kept in Redis and topped up in the background.
+
+    Each pool is a Redis list, so serving an item is a single LPOP. A background task checks the
+    depth of every pool and, when one drops below the low watermark, generates items with live
+    Mistral calls until it is back at the high watermark. A Redis lock makes sure only one worker
+    refills at a time: it is renewed before every item, and a worker that lost it stops refilling.
+    An item is only added while its pool is below the high watermark. When a pool is empty, or the
+    pool is disabled, the caller falls back to a live call.
+    """
+
+    def __init__(self, redis_client: redis.asyncio.Redis, low: int = WARM_POOL_LOW, high: int = WARM_POOL_HIGH,
+                 refill_concurrency: int = WARM_POOL_REFILL_CONCURRENCY, interval: float = WARM_POOL_INTERVAL,
+                 enabled: bool = WARM_POOL_ENABLED):
+        """
+        Args:
+            redis_client: async client with decode_responses=True.
+            low: a pool is refilled once it holds fewer items than this.
+            high: number of items a pool is refilled up to.
+            refill_concurrency: largest number of live generation calls made at once while refilling.
+            interval: seconds between depth checks when nothing is popped.
+            enabled: serve from the pools; when False every item is generated live, without asking Redis.
+        """
+        self.redis_client = redis_client
+        self.enabled = enabled
+        self.low = low
+        self.high = max(high, low)
+        self.refill_concurrency = refill_concurrency
+        self.interval = interval
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refill_times = deque()
+        self._release_lock = redis_client.register_script(_RELEASE_LOCK)
+        self._renew_lock = redis_client.register_script(_RENEW_LOCK)
+
+    def _producers(self) -> List[Tuple[str, Callable[[], Awaitable[Optional[str]]]]]:
+        """
+        Pool keys with the function that generates one serialized item for them (None on failure).
+        """
+        # a shed call only leaves the pool an item short until the next refill
+        async def scenario():
+            try:
+                result = await create_scenario_async()
+            except LLMUnavailable:
+                return None
+            return json.dumps(result) if isinstance(result, dict) and "Scenario" in result else None
+
+        def question(category):
+            async def generate():
+                try:
+                    result = await LLM_generate_question_async(category)
+                except LLMUnavailable:
+                    return None
+                return result if result and result != "MistralAI API call error." else None
+            return generate
+
+        return [(SCENARIO_POOL, scenario)] + [(question_pool(category), question(category))
+                                             for category in question_categories]
+
+    async def _pop(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            # nothing refills the pools, so don't pay two Redis round trips or count a miss
+            return None
+        try:
+            item = await self.redis_client.lpop(key)
+            await self.redis_client.hincrby(STATS_KEY, "hits" if item is not None else "misses", 1)
+        except redis.RedisError as e:
+            logger.warning("Warm pool unavailable", extra={"error": str(e)})
+            return None
+        if self._wake is not None:
+            self._wake.set()
+        return item
+
+    async def get_scenario(self) -> Dict[str, str]:
+        """
+        Serves a pre-generated scenario, or generates one live if the pool is empty.
+
+        Returns:
+            dict: the scenario, as returned by `create_scenario`.
+        """
+        item = await self._pop(SCENARIO_POOL)
+        if item is not None:
+            return json.loads(item)
+        return await create_scenario_async()
+
+    async def get_question(self, category: str) -> str:
+        """
+        Serves a pre-generated question of the given category, or generates one live if the pool is empty.
+
+        Args:
+            category: category description, as returned by `get_question_category`.
+
+        Returns:
+            str: the generated question.
+        """
+        item = await self._pop(question_pool(category))
+        if item is not None:
+            return item
+        return await LLM_generate_question_async(category)
+
+    async def refill(self) -> int:
+        """
+        Tops up every pool that is below the low watermark, if no other worker is already doing so.
+
+        Returns:
+            int: number of items added.
+        """
+        token = uuid.uuid4().hex
+        if not await self.redis_client.set(REFILL_LOCK_KEY, token, nx=True, ex=REFILL_LOCK_TTL):
+            return 0
+
+        added = 0
+        try:
+            semaphore = asyncio.Semaphore(self.refill_concurrency)
+            for key, produce in self._producers():
+                if not await self._renew_lock(keys=[REFILL_LOCK_KEY], args=[token, REFILL_LOCK_TTL]):
+                    logger.warning("Warm pool refill lock lost, stopping the refill")
+                    break
+                depth = await self.redis_client.llen(key)
+                if depth >= self.low:
+                    continue
+
+                async def generate_one():
+                    async with semaphore:
+                        # a refill slower than the lock's TTL stops rather than run alongside another worker's
+                        if not await self._renew_lock(keys=[REFILL_LOCK_KEY], args=[token, REFILL_LOCK_TTL]):
+                            return 0
+                        item = await produce()
+                    if item is None:
+                        await self.redis_client.hincrby(STATS_KEY, "refill_errors", 1)
+                        return 0
+                    if await self.redis_client.llen(key) >= self.high:
+                        return 0
+                    await self.redis_client.rpush(key, item)
+                    self._refill_times.append(time.time())
+                    return 1
+
+                added += sum(await asyncio.gather(*[generate_one() for _ in range(self.high - depth)]))
+            await self.redis_client.hincrby(STATS_KEY, "refilled", added)
+        finally:
+            await self._release_lock(keys=[REFILL_LOCK_KEY], args=[token])
+        return added
+
+    async def run(self) -> None:
+        """
+        Background loop that refills the pools every `interval` seconds, or right after an item is popped.
+        """
+        self._wake = asyncio.Event()
+        while True:
+            try:
+                await self.refill()
+            except Exception as e:
+                logger.exception("Warm pool refill failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def stats(self) -> Dict[str, float | int | Dict[str, int]]:
+        """
+        Returns:
+            dict: whether this worker serves from the pool, depth of each pool, hits and misses (live
+            fallbacks) with the hit rate, items refilled and failed refills across all workers, and
+            this worker's refill rate over the last minute.
+        """
+        pipe = self.redis_client.pipeline(transaction=False)
+        keys = [key for key, _ in self._producers()]
+        for key in keys:
+            pipe.llen(key)
+        pipe.hgetall(STATS_KEY)
+        *depths, counters = await pipe.execute()
+
+        hits, misses = int(counters.get("hits", 0)), int(counters.get("misses", 0))
+        now = time.time()
+        while self._refill_times and self._refill_times[0] < now - 60:
+            self._refill_times.popleft()
+
+        return {
+            "enabled": self.enabled,
+            "depth": dict(zip(keys, depths)),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "refilled": int(counters.get("refilled", 0)),
+            "refill_errors": int(counters.get("refill_errors", 0)),
+            "refilled_last_minute": len(self._refill_times),
+        }